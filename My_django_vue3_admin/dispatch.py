@@ -1,6 +1,8 @@
 from django.db import connection
 
 from My_django_vue3_admin import settings
+from dvadmin.utils.cache_stats import cache_stats
+from dvadmin.utils.tracing import traced
 
 
 def is_tenants_mode():
@@ -55,6 +57,7 @@ def _get_all_system_config():
     return data
 
 
+@traced("system_config.refresh")
 def refresh_system_config():
     """
     刷新系统配置
@@ -73,6 +76,7 @@ def refresh_system_config():
         settings.SYSTEM_CONFIG = _get_all_system_config()
 
 
+@traced("system_config.get")
 def get_system_config(schema_name=None) -> dict[str, str | None]:
     """
     获取系统配置中所有配置
@@ -88,6 +92,7 @@ def get_system_config(schema_name=None) -> dict[str, str | None]:
         ]
     else:
         dictionary_config = settings.SYSTEM_CONFIG
+    cache_stats.record("system_config", hit=bool(dictionary_config))
     return dictionary_config or {}
 
 
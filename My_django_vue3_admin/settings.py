@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 from dvadmin import system
@@ -47,9 +49,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "dvadmin.utils.middleware.HealthCheckMiddleware",  # /healthz、/readiness 探针, 不经过其他中间件
+    "dvadmin.utils.middleware.TracingMiddleware",  # 链路追踪, TRACING_ENABLED 为False时不做任何事
     "django.middleware.security.SecurityMiddleware",
+    "dvadmin.utils.middleware.MetricsMiddleware",  # 请求指标, GET /metrics
+    "dvadmin.utils.middleware.QueryProfilingMiddleware",  # 采样分析请求SQL
+    "dvadmin.utils.middleware.SlowRequestProfilingMiddleware",  # 采样cProfile, 保存慢请求profile
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # CORS跨域
+    "dvadmin.utils.middleware.ReplicaPinningMiddleware",  # 读写分离: 写入后短时间内读主库
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -97,8 +105,52 @@ DATABASES = {
         "PORT": PORT,
     }
 }
+# 操作日志分库: 在config.env中配置 OPERATION_LOG_DATABASE = {"ENGINE": ..., "NAME": ...}
+# 配置后日志模型只在该库迁移: python manage.py migrate --database operation_log
+OPERATION_LOG_DATABASE_ALIAS = "operation_log"
+OPERATION_LOG_DATABASE = locals().get("OPERATION_LOG_DATABASE", None)
+# 运行测试时没有配置则使用本地sqlite代替, 保证分库路由被测试覆盖
+TESTING = sys.argv[1:2] == ["test"]
+if OPERATION_LOG_DATABASE is None and TESTING:
+    OPERATION_LOG_DATABASE = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "operation_log.sqlite3",
+    }
+if OPERATION_LOG_DATABASE:
+    DATABASES[OPERATION_LOG_DATABASE_ALIAS] = OPERATION_LOG_DATABASE
+# 存放在日志库的模型, 新增日志模型时加到这里
+OPERATION_LOG_MODELS = ["system.operationlog", "system.operationlogrollup"]
+# 只读副本: 在config.env中配置 REPLICA_DATABASES = {"replica1": {"ENGINE": ..., "NAME": ..., "WEIGHT": 2}}
+# WEIGHT为读流量权重(默认1), 未配置时所有读写都走default
+REPLICA_DATABASES = locals().get("REPLICA_DATABASES", {})
+DATABASE_REPLICAS = {}
+# TestCase只在default上开启事务, 读副本看不到未提交的测试数据, 测试时不做读写分离
+for _alias, _replica in ({} if TESTING else REPLICA_DATABASES).items():
+    _replica = dict(_replica)
+    DATABASE_REPLICAS[_alias] = _replica.pop("WEIGHT", 1)
+    DATABASES[_alias] = _replica
+REPLICA_STICKY_SECONDS = 5  # 写入后多少秒内读主库
+REPLICA_HEALTH_CHECK_INTERVAL = 10  # 副本连接检查间隔(秒), 不可用的副本在下次检查前不参与读
+DATABASE_ROUTERS = [
+    "dvadmin.utils.db_router.OperationLogRouter",
+    "dvadmin.utils.db_router.ReplicaRouter",
+]
+# 缓存: 多进程部署时在config.env中配置共享缓存, 如
+# CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://127.0.0.1:6379/1"}}
+# 未配置时使用进程内的LocMemCache, 进程之间不共享
+CACHES = locals().get("CACHES", {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+# 进程内缓存(VersionedCache, 如部门树)版本号的有效期(秒), 没有共享缓存时其他进程最多在这段时间内读到旧数据
+VERSIONED_CACHE_TIMEOUT = locals().get("VERSIONED_CACHE_TIMEOUT", 60)
 # 表前缀
 TABLE_PREFIX = locals().get("TABLE_PREFIX", "")
+# 第一个用于生成新密码, 与Django默认列表相同, 只是pbkdf2_sha256换成带追踪的子类
+PASSWORD_HASHERS = [
+    "dvadmin.utils.hashers.TracedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -180,6 +232,21 @@ CAPTCHA_CHALLENGE_FUNCT = "captcha.helpers.random_char_challenge"  # 字母验
 API_LOG_ENABLE = True
 # API_LOG_METHODS = 'ALL' # ['POST', 'DELETE']
 API_LOG_METHODS = ["POST", "UPDATE", "DELETE", "PUT"]  # ['POST', 'DELETE']
+# 日志策略, 中间件初始化时编译, 路径规则支持glob和"re:"开头的正则
+API_LOG_POLICY = {
+    "include": [],  # 为空表示全部路径
+    "exclude": ["/api/captcha/", "/api/schema/*"],
+    "sample_rates": {},  # 按请求方式采样, 如 {"PUT": 0.1}, 未配置的为1
+    "always_log_on_error": True,  # 未被采样的请求出错时仍然记录
+    "user_overrides": {},  # 按用户账号覆盖采样率, 如 {"admin": 1}
+}
+API_LOG_MAX_BODY_LENGTH = 4096  # 请求参数、返回信息最大记录长度, 超出截断
+API_LOG_MAX_RESPONSE_LENGTH = 65536  # 超过该大小的响应不解析
+OPERATION_LOG_RETENTION_DAYS = 180  # 操作日志保留天数, 见 manage.py archive_operation_log
+OPERATION_LOG_ARCHIVE_DIR = BASE_DIR / "archive" / "operation_log"  # 过期日志归档目录
+OPERATION_LOG_ROLLUP_FLUSH_SIZE = 500  # 操作日志小时汇总在进程内累计多少个请求写入一次
+OPERATION_LOG_ROLLUP_FLUSH_INTERVAL = 10  # 或距上次写入超过多少秒时写入
+SOFT_DELETE_RETENTION_DAYS = 30  # 软删除的记录保留天数, 见 manage.py purge_soft_deleted
 API_MODEL_MAP = {
     "/token/": "登录模块",
     "/api/login/": "登录模块",
@@ -196,3 +263,43 @@ SPECTACULAR_SETTINGS = {
     "SWAGGER_UI_FAVICON_HREF": "SIDECAR",
     "REDOC_DIST": "SIDECAR",
 }
+
+# ================================================= #
+# ******************** 请求指标 ******************** #
+# ================================================= #
+# 多worker共享的指标目录, 为空时/metrics只返回处理该请求的进程的数据
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = 5  # 每个进程写指标文件的最小间隔(秒)
+# 允许访问/metrics的地址, 默认只允许本机, 多个地址用逗号分隔; 设置为空列表时不限制
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip.strip()
+]
+# SQL分析采样率(0~1), 0为关闭, 被采样的请求返回Server-Timing头并记录sql_profile日志
+SQL_PROFILE_SAMPLE_RATE = 0
+SQL_PROFILE_N_PLUS_ONE_THRESHOLD = 5  # 同一形状的SQL在一个请求中执行多少次视为N+1
+# 慢请求profile采样率(0~1), 0为关闭, 被采样且超过阈值的请求保存cProfile文件, 见 manage.py profile_summary
+SLOW_REQUEST_PROFILE_SAMPLE_RATE = 0
+SLOW_REQUEST_PROFILE_THRESHOLD_MS = 1000
+SLOW_REQUEST_PROFILE_DIR = BASE_DIR / "profiles"
+SLOW_REQUEST_PROFILE_MAX_FILES = 50  # 超过后删除最旧的
+
+# ================================================= #
+# ******************** 链路追踪 ******************** #
+# ================================================= #
+TRACING_ENABLED = False
+TRACING_SAMPLE_RATE = 1.0  # 没有上游traceparent时的采样率
+# jsonl: 写入TRACING_JSONL_PATH; otlp: 发送到TRACING_OTLP_ENDPOINT; 或exporter类路径
+TRACING_EXPORTER = "jsonl"
+TRACING_JSONL_PATH = BASE_DIR / "traces.jsonl"
+TRACING_OTLP_ENDPOINT = "http://127.0.0.1:4318/v1/traces"
+TRACING_SERVICE_NAME = "dvadmin"
+
+# ================================================= #
+# ******************** 就绪检查 ******************** #
+# ================================================= #
+READINESS_CHECK_INTERVAL = 5  # 后台检查间隔(秒)
+READINESS_CHECK_TIMEOUT = 2  # 每项检查的超时时间(秒)
+READINESS_DATABASES = None  # 需要检查的数据库别名, None为全部
+READINESS_CACHES = None  # 需要检查的缓存别名, None为全部
+# /debug/runtime 的访问token, 为空时不开放该端点
+RUNTIME_STATS_TOKEN = os.environ.get("RUNTIME_STATS_TOKEN") or None
@@ -24,7 +24,10 @@ from drf_spectacular.views import (
 )
 
 from My_django_vue3_admin import dispatch
+from dvadmin.system.views.dept import DeptTreeView
 from dvadmin.system.views.login import CaptchaView, LoginView
+from dvadmin.system.views.memory_profile import MemoryProfileView
+from dvadmin.system.views.operation_log import OperationLogRollupView, OperationLogView
 from dvadmin.system.views.system_config import InitSettingsViewSet
 
 urlpatterns = [
@@ -32,6 +35,14 @@ urlpatterns = [
     path("api/init/settings/", InitSettingsViewSet.as_view()),
     path("api/captcha/", CaptchaView.as_view(),name="login_captcha"),
     path("api/login/", LoginView.as_view()),
+    path("api/system/operation_log/", OperationLogView.as_view(), name="operation_log"),
+    path(
+        "api/system/operation_log/rollup/",
+        OperationLogRollupView.as_view(),
+        name="operation_log_rollup",
+    ),
+    path("api/system/memory_profile/", MemoryProfileView.as_view(), name="memory_profile"),
+    path("api/system/dept/tree/", DeptTreeView.as_view(), name="dept_tree"),
 
     #==============api文档=================================================
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -0,0 +1,114 @@
+"""
+归档并清理过期的操作日志
+python manage.py archive_operation_log --days 180
+python manage.py archive_operation_log --before 2026-01-01 --no-archive
+"""
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from dvadmin.system.models import OperationLog
+from dvadmin.utils import log_search
+
+
+class Command(BaseCommand):
+    help = "把早于截止时间的操作日志归档为压缩的JSONL文件, 再按主键范围分批删除"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "OPERATION_LOG_RETENTION_DAYS", 180),
+            help="保留最近多少天的日志",
+        )
+        parser.add_argument("--before", help="截止日期(YYYY-MM-DD), 优先于--days")
+        parser.add_argument(
+            "--archive-dir",
+            default=getattr(settings, "OPERATION_LOG_ARCHIVE_DIR", None),
+            help="归档目录",
+        )
+        parser.add_argument("--no-archive", action="store_true", help="只删除不归档")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="每批主键范围大小")
+        parser.add_argument("--sleep", type=float, default=0.1, help="每批之间暂停的秒数")
+        parser.add_argument("--dry-run", action="store_true", help="只统计不执行")
+
+    def handle(self, *args, **options):
+        if options["before"]:
+            try:
+                cutoff = datetime.strptime(options["before"], "%Y-%m-%d")
+            except ValueError:
+                raise CommandError("--before 格式应为 YYYY-MM-DD")
+        else:
+            cutoff = datetime.now() - timedelta(days=options["days"])
+        archive_dir = options["archive_dir"]
+        if not options["no_archive"] and not archive_dir:
+            raise CommandError("请指定 --archive-dir 或设置 OPERATION_LOG_ARCHIVE_DIR, 不归档请使用 --no-archive")
+        chunk_size = options["chunk_size"]
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size 必须大于0")
+
+        expired = OperationLog._base_manager.filter(create_datetime__lt=cutoff)
+        # 最小主键走主键索引, 最大主键走create_datetime索引, 之后只按主键范围扫描, 不需要排序
+        first = expired.order_by("id").values_list("id", flat=True).first()
+        last = expired.order_by("-create_datetime", "-id").values_list("id", flat=True).first()
+        if first is None:
+            self.stdout.write("没有需要清理的日志")
+            return
+        if options["dry_run"]:
+            self.stdout.write(f"截止 {cutoff:%Y-%m-%d %H:%M:%S}, 主键范围 {first}-{last}, 共 {expired.count()} 条")
+            return
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+
+        using = router.db_for_write(OperationLog)
+        fields = [field.attname for field in OperationLog._meta.concrete_fields]
+        total = 0
+        # 范围按chunk_size对齐, 文件名取实际写入的首尾主键, 见 _write_archive
+        start = first // chunk_size * chunk_size
+        while start <= last:
+            end = start + chunk_size
+            chunk = expired.filter(id__gte=start, id__lt=end)
+            if archive_dir and not options["no_archive"]:
+                rows = list(chunk.order_by("id").values(*fields))
+                ids = [row["id"] for row in rows]
+                if rows:
+                    self._write_archive(archive_dir, rows)
+            else:
+                ids = list(chunk.values_list("id", flat=True))
+            if not ids:
+                start = end
+                continue
+            with transaction.atomic(using=using):
+                deleted, _ = OperationLog._base_manager.filter(id__in=ids).delete()
+                log_search.delete_logs(ids, using=using)
+            total += deleted
+            self.stdout.write(f"已删除 {start}-{end - 1}: {deleted} 条, 累计 {total} 条")
+            time.sleep(options["sleep"])
+            start = end
+        self.stdout.write(self.style.SUCCESS(f"完成, 共删除 {total} 条"))
+
+    @staticmethod
+    def _write_archive(archive_dir, rows):
+        """
+        先写临时文件再重命名, 保证归档文件完整
+        文件名取写入的首尾主键: 截止时间落在之前归档过的范围内时, 再次执行的同一范围内只剩新过期的日志, 文件名不同;
+        同名文件已存在(如上次写完文件后、删除前中断)时加序号, 不覆盖, 已归档的日志只可能重复不会丢失
+        """
+        name = f"operation_log_{rows[0]['id']:012d}_{rows[-1]['id']:012d}"
+        path = os.path.join(archive_dir, f"{name}.jsonl.gz")
+        seq = 0
+        while os.path.exists(path):
+            seq += 1
+            path = os.path.join(archive_dir, f"{name}_{seq}.jsonl.gz")
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, default=str))
+                f.write("\n")
+        os.replace(tmp_path, path)
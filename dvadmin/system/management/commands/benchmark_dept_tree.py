@@ -0,0 +1,95 @@
+"""
+部门树查询基准测试, 在事务中生成测试部门, 结束后回滚
+python manage.py benchmark_dept_tree --nodes 50000 --fanout 8
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.db.models import Max
+
+from dvadmin.system.models import Dept
+
+
+def _legacy_descendants(dept_id, dept_all_list, dept_list=None):
+    """原 Dept.recursion_all_dept 的实现, 每一层递归都扫描全部部门"""
+    if dept_list is None:
+        dept_list = [dept_id]
+    for ele in dept_all_list:
+        if ele.get("parent") == dept_id:
+            dept_list.append(ele.get("id"))
+            _legacy_descendants(ele.get("id"), dept_all_list, dept_list)
+    return list(set(dept_list))
+
+
+class Command(BaseCommand):
+    help = "生成指定规模的部门树, 对比tree_path和原递归实现的子树查询, 以及新增、移动部门的耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--nodes", type=int, default=50000, help="部门数量")
+        parser.add_argument("--fanout", type=int, default=8, help="每个部门的下级数量")
+        parser.add_argument("--repeat", type=int, default=20, help="每项查询重复次数")
+        parser.add_argument(
+            "--legacy-max-size", type=int, default=200, help="子树超过该大小时不运行原递归实现(耗时为 部门数x子树大小)"
+        )
+
+    def _timed(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - start) / repeat * 1000, result
+
+    def handle(self, *args, **options):
+        nodes, fanout, repeat = options["nodes"], options["fanout"], options["repeat"]
+        if nodes <= 0 or fanout <= 0 or repeat <= 0:
+            raise CommandError("--nodes、--fanout、--repeat 必须大于0")
+        using = router.db_for_write(Dept)
+        with transaction.atomic(using=using):
+            self._run(using, nodes, fanout, repeat, options["legacy_max_size"])
+            transaction.set_rollback(True, using=using)
+
+    def _run(self, using, nodes, fanout, repeat, legacy_max_size):
+        manager = Dept._base_manager.using(using)
+        base = (manager.aggregate(max_id=Max("id"))["max_id"] or 0) + 1
+        # 完全 fanout 叉树: 第i个部门的上级是第 (i-1)//fanout 个
+        start = time.perf_counter()
+        manager.bulk_create(
+            (
+                Dept(id=base + i, name=f"部门{i}", parent_id=base + (i - 1) // fanout if i else None)
+                for i in range(nodes)
+            ),
+            batch_size=1000,
+        )
+        self.stdout.write(f"生成 {nodes} 个部门: {(time.perf_counter() - start) * 1000:.0f}ms")
+        elapsed, (updated, _) = self._timed(lambda: Dept.rebuild_tree(using=using), 1)
+        self.stdout.write(f"rebuild_tree 计算 {updated} 条路径: {elapsed:.0f}ms")
+
+        dept_all_list = list(manager.values("id", "parent"))
+        samples = []
+        dept_id = base
+        while dept_id < base + nodes:
+            samples.append(dept_id)
+            dept_id = (dept_id - base) * fanout + 1 + base
+        self.stdout.write(f"{'部门id':>10}{'子树大小':>10}{'tree_path ms':>16}{'原递归 ms':>14}")
+        for dept_id in samples:
+            elapsed, ids = self._timed(lambda: Dept.get_descendant_ids(dept_id), repeat)
+            if len(ids) <= legacy_max_size:
+                legacy, legacy_ids = self._timed(lambda: _legacy_descendants(dept_id, dept_all_list), 1)
+                if sorted(legacy_ids) != sorted(ids):
+                    raise CommandError(f"部门{dept_id}的子树与原实现不一致")
+                legacy = f"{legacy:.2f}"
+            else:
+                legacy = "跳过"
+            self.stdout.write(f"{dept_id:>12}{len(ids):>14}{elapsed:>16.2f}{legacy:>16}")
+
+        leaf = manager.get(id=base + nodes - 1)
+        elapsed, _ = self._timed(leaf.get_ancestor_ids, repeat)
+        self.stdout.write(f"祖先id(深度 {len(leaf.get_ancestor_ids())}): {elapsed:.4f}ms")
+        elapsed, _ = self._timed(lambda: Dept.objects.create(name="新部门", parent=leaf), repeat)
+        self.stdout.write(f"新增部门: {elapsed:.2f}ms")
+        # 把第二层的一个部门(含整棵子树)移动到另一个第二层部门下
+        moving = manager.get(id=base + 1)
+        subtree = len(Dept.get_descendant_ids(moving.id))
+        moving.parent_id = base + 2
+        elapsed, _ = self._timed(moving.save, 1)
+        self.stdout.write(f"移动 {subtree} 个部门的子树: {elapsed:.2f}ms")
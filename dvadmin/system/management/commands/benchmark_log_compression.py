@@ -0,0 +1,88 @@
+"""
+操作日志压缩基准测试
+python manage.py benchmark_log_compression --count 5000
+"""
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from dvadmin.utils import compression
+
+
+def _sample_payloads(count: int, seed: int = 0) -> list[str]:
+    """生成和线上日志相似的请求参数/返回信息"""
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            body = {
+                "username": f"user{rng.randint(1, 500)}",
+                "password": "********",
+                "captcha": "".join(rng.choice("abcdefgh") for _ in range(4)),
+                "hashkey": "%040x" % rng.getrandbits(160),
+            }
+        elif kind == 1:
+            body = {
+                "id": rng.randint(1, 10000),
+                "name": f"部门{rng.randint(1, 999)}",
+                "key": f"dept_{rng.randint(1, 999)}",
+                "sort": rng.randint(1, 20),
+                "owner": None,
+                "phone": None,
+                "email": None,
+                "status": True,
+                "parent": rng.randint(1, 100),
+                "description": None,
+            }
+        elif kind == 2:
+            body = {
+                "page": "1",
+                "limit": "20",
+                "title": f"配置{rng.randint(1, 99)}",
+                "value": [{"key": k, "title": f"选项{k}", "value": k} for k in range(rng.randint(1, 6))],
+                "form_item_type": 11,
+            }
+        else:
+            body = {"code": rng.choice([2000, 4000]), "msg": rng.choice(["success", "账号/密码错误;重试4次后将被锁定~"])}
+        payloads.append(json.dumps(body, ensure_ascii=False))
+    return payloads
+
+
+class Command(BaseCommand):
+    help = "对比操作日志在不同压缩方式下的大小和速度"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=5000, help="样本数量")
+
+    def _measure(self, name, payloads, zdict_id):
+        start = time.perf_counter()
+        compressed = [compression.compress_text(p, zdict_id=zdict_id) for p in payloads]
+        compress_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for value in compressed:
+            compression.decompress_text(value)
+        decompress_time = time.perf_counter() - start
+        raw_size = sum(len(p.encode("utf-8")) for p in payloads)
+        size = sum(len(c) for c in compressed)
+        self.stdout.write(
+            f"{name:<16}{raw_size:>12}{size:>12}{size / raw_size:>9.1%}"
+            f"{compress_time / len(payloads) * 1e6:>12.1f}{decompress_time / len(payloads) * 1e6:>12.1f}"
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        # 一半样本训练字典, 另一半测试, 避免训练集和测试集相同
+        training = _sample_payloads(count, seed=1)
+        payloads = _sample_payloads(count, seed=2)
+        trained_id = max(compression.ZDICTS) + 1
+        compression.ZDICTS[trained_id] = compression.train_zdict(training)
+        try:
+            self.stdout.write(f"{'方式':<14}{'原始字节':>8}{'压缩后':>9}{'比例':>8}{'压缩us/条':>8}{'解压us/条':>8}")
+            self._measure("zlib", payloads, 0)
+            self._measure("zlib+预置字典", payloads, compression.DEFAULT_ZDICT_ID)
+            self._measure("zlib+训练字典", payloads, trained_id)
+        finally:
+            compression.ZDICTS.pop(trained_id)
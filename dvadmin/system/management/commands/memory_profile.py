@@ -0,0 +1,92 @@
+"""
+内存分析: 在本进程内反复请求接口, 报告内存增长最多的模块, 结果写成JSON供不同版本比较
+python manage.py memory_profile --url /api/init/settings/ --url /api/captcha/ --requests 500 --output mem_v1.json
+python manage.py memory_profile --username admin --url /api/system/operation_log/ --output mem_v2.json
+python manage.py memory_profile --compare mem_v1.json mem_v2.json
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from dvadmin.system.models import Users
+from dvadmin.utils.memory_profiler import MemoryProfiler, compare_reports, write_report
+
+
+class Command(BaseCommand):
+    help = "用tracemalloc分析反复请求接口时的内存增长, 按模块输出并保存为JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", action="append", default=[], help="请求的地址(GET), 可多次指定")
+        parser.add_argument("--requests", type=int, default=200, help="每个地址的请求次数")
+        parser.add_argument("--snapshots", type=int, default=4, help="过程中拍快照的次数")
+        parser.add_argument("--warmup", type=int, default=10, help="开始追踪前每个地址的预热请求次数")
+        parser.add_argument("--frames", type=int, default=10, help="调用栈深度")
+        parser.add_argument("--limit", type=int, default=30, help="输出的模块数")
+        parser.add_argument("--username", help="以该用户的JWT访问")
+        parser.add_argument("--host", default="localhost", help="请求的Host, 需要在ALLOWED_HOSTS中")
+        parser.add_argument("--output", help="报告文件")
+        parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="比较两个报告文件")
+
+    def handle(self, *args, **options):
+        if options["compare"]:
+            return self._compare(*options["compare"], limit=options["limit"])
+        if not options["url"]:
+            raise CommandError("请指定 --url 或 --compare")
+        if options["requests"] <= 0 or options["snapshots"] <= 0:
+            raise CommandError("--requests、--snapshots 必须大于0")
+
+        headers = {"HTTP_HOST": options["host"]}
+        if options["username"]:
+            user = Users.objects.filter(username=options["username"]).first()
+            if user is None:
+                raise CommandError(f"用户 {options['username']} 不存在")
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+        client = Client(**headers)
+
+        def run(count):
+            for url in options["url"]:
+                for _ in range(count):
+                    client.get(url)
+
+        # 预热, 排除首次导入模块、建立连接、填充缓存的内存
+        run(options["warmup"])
+        profiler = MemoryProfiler()
+        profiler.start(frames=options["frames"])
+        try:
+            per_snapshot = max(options["requests"] // options["snapshots"], 1)
+            done = 0
+            while done < options["requests"]:
+                count = min(per_snapshot, options["requests"] - done)
+                run(count)
+                done += count
+                profiler.snapshot()
+                self.stdout.write(f"已请求 {done}/{options['requests']} 轮, 当前追踪内存 {profiler.history[-1][1] / 1024:.1f} KB")
+            report = profiler.report(limit=options["limit"])
+        finally:
+            profiler.stop()
+        report["urls"] = options["url"]
+        report["requests"] = options["requests"]
+
+        self.stdout.write(f"{'增长(KB)':>12} {'对象数':>8}  模块")
+        for item in report["modules"]:
+            self.stdout.write(f"{item['size_diff'] / 1024:>12.1f} {item['count_diff']:>8}  {item['module']}")
+        if options["output"]:
+            write_report(report, options["output"])
+            self.stdout.write(self.style.SUCCESS(f"报告已写入 {options['output']}"))
+
+    def _compare(self, old_path, new_path, limit):
+        try:
+            with open(old_path, encoding="utf-8") as f:
+                old = json.load(f)
+            with open(new_path, encoding="utf-8") as f:
+                new = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"读取报告失败: {e}")
+        self.stdout.write(f"{'旧(KB)':>10} {'新(KB)':>10} {'变化(KB)':>10}  模块")
+        for row in compare_reports(old, new)[:limit]:
+            self.stdout.write(
+                f"{row['old_size_diff'] / 1024:>10.1f} {row['new_size_diff'] / 1024:>10.1f} "
+                f"{row['change'] / 1024:>+10.1f}  {row['module']}"
+            )
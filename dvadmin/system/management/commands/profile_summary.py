@@ -0,0 +1,53 @@
+"""
+汇总慢请求profile, 列出所有文件中最耗时的函数
+python manage.py profile_summary
+python manage.py profile_summary --route api_login --sort cumulative --limit 30
+"""
+import os
+import pstats
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dvadmin.utils.profiling import list_profiles
+
+SORT_KEYS = ("tottime", "cumulative", "ncalls")
+
+
+class Command(BaseCommand):
+    help = "合并SlowRequestProfilingMiddleware保存的.pstats文件, 输出耗时最多的函数"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dir",
+            default=getattr(settings, "SLOW_REQUEST_PROFILE_DIR", None),
+            help="profile目录",
+        )
+        parser.add_argument("--route", help="只汇总文件名中包含该路由的profile, 如 api_login")
+        parser.add_argument("--sort", choices=SORT_KEYS, default="tottime", help="排序方式")
+        parser.add_argument("--limit", type=int, default=20, help="输出的函数个数")
+
+    def handle(self, *args, **options):
+        if not options["dir"]:
+            raise CommandError("请指定 --dir 或设置 SLOW_REQUEST_PROFILE_DIR")
+        paths = list_profiles(options["dir"])
+        if options["route"]:
+            paths = [path for path in paths if options["route"] in os.path.basename(path)]
+        if not paths:
+            self.stdout.write("没有profile文件")
+            return
+
+        # 文件名: <时间>_<耗时>ms_<请求方式>_<路由>_<pid>.pstats
+        routes = Counter("_".join(os.path.basename(path).split("_")[2:-1]) for path in paths)
+        self.stdout.write(f"共 {len(paths)} 个profile:")
+        for route, count in routes.most_common():
+            self.stdout.write(f"  {count:>5}  {route}")
+
+        stats = pstats.Stats(paths[0], stream=self.stdout)
+        for path in paths[1:]:
+            try:
+                stats.add(path)
+            except (OSError, EOFError, TypeError, ValueError):
+                self.stderr.write(f"跳过无法读取的文件: {path}")
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
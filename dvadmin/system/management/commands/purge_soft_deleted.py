@@ -0,0 +1,106 @@
+"""
+物理删除过期的软删除记录
+python manage.py purge_soft_deleted --days 30
+python manage.py purge_soft_deleted --model system.Dept --before 2026-01-01 --dry-run
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+from django.db.models import Q
+
+from dvadmin.utils.soft_delete import cascade_relations, is_soft_deletable, soft_deletable_models
+
+
+class Command(BaseCommand):
+    help = "按主键范围分批物理删除早于截止时间的软删除记录, 中断后重新执行即可继续"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "SOFT_DELETE_RETENTION_DAYS", 30),
+            help="软删除的记录保留多少天",
+        )
+        parser.add_argument("--before", help="截止日期(YYYY-MM-DD), 优先于--days")
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            help="只清理指定模型(app_label.Model), 可重复, 默认所有软删除模型",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000, help="每批主键范围大小")
+        parser.add_argument("--sleep", type=float, default=0.1, help="每批之间暂停的秒数")
+        parser.add_argument("--dry-run", action="store_true", help="只统计不执行")
+
+    def handle(self, *args, **options):
+        if options["before"]:
+            try:
+                cutoff = datetime.strptime(options["before"], "%Y-%m-%d")
+            except ValueError:
+                raise CommandError("--before 格式应为 YYYY-MM-DD")
+        else:
+            cutoff = datetime.now() - timedelta(days=options["days"])
+        chunk_size = options["chunk_size"]
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size 必须大于0")
+        if options["models"]:
+            try:
+                models = [apps.get_model(label) for label in options["models"]]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+            for model in models:
+                if not is_soft_deletable(model):
+                    raise CommandError(f"{model._meta.label} 不是软删除模型")
+        else:
+            models = soft_deletable_models()
+
+        total = 0
+        for model in models:
+            total += self._purge(model, cutoff, chunk_size, options["sleep"], options["dry_run"])
+        if not options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"完成, 共删除 {total} 条"))
+
+    def _expired(self, model, cutoff):
+        """
+        早于截止时间的软删除记录, 没有删除时间的历史记录视为已过期
+        仍有未删除的下级记录(如单独恢复过的)时不清理, 否则物理删除会把它们一起级联删除
+        """
+        queryset = model._base_manager.filter(is_deleted=True)
+        if any(field.name == "delete_datetime" for field in model._meta.concrete_fields):
+            queryset = queryset.filter(Q(delete_datetime__lt=cutoff) | Q(delete_datetime__isnull=True))
+        for related_model, field_name in cascade_relations(model):
+            alive = related_model._base_manager.filter(is_deleted=False, **{f"{field_name}__isnull": False})
+            queryset = queryset.exclude(pk__in=alive.values(field_name))
+        return queryset
+
+    def _purge(self, model, cutoff, chunk_size, sleep, dry_run) -> int:
+        label = model._meta.label
+        expired = self._expired(model, cutoff)
+        first = expired.order_by("pk").values_list("pk", flat=True).first()
+        if first is None:
+            self.stdout.write(f"{label}: 没有需要清理的记录")
+            return 0
+        last = expired.order_by("-pk").values_list("pk", flat=True).first()
+        if dry_run:
+            self.stdout.write(f"{label}: 截止 {cutoff:%Y-%m-%d %H:%M:%S}, 主键范围 {first}-{last}, 共 {expired.count()} 条")
+            return 0
+
+        using = router.db_for_write(model)
+        total = 0
+        # 每批重新按条件筛选, 已经删除的记录不会再出现, 中断后重新执行从剩余的记录继续
+        start = first // chunk_size * chunk_size
+        while start <= last:
+            end = start + chunk_size
+            ids = list(expired.using(using).filter(pk__gte=start, pk__lt=end).values_list("pk", flat=True))
+            if ids:
+                # 经过Collector删除, 关联的记录按on_delete处理, 每批在一个事务中
+                deleted, _ = model._base_manager.using(using).filter(pk__in=ids).delete()
+                total += deleted
+                self.stdout.write(f"{label}: 已删除 {start}-{end - 1}: {deleted} 条, 累计 {total} 条")
+                time.sleep(sleep)
+            start = end
+        return total
@@ -0,0 +1,20 @@
+"""
+重新计算部门的tree_path
+python manage.py rebuild_dept_tree
+"""
+from django.core.management.base import BaseCommand
+
+from dvadmin.system.models import Dept
+
+
+class Command(BaseCommand):
+    help = "按上级部门重新计算所有部门的物化路径, 用于批量导入后或修复数据"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=900, help="每条UPDATE更新的部门数")
+
+    def handle(self, *args, **options):
+        updated, cyclic = Dept.rebuild_tree(batch_size=options["batch_size"])
+        if cyclic:
+            self.stderr.write(f"以下部门的上级链中有循环, 已作为根部门处理: {sorted(cyclic)}")
+        self.stdout.write(self.style.SUCCESS(f"完成, 更新 {updated} 个部门"))
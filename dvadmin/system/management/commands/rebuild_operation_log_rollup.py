@@ -0,0 +1,40 @@
+"""
+从历史操作日志重建小时汇总
+python manage.py rebuild_operation_log_rollup --days 30
+python manage.py rebuild_operation_log_rollup --start "2026-01-01 00:00:00" --end "2026-02-01 00:00:00"
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from dvadmin.utils import log_rollup
+
+
+class Command(BaseCommand):
+    help = "按主键范围分批聚合操作日志, 重建[start, end)内的小时汇总"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="开始时间, 默认为end之前--days天")
+        parser.add_argument("--end", help="结束时间(不包含), 默认为当前小时, 当前小时仍在增量累加, 不建议重建")
+        parser.add_argument("--days", type=int, default=30, help="未指定start时重建的天数")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="每批主键范围大小")
+
+    @staticmethod
+    def _parse(value: str, name: str) -> datetime:
+        result = parse_datetime(value)
+        if result is None:
+            raise CommandError(f"--{name} 格式应为 YYYY-MM-DD HH:MM:SS")
+        return result
+
+    def handle(self, *args, **options):
+        end = self._parse(options["end"], "end") if options["end"] else log_rollup.truncate_hour(datetime.now())
+        start = self._parse(options["start"], "start") if options["start"] else end - timedelta(days=options["days"])
+        if start >= end:
+            raise CommandError("start 必须早于 end")
+
+        def on_chunk(start_id, end_id):
+            self.stdout.write(f"已聚合主键 {start_id}-{end_id - 1}")
+
+        total = log_rollup.rebuild(start, end, chunk_size=options["chunk_size"], on_chunk=on_chunk)
+        self.stdout.write(self.style.SUCCESS(f"完成, {start:%Y-%m-%d %H:00} 至 {end:%Y-%m-%d %H:00} 共写入 {total} 条汇总"))
@@ -0,0 +1,30 @@
+"""
+恢复软删除的记录及其在同一次删除中被级联删除的下级记录
+python manage.py restore_soft_deleted system.Dept 5 8
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+
+from dvadmin.utils.soft_delete import cascade_restore, is_soft_deletable
+
+
+class Command(BaseCommand):
+    help = "按模型逐层批量恢复整棵子树, 可重复执行, 中断后重新执行即可继续"
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="app_label.Model")
+        parser.add_argument("ids", nargs="+", help="要恢复的记录主键")
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        if not is_soft_deletable(model):
+            raise CommandError(f"{model._meta.label} 不是软删除模型")
+        queryset = model._base_manager.using(router.db_for_write(model)).filter(pk__in=options["ids"])
+        total, summary = cascade_restore(queryset)
+        for label, count in summary.items():
+            self.stdout.write(f"{label}: {count} 条")
+        self.stdout.write(self.style.SUCCESS(f"完成, 共恢复 {total} 条"))
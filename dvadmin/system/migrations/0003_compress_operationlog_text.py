@@ -0,0 +1,94 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:45
+
+import dvadmin.utils.fields
+from django.db import migrations, router
+
+CHUNK_SIZE = 2000
+
+
+def _copy_in_chunks(apps, schema_editor, source_fields, target_fields):
+    """按主键范围分批复制字段, 每批一次查询+一次bulk_update"""
+    OperationLog = apps.get_model("system", "OperationLog")
+    alias = schema_editor.connection.alias
+    # 日志分库时(见 OPERATION_LOG_DATABASE), 只在日志库执行
+    if not router.allow_migrate_model(alias, OperationLog):
+        return
+    manager = OperationLog._base_manager.db_manager(alias)
+    last_id = 0
+    while True:
+        rows = list(
+            manager.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", *source_fields)[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        objs = []
+        for row in rows:
+            obj = OperationLog(id=row[0])
+            for target, value in zip(target_fields, row[1:]):
+                setattr(obj, target, value)
+            objs.append(obj)
+        manager.bulk_update(objs, target_fields)
+        last_id = rows[-1][0]
+
+
+def compress_existing_rows(apps, schema_editor):
+    _copy_in_chunks(
+        apps,
+        schema_editor,
+        ["request_body", "json_result"],
+        ["request_body_compressed", "json_result_compressed"],
+    )
+
+
+def decompress_existing_rows(apps, schema_editor):
+    _copy_in_chunks(
+        apps,
+        schema_editor,
+        ["request_body_compressed", "json_result_compressed"],
+        ["request_body", "json_result"],
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    request_body、json_result 改为压缩存储
+    文本列不能直接转换为二进制列(postgresql的 text::bytea 会解析反斜杠), 所以先新增列、复制并压缩, 再替换旧列
+    """
+
+    dependencies = [
+        ('system', '0002_rename_form_time_type_systemconfig_form_item_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='operationlog',
+            name='request_body_compressed',
+            field=dvadmin.utils.fields.CompressedTextField(blank=True, help_text='null=True,blank=True,请求参数', null=True, verbose_name='请求参数'),
+        ),
+        migrations.AddField(
+            model_name='operationlog',
+            name='json_result_compressed',
+            field=dvadmin.utils.fields.CompressedTextField(blank=True, help_text='返回信息', null=True, verbose_name='返回信息'),
+        ),
+        migrations.RunPython(compress_existing_rows, decompress_existing_rows),
+        migrations.RemoveField(
+            model_name='operationlog',
+            name='request_body',
+        ),
+        migrations.RemoveField(
+            model_name='operationlog',
+            name='json_result',
+        ),
+        migrations.RenameField(
+            model_name='operationlog',
+            old_name='request_body_compressed',
+            new_name='request_body',
+        ),
+        migrations.RenameField(
+            model_name='operationlog',
+            old_name='json_result_compressed',
+            new_name='json_result',
+        ),
+    ]
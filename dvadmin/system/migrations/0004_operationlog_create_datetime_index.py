@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0003_compress_operationlog_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['create_datetime'], name='op_log_create_datetime_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0004_operationlog_create_datetime_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='operationlog',
+            name='op_log_create_datetime_idx',
+        ),
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['-create_datetime', '-id'], name='op_log_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['request_path', '-create_datetime', '-id'], name='op_log_path_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['creator', '-create_datetime', '-id'], name='op_log_creator_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operationlog',
+            index=models.Index(fields=['request_ip', '-create_datetime', '-id'], name='op_log_ip_time_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:05
+
+from django.db import migrations, router
+
+CHUNK_SIZE = 2000
+# 建表语句写在迁移中, 不引用 dvadmin.utils.log_search, 之后修改该模块不会影响已执行的迁移
+FTS_TABLE = "oahaidvadmin_system_operation_log_fts"
+
+
+def create_fulltext_index(apps, schema_editor):
+    OperationLog = apps.get_model("system", "OperationLog")
+    connection = schema_editor.connection
+    if not router.allow_migrate_model(connection.alias, OperationLog):
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(request_path, request_body, request_msg, tokenize='unicode61')"
+            )
+            insert_sql = (
+                f"INSERT INTO {FTS_TABLE} (rowid, request_path, request_body, request_msg) VALUES (%s, %s, %s, %s)"
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {FTS_TABLE} (log_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {FTS_TABLE}_gin ON {FTS_TABLE} USING GIN (document)")
+            insert_sql = (
+                f"INSERT INTO {FTS_TABLE} (log_id, document) "
+                f"VALUES (%s, to_tsvector('simple', concat_ws(' ', %s, %s, %s))) "
+                f"ON CONFLICT (log_id) DO UPDATE SET document = EXCLUDED.document"
+            )
+        else:
+            return
+        # 已有的日志分批建立索引
+        last_id = 0
+        while True:
+            logs = list(
+                OperationLog._base_manager.using(connection.alias)
+                .filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "request_path", "request_body", "request_msg")[:CHUNK_SIZE]
+            )
+            if not logs:
+                break
+            if connection.vendor == "sqlite":
+                cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(log.id,) for log in logs])
+            cursor.executemany(
+                insert_sql,
+                [
+                    (log.id, log.request_path or "", log.request_body or "", log.request_msg or "")
+                    for log in logs
+                ],
+            )
+            last_id = logs[-1].id
+
+
+def drop_fulltext_index(apps, schema_editor):
+    OperationLog = apps.get_model("system", "OperationLog")
+    connection = schema_editor.connection
+    if connection.vendor in ("sqlite", "postgresql") and router.allow_migrate_model(connection.alias, OperationLog):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0005_operationlog_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
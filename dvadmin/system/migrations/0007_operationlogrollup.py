@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0006_operationlog_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperationLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='小时', verbose_name='小时')),
+                ('request_modular', models.CharField(blank=True, default='', help_text='请求模块', max_length=64, verbose_name='请求模块')),
+                ('request_path', models.CharField(blank=True, default='', help_text='请求地址', max_length=255, verbose_name='请求地址')),
+                ('request_method', models.CharField(blank=True, default='', help_text='请求方式', max_length=8, verbose_name='请求方式')),
+                ('status', models.BooleanField(default=False, help_text='响应状态', verbose_name='响应状态')),
+                ('response_code', models.CharField(blank=True, default='', help_text='响应状态码', max_length=32, verbose_name='响应状态码')),
+                ('count', models.BigIntegerField(default=0, help_text='请求次数', verbose_name='请求次数')),
+            ],
+            options={
+                'verbose_name': '操作日志汇总',
+                'verbose_name_plural': '操作日志汇总',
+                'db_table': 'oahaidvadmin_system_operation_log_rollup',
+                'ordering': ('-hour',),
+                'constraints': [models.UniqueConstraint(fields=('hour', 'request_modular', 'request_path', 'request_method', 'status', 'response_code'), name='op_log_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0007_operationlogrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='operationlog',
+            name='creator',
+            field=models.ForeignKey(db_constraint=False, help_text='help_text:创建人', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_query_name='creator_query', to=settings.AUTH_USER_MODEL, verbose_name='创建人'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:25
+
+from django.db import migrations, models, router
+
+from dvadmin.utils.tree_path import build_paths
+
+
+def fill_tree_path(apps, schema_editor):
+    Dept = apps.get_model("system", "Dept")
+    alias = schema_editor.connection.alias
+    # 操作日志分库时, 日志库中没有部门表
+    if not router.allow_migrate_model(alias, Dept):
+        return
+    manager = Dept._base_manager.db_manager(alias)
+    paths, _ = build_paths(manager.values_list("id", "parent_id").iterator(chunk_size=5000))
+    manager.bulk_update(
+        [Dept(id=pk, tree_path=path) for pk, path in paths.items()], ["tree_path"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    部门物化路径, 已有数据按上级部门计算路径
+    """
+
+    dependencies = [
+        ('system', '0008_operationlog_creator_do_nothing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dept',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='部门路径', max_length=512, verbose_name='部门路径'),
+        ),
+        migrations.RunPython(fill_tree_path, migrations.RunPython.noop),
+    ]
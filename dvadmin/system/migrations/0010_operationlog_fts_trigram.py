@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:10
+
+from django.db import migrations, router
+
+CHUNK_SIZE = 2000
+FTS_TABLE = "oahaidvadmin_system_operation_log_fts"
+# trigram分词器从SQLite 3.34开始提供
+TRIGRAM_MIN_VERSION = (3, 34, 0)
+
+
+def _rebuild_fts(apps, schema_editor, tokenize):
+    """
+    SQLite的FTS5表换分词器需要重建, 重新写入所有日志
+    unicode61把连续的中文当作一个词, 检索不到其中的词语; trigram按三个字符切分, 可以检索任意子串
+    """
+    OperationLog = apps.get_model("system", "OperationLog")
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite" or not router.allow_migrate_model(connection.alias, OperationLog):
+        return
+    if tokenize == "trigram" and connection.Database.sqlite_version_info < TRIGRAM_MIN_VERSION:
+        # 低版本继续使用unicode61, 检索时按表结构判断, 见 dvadmin.utils.log_search
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} "
+            f"USING fts5(request_path, request_body, request_msg, tokenize='{tokenize}')"
+        )
+        last_id = 0
+        while True:
+            logs = list(
+                OperationLog._base_manager.using(connection.alias)
+                .filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "request_path", "request_body", "request_msg")[:CHUNK_SIZE]
+            )
+            if not logs:
+                break
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, request_path, request_body, request_msg) VALUES (%s, %s, %s, %s)",
+                [
+                    (log.id, log.request_path or "", log.request_body or "", log.request_msg or "")
+                    for log in logs
+                ],
+            )
+            last_id = logs[-1].id
+
+
+def use_trigram(apps, schema_editor):
+    _rebuild_fts(apps, schema_editor, "trigram")
+
+
+def use_unicode61(apps, schema_editor):
+    _rebuild_fts(apps, schema_editor, "unicode61")
+
+
+class Migration(migrations.Migration):
+    """
+    SQLite全文检索改用trigram分词器, 支持检索中文操作说明中的词语
+    """
+
+    dependencies = [
+        ('system', '0009_dept_tree_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_trigram, use_unicode61),
+    ]
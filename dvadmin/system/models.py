@@ -1,11 +1,20 @@
 import os
+from collections import defaultdict
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models, router, transaction
+from django.db.models import Count, Max, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Concat, Substr
 
 from My_django_vue3_admin import dispatch
-from dvadmin.utils.models import CoreModel, table_prefix
+from dvadmin.utils.cache_stats import cache_stats
+from dvadmin.utils.fields import CompressedTextField
+from dvadmin.utils.models import CoreModel, CoreModelManager, table_prefix
+from dvadmin.utils.tree_path import SEPARATOR, build_paths, child_path, path_ids, subtree_range
+from dvadmin.utils.versioned_cache import VersionedCache
 
 
 class CustomUserManager(UserManager):
@@ -170,6 +179,19 @@ class Role(CoreModel):
         ordering = ("sort",)
 
 
+# 进程内的部门全称、部门树等缓存, 见 Dept.get_region_names 和 dvadmin.system.views.dept.DeptTreeView
+dept_tree_cache = VersionedCache("dept_tree")
+
+
+class DeptManager(CoreModelManager):
+    def bulk_insert(self, objs, request=None, **kwargs) -> int:
+        """批量创建不会调用save(), 插入后按上级部门补全tree_path"""
+        total = super().bulk_insert(objs, request=request, **kwargs)
+        if total:
+            self.model.rebuild_tree(using=self.db)
+        return total
+
+
 class Dept(CoreModel):
     name = models.CharField(
         max_length=64, verbose_name="部门名称", help_text="部门名称"
@@ -213,6 +235,20 @@ class Dept(CoreModel):
         blank=True,
         help_text="上级部门",
     )
+    # 物化路径, 从根部门到本部门的id, 如 "/1/5/", 由save()维护, 见 dvadmin.utils.tree_path
+    tree_path = models.CharField(
+        max_length=512,
+        default="",
+        blank=True,
+        db_index=True,
+        verbose_name="部门路径",
+        help_text="部门路径",
+    )
+
+    objects = DeptManager()
+
+    # 部门树接口(get_tree)返回的字段, 这些字段变化时部门树缓存失效
+    tree_fields = ("id", "name", "key", "sort", "owner", "phone", "email", "status", "parent_id")
 
     @classmethod
     def _recursion(cls, instance, parent: str, result: str):
@@ -231,34 +267,243 @@ class Dept(CoreModel):
     @classmethod
     def get_region_name(cls, obj):
         """
-        获取某个用户的自己部门到自己所有上级名称(不是获取所有部门)
+        获取某个用户的自己部门到自己所有上级名称(不是获取所有部门), 如 "总部/研发部/后端组"
         """
-        dept_name_all = cls._recursion(obj, "parent", "name")
-        # 收集到的数据顺序是从子到父（子部门 → 父部门 → 祖父部门）
-        # 部门层级展示通常需要从上到下的顺序（祖父部门 → 父部门 → 子部门）
-        dept_name_all.reverse()
-        return "/".join(dept_name_all)
+        return cls.get_region_names([obj]).get(obj.pk, "")
+
+    @classmethod
+    def get_region_names(cls, depts) -> dict[int, str]:
+        """
+        批量获取部门全称, 用于列表页一次取出整页部门(或用户所属部门)的全称
+        祖先id从tree_path中解析, 所有祖先的名称一次查询; 只传id时先查一次路径
+        结果缓存在进程内, 部门新增、移动、改名、删除时通过 dept_tree_cache 的版本号失效
+        :param depts: 部门id或Dept实例
+        :return: {部门id: "总部/研发部/后端组"}, 不存在的部门不在结果中
+        """
+        names = dept_tree_cache.sync().setdefault("region_names", {})
+        result, paths, missing = {}, {}, []
+        for dept in depts:
+            pk, path = (dept.pk, dept.tree_path) if isinstance(dept, Dept) else (dept, None)
+            if pk is None or pk in result:
+                continue
+            name = names.get(pk)
+            cache_stats.record("dept_region_name", hit=name is not None)
+            if name is not None:
+                result[pk] = name
+            elif path:
+                paths[pk] = path
+            else:
+                missing.append(pk)
+        # 结果会缓存到下一次 bump(), 从主库读取, 见 VersionedCache
+        manager = cls._base_manager.using(DEFAULT_DB_ALIAS)
+        if missing:
+            for pk, path in manager.filter(pk__in=missing).values_list("id", "tree_path"):
+                # 还没有计算路径的部门(批量导入后未执行 rebuild_dept_tree)只显示自己的名称
+                paths[pk] = path or child_path(None, pk)
+        if paths:
+            ancestor_ids = {ancestor for path in paths.values() for ancestor in path_ids(path)}
+            dept_names = dict(manager.filter(pk__in=ancestor_ids).values_list("id", "name"))
+            for pk, path in paths.items():
+                if pk not in dept_names:
+                    continue
+                names[pk] = result[pk] = "/".join(
+                    dept_names[ancestor] for ancestor in path_ids(path) if ancestor in dept_names
+                )
+        return result
+
+    @classmethod
+    def get_tree(cls, status: bool = None, using: str = None) -> list[dict]:
+        """
+        嵌套的部门树, 一次查询按(sort, id)取出所有部门, 再用 {id: 节点} 索引O(n)挂到上级的children下
+        查询已排好序, 同一上级的下级部门按顺序追加, 不需要再排序
+        :param status: 只返回该状态的部门, None为全部; 上级被过滤掉(或不存在)的部门作为根节点
+        :param using: 查询的数据库, 结果要缓存时传主库, 默认由路由决定
+        :return: [{"id": 1, "name": "总部", ..., "children": [...]}]
+        """
+        queryset = cls._base_manager.db_manager(using).order_by("sort", "id")
+        if status is not None:
+            queryset = queryset.filter(status=status)
+        nodes = {}
+        for node in queryset.values(*cls.tree_fields):
+            node["children"] = []
+            nodes[node["id"]] = node
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node["parent_id"])
+            # 上级链中有循环的部门(正常保存时不会出现)不会出现在树中
+            (parent["children"] if parent is not None else roots).append(node)
+        return roots
+
+    @classmethod
+    def get_tree_state(cls, using: str = None) -> tuple:
+        """
+        部门表的 (最后修改时间, 部门数), 一次聚合查询
+        所有进程从数据库读到的相同, 用于校验进程内缓存的部门树; 新增、修改(save)、删除都会改变其中一项
+        """
+        state = cls._base_manager.db_manager(using).aggregate(updated=Max("update_datetime"), count=Count("id"))
+        return state["updated"], state["count"]
 
     @classmethod
     def recursion_all_dept(cls, dept_id: int, dept_all_list=None, dept_list=None):
         """
-        递归获取部门的所有下级部门
+        获取部门及其所有下级部门的id
         :param dept_id: 需要获取的id
-        :param dept_all_list: 存{'id': 2, 'parent': 1}
+        :param dept_all_list: 存{'id': 2, 'parent': 1}, 传入时在这些数据中查找, 否则按tree_path一次查询
         :param dept_list: 最后结果
         :return:
         """
         if not dept_all_list:
-            # 接收dict格式{'id': 2, 'parent': 1}
-            dept_all_list = Dept.objects.values("id", "parent")
-        if dept_list is None:
-            dept_list = [dept_id]
+            return cls.get_descendant_ids(dept_id)
+        children = defaultdict(list)
         for ele in dept_all_list:
-            if ele.get("parent") == dept_id:
-                dept_list.append(ele.get("id"))
-                cls.recursion_all_dept(ele.get("id"), dept_all_list, dept_list)
+            children[ele.get("parent")].append(ele.get("id"))
+        dept_list = [dept_id] if dept_list is None else list(dept_list)
+        visited = set(dept_list)
+        stack = [dept_id]
+        while stack:
+            for child in children[stack.pop()]:
+                if child not in visited:
+                    visited.add(child)
+                    dept_list.append(child)
+                    stack.append(child)
         return list(set(dept_list))
 
+    @classmethod
+    def get_descendant_ids(cls, dept_id: int, include_self: bool = True) -> list[int]:
+        """
+        部门的所有下级部门id, 按主键查出路径后一次范围查询
+        没有tree_path的部门(bulk_create导入后未执行rebuild_tree)按上级部门逐层查询
+        """
+        path = cls._base_manager.filter(pk=dept_id).values_list("tree_path", flat=True).first()
+        if not path:
+            return cls._walk_descendant_ids(dept_id, include_self)
+        low, high = subtree_range(path)
+        queryset = cls._base_manager.filter(tree_path__gte=low, tree_path__lt=high)
+        if not include_self:
+            queryset = queryset.exclude(pk=dept_id)
+        return list(queryset.values_list("id", flat=True))
+
+    @classmethod
+    def _walk_descendant_ids(cls, dept_id: int, include_self: bool = True) -> list[int]:
+        """按parent_id逐层查询下级部门, 每层一次查询"""
+        result = [dept_id]
+        visited, level = {dept_id}, [dept_id]
+        while level:
+            level = [
+                pk
+                for pk in cls._base_manager.filter(parent_id__in=level).values_list("id", flat=True)
+                if pk not in visited
+            ]
+            visited.update(level)
+            result.extend(level)
+        return result if include_self else result[1:]
+
+    def get_ancestor_ids(self) -> list[int]:
+        """从根部门到上级部门的id, 从tree_path中解析, 不查询数据库"""
+        return path_ids(self.tree_path)[:-1]
+
+    def _parent_path(self, using) -> str:
+        if self.parent_id is None:
+            return ""
+        if Dept.parent.is_cached(self) and self.parent.tree_path:
+            return self.parent.tree_path
+        path = Dept._base_manager.using(using).filter(pk=self.parent_id).values_list("tree_path", flat=True).first()
+        return path or child_path(None, self.parent_id)
+
+    def _check_parent(self, parent_path: str):
+        """上级部门不能是自己或自己的下级"""
+        if self.parent_id == self.pk or (self.tree_path and parent_path.startswith(self.tree_path)):
+            raise ValidationError("上级部门不能是自己或自己的下级部门")
+
+    def save(self, *args, **kwargs):
+        """
+        新增时在插入后写入tree_path, 修改上级部门时一条UPDATE替换整棵子树的路径前缀
+        删除时子部门随上级级联删除(on_delete=CASCADE), 不需要维护路径
+        """
+        adding = self._state.adding
+        update_fields = kwargs.get("update_fields")
+        dirty = [] if adding else self.get_dirty_fields()
+        if update_fields is not None:
+            dirty = [name for name in dirty if name in update_fields or f"{name}_id" in update_fields]
+        moved = "parent" in dirty
+        using = kwargs.get("using") or router.db_for_write(Dept, instance=self)
+        tree_changed = adding or any(name in self.tree_fields or f"{name}_id" in self.tree_fields for name in dirty)
+        if not (adding or moved or not self.tree_path):
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic(using=using):
+                parent_path = self._parent_path(using)
+                if moved:
+                    self._check_parent(parent_path)
+                super().save(*args, **kwargs)
+                old_path, new_path = self.tree_path, child_path(parent_path, self.pk)
+                manager = Dept._base_manager.using(using)
+                if moved and old_path:
+                    low, high = subtree_range(old_path)
+                    manager.filter(tree_path__gte=low, tree_path__lt=high).update(
+                        tree_path=Concat(Value(new_path), Substr("tree_path", len(old_path) + 1))
+                    )
+                elif old_path != new_path:
+                    manager.filter(pk=self.pk).update(tree_path=new_path)
+                self.tree_path = new_path
+                self._store_loaded_values(["tree_path"])
+        if tree_changed:
+            # 部门树变化, 提交后让所有进程缓存的部门全称、部门树失效
+            # 必须在写入之后注册: 不在事务中时on_commit立即执行, 写入前失效的话,
+            # 其间的请求会按旧数据重新生成缓存并保存在新版本下, 直到下次失效前都是旧数据
+            transaction.on_commit(dept_tree_cache.bump, using=using)
+
+    def delete(self, using=None, keep_parents=False):
+        res = super().delete(using, keep_parents)
+        transaction.on_commit(dept_tree_cache.bump, using=using or router.db_for_write(Dept, instance=self))
+        return res
+
+    @classmethod
+    def rebuild_tree(cls, using: str = None, batch_size: int = 900) -> tuple[int, set[int]]:
+        """
+        按上级部门重新计算所有部门的tree_path, 用于批量导入(bulk_create不会调用save)或数据修复
+        只更新路径有变化的部门. 同一上级的部门路径前缀相同, 每条UPDATE更新一批部门:
+        SET tree_path = CASE parent_id WHEN 1 THEN '/1/' ... END || id || '/'
+        CASE用RawSQL拼接, 每个分支都构造ORM表达式时耗时主要在表达式解析上
+        :param batch_size: 每条UPDATE的参数个数上限(部门id + 2 x 上级个数), SQLite最多999个
+        :return: (更新的部门数, 上级链中有循环的部门id)
+        """
+        using = using or router.db_for_write(cls)
+        manager = cls._base_manager.using(using)
+        nodes = list(manager.values_list("id", "parent_id", "tree_path").iterator(chunk_size=5000))
+        paths, cyclic = build_paths((pk, parent_id) for pk, parent_id, _ in nodes)
+        # 根部门、上级不存在或上级链中有循环的部门以自己为根, 前缀为 "/"
+        roots, children = [], []
+        for pk, parent_id, path in nodes:
+            if paths[pk] != path:
+                (roots if paths[pk] == child_path(None, pk) else children).append((pk, parent_id))
+        id_text = Cast("id", models.CharField())
+        parent_column = connections[using].ops.quote_name(cls._meta.get_field("parent").column)
+        with transaction.atomic(using=using):
+            for start in range(0, len(roots), batch_size):
+                manager.filter(pk__in=[pk for pk, _ in roots[start : start + batch_size]]).update(
+                    tree_path=Concat(Value(SEPARATOR), id_text, Value(SEPARATOR))
+                )
+            # 按上级排序分批, 每批涉及的上级尽量少
+            children.sort(key=lambda node: node[1])
+            batch, parents = [], []
+            for pk, parent_id in children + [(None, None)]:
+                new_parent = not parents or parents[-1] != parent_id
+                if batch and (pk is None or len(batch) + 2 * (len(parents) + new_parent) > batch_size):
+                    prefix = RawSQL(
+                        f"CASE {parent_column} {'WHEN %s THEN %s ' * len(parents)}END",
+                        [param for parent in parents for param in (parent, paths[parent])],
+                        output_field=models.CharField(),
+                    )
+                    manager.filter(pk__in=batch).update(tree_path=Concat(prefix, id_text, Value(SEPARATOR)))
+                    batch, parents, new_parent = [], [], True
+                batch.append(pk)
+                if new_parent:
+                    parents.append(parent_id)
+        if roots or children:
+            transaction.on_commit(dept_tree_cache.bump, using=using)
+        return len(roots) + len(children), cyclic
+
     class Meta:
         db_table = table_prefix + "system_dept"
         verbose_name = "部门表"
@@ -352,6 +597,7 @@ class SystemConfig(CoreModel):
         using=None,
         update_fields=None,
     ):
+        changed = self.has_changes()
         super().save(
             *args,
             force_insert=force_insert,
@@ -359,7 +605,8 @@ class SystemConfig(CoreModel):
             using=using,
             update_fields=update_fields,
         )
-        dispatch.refresh_system_config()  # 有更新则刷新系统配置
+        if changed:
+            dispatch.refresh_system_config()  # 有更新则刷新系统配置
 
     def delete(self, using=None, keep_parents=False):
         res = super().delete(using, keep_parents)
@@ -368,6 +615,16 @@ class SystemConfig(CoreModel):
 
 
 class OperationLog(CoreModel):
+    # 日志可能在单独的数据库(见 OPERATION_LOG_DATABASE), 删除用户时不能跨库级联, 保留原创建人id
+    creator = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_query_name="creator_query",
+        help_text="help_text:创建人",
+        verbose_name="创建人",
+        db_constraint=False,
+    )
     request_modular = models.CharField(
         max_length=64,
         verbose_name="请求模块",
@@ -382,7 +639,7 @@ class OperationLog(CoreModel):
         blank=True,
         help_text="null=True,blank=True,请求地址",
     )
-    request_body = models.TextField(
+    request_body = CompressedTextField(
         null=True,
         blank=True,
         help_text="null=True,blank=True,请求参数",
@@ -426,7 +683,7 @@ class OperationLog(CoreModel):
         blank=True,
         help_text="操作系统",
     )
-    json_result = models.TextField(
+    json_result = CompressedTextField(
         verbose_name="返回信息", null=True, blank=True, help_text="返回信息"
     )
     status = models.BooleanField(
@@ -438,6 +695,15 @@ class OperationLog(CoreModel):
         verbose_name = "操作日志"
         verbose_name_plural = verbose_name
         ordering = ("-create_datetime",)
+        # 日志列表使用(create_datetime, id)游标分页, 等值过滤条件 + 时间倒序 的组合索引保证翻到很深也只扫描一页数据
+        # 按时间清理、归档日志时也使用第一个索引
+        # 请求方式、状态区分度低, 沿时间索引扫描过滤即可, 不单独建索引, 减少写入开销
+        indexes = [
+            models.Index(fields=["-create_datetime", "-id"], name="op_log_time_idx"),
+            models.Index(fields=["request_path", "-create_datetime", "-id"], name="op_log_path_time_idx"),
+            models.Index(fields=["creator", "-create_datetime", "-id"], name="op_log_creator_time_idx"),
+            models.Index(fields=["request_ip", "-create_datetime", "-id"], name="op_log_ip_time_idx"),
+        ]
 
     def media_file_name(instance, filename):
         """
@@ -450,3 +716,46 @@ class OperationLog(CoreModel):
         # 使用 os.path.splitext 分离文件名和扩展名
         basename, ext = os.path.splitext(filename)
         return os.path.join("files", h[:1], h[1:2], h + ext.lower())
+
+
+class OperationLogRollup(models.Model):
+    """
+    操作日志按小时汇总
+    日志写入时增量累加, 看板查询只需要扫描汇总表, 不需要对操作日志 GROUP BY
+    维度字段用空字符串代替NULL, 保证唯一约束生效
+    """
+
+    hour = models.DateTimeField(verbose_name="小时", help_text="小时")
+    request_modular = models.CharField(
+        max_length=64, default="", blank=True, verbose_name="请求模块", help_text="请求模块"
+    )
+    request_path = models.CharField(
+        max_length=255, default="", blank=True, verbose_name="请求地址", help_text="请求地址"
+    )
+    request_method = models.CharField(
+        max_length=8, default="", blank=True, verbose_name="请求方式", help_text="请求方式"
+    )
+    status = models.BooleanField(default=False, verbose_name="响应状态", help_text="响应状态")
+    response_code = models.CharField(
+        max_length=32, default="", blank=True, verbose_name="响应状态码", help_text="响应状态码"
+    )
+    count = models.BigIntegerField(default=0, verbose_name="请求次数", help_text="请求次数")
+
+    class Meta:
+        db_table = table_prefix + "system_operation_log_rollup"
+        verbose_name = "操作日志汇总"
+        verbose_name_plural = verbose_name
+        ordering = ("-hour",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "hour",
+                    "request_modular",
+                    "request_path",
+                    "request_method",
+                    "status",
+                    "response_code",
+                ],
+                name="op_log_rollup_unique",
+            )
+        ]
@@ -0,0 +1,249 @@
+import cProfile
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.db import connection, models
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import isolate_apps
+
+from dvadmin.system.models import Dept, OperationLog
+from dvadmin.utils.memory_profiler import module_name
+from dvadmin.utils.models import SoftDeleteModel
+from dvadmin.utils.profiling import save_profile
+
+
+class ArchiveOperationLogTest(TestCase):
+    """
+    日志归档：
+    *   过期日志按主键范围归档后删除, 重复执行结果一致
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        old = datetime.now() - timedelta(days=400)
+        for i in range(7):
+            OperationLog.objects.create(request_path=f"/api/old/{i}/", request_body='{"id": %d}' % i)
+        OperationLog.objects.update(create_datetime=old)
+        self.recent = OperationLog.objects.create(request_path="/api/new/")
+
+    def _archive(self, archive_dir, chunk_size=3):
+        call_command(
+            "archive_operation_log",
+            days=180,
+            archive_dir=archive_dir,
+            chunk_size=chunk_size,
+            sleep=0,
+            stdout=StringIO(),
+        )
+
+    def test_archive_and_delete(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            self._archive(archive_dir)
+            self.assertEqual(list(OperationLog.objects.values_list("id", flat=True)), [self.recent.id])
+            rows = []
+            for name in sorted(os.listdir(archive_dir)):
+                with gzip.open(os.path.join(archive_dir, name), "rt", encoding="utf-8") as f:
+                    rows.extend(json.loads(line) for line in f)
+            self.assertEqual(len(rows), 7)
+            self.assertEqual(rows[0]["request_body"], '{"id": 0}')
+
+            # 再次执行不会产生新文件
+            files = sorted(os.listdir(archive_dir))
+            self._archive(archive_dir)
+            self.assertEqual(sorted(os.listdir(archive_dir)), files)
+
+    def _archived_ids(self, archive_dir):
+        ids = []
+        for name in os.listdir(archive_dir):
+            with gzip.open(os.path.join(archive_dir, name), "rt", encoding="utf-8") as f:
+                ids.extend(json.loads(line)["id"] for line in f)
+        return sorted(ids)
+
+    def test_second_run_in_same_range_keeps_archive(self):
+        """第二次执行的截止时间落在第一次归档过的主键范围内, 不能覆盖第一次的归档文件"""
+        old_ids = list(OperationLog.objects.exclude(id=self.recent.id).order_by("id").values_list("id", flat=True))
+        with tempfile.TemporaryDirectory() as archive_dir:
+            self._archive(archive_dir, chunk_size=100)
+            self.assertEqual(self._archived_ids(archive_dir), old_ids)
+
+            OperationLog.objects.filter(id=self.recent.id).update(create_datetime=datetime.now() - timedelta(days=400))
+            self._archive(archive_dir, chunk_size=100)
+            self.assertFalse(OperationLog.objects.exists())
+            self.assertEqual(self._archived_ids(archive_dir), old_ids + [self.recent.id])
+            self.assertEqual(len(os.listdir(archive_dir)), 2)
+
+    def test_existing_archive_not_overwritten(self):
+        """归档文件写完后、删除前中断, 重新执行时不覆盖已有文件"""
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with patch("dvadmin.system.management.commands.archive_operation_log.log_search.delete_logs",
+                       side_effect=RuntimeError):
+                with self.assertRaises(RuntimeError):
+                    self._archive(archive_dir, chunk_size=100)
+            self._archive(archive_dir, chunk_size=100)
+            self.assertEqual(len(os.listdir(archive_dir)), 2)
+            self.assertEqual(OperationLog.objects.count(), 1)
+
+    def test_delete_without_archive(self):
+        call_command("archive_operation_log", days=180, no_archive=True, sleep=0, stdout=StringIO())
+        self.assertEqual(OperationLog.objects.count(), 1)
+
+
+class ProfileSummaryTest(SimpleTestCase):
+    """
+    profile汇总：
+    *   合并多个profile, 按路由过滤, 输出最耗时的函数
+    """
+
+    def test_summary(self):
+        def slow_function():
+            return sum(range(10000))
+
+        with tempfile.TemporaryDirectory() as directory:
+            for route in ("api/login/", "api/login/", "api/system/menu/"):
+                profiler = cProfile.Profile()
+                profiler.runcall(slow_function)
+                save_profile(profiler, directory, route, "GET", 1.5, max_files=10)
+
+            out = StringIO()
+            call_command("profile_summary", dir=directory, route="api_login", stdout=out)
+            output = out.getvalue()
+            self.assertIn("共 2 个profile", output)
+            self.assertIn("GET_api_login", output)
+            self.assertIn("slow_function", output)
+
+            out = StringIO()
+            call_command("profile_summary", dir=directory, route="not_exists", stdout=out)
+            self.assertIn("没有profile文件", out.getvalue())
+
+
+class MemoryProfileCommandTest(TestCase):
+    """
+    内存分析命令：
+    *   反复请求接口后输出模块增长并写入报告, 两个报告可以比较
+    """
+
+    def test_profile_and_compare(self):
+        with tempfile.TemporaryDirectory() as directory:
+            old_path = os.path.join(directory, "old.json")
+            out = StringIO()
+            call_command(
+                "memory_profile",
+                url=["/api/init/settings/"],
+                requests=20,
+                snapshots=2,
+                warmup=2,
+                output=old_path,
+                stdout=out,
+            )
+            self.assertIn("已请求 20/20 轮", out.getvalue())
+            with open(old_path) as f:
+                report = json.load(f)
+            self.assertEqual(report["urls"], ["/api/init/settings/"])
+            self.assertEqual(len(report["snapshots"]), 3)
+
+            new_path = os.path.join(directory, "new.json")
+            report["modules"] = [{"module": "dvadmin.leaky", "size_diff": 10240}]
+            with open(new_path, "w") as f:
+                json.dump(report, f)
+            out = StringIO()
+            call_command("memory_profile", compare=[old_path, new_path], stdout=out)
+            self.assertIn("dvadmin.leaky", out.getvalue())
+            self.assertIn("+10.0", out.getvalue())
+
+    def test_module_name(self):
+        self.assertEqual(module_name(json.__file__), "json")
+        self.assertEqual(module_name(tempfile.__file__), "tempfile")
+
+
+@isolate_apps("dvadmin.system")
+class PurgeSoftDeletedTest(TransactionTestCase):
+    """
+    清理软删除记录：
+    *   只删除超过保留期的记录, 仍有未删除下级的记录保留, 可重复执行
+    """
+
+    def setUp(self):
+        class Folder(SoftDeleteModel):
+            name = models.CharField(max_length=32)
+
+        class File(SoftDeleteModel):
+            folder = models.ForeignKey(Folder, on_delete=models.CASCADE)
+
+        self.Folder, self.File = Folder, File
+        with connection.schema_editor() as editor:
+            editor.create_model(Folder)
+            editor.create_model(File)
+        self.addCleanup(self.drop_tables)
+        patcher = patch(
+            "dvadmin.system.management.commands.purge_soft_deleted.soft_deletable_models",
+            return_value=[File, Folder],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        old = datetime.now() - timedelta(days=60)
+        recent = datetime.now() - timedelta(days=1)
+        for i in range(5):
+            folder = Folder._base_manager.create(name=f"old{i}", is_deleted=True, delete_datetime=old)
+            File._base_manager.create(folder=folder, is_deleted=True, delete_datetime=old)
+        Folder._base_manager.create(name="recent", is_deleted=True, delete_datetime=recent)
+        Folder._base_manager.create(name="alive")
+        # 上级已删除但下级被单独恢复过
+        kept = Folder._base_manager.create(name="kept", is_deleted=True, delete_datetime=old)
+        File._base_manager.create(folder=kept)
+
+    def drop_tables(self):
+        with connection.schema_editor() as editor:
+            editor.delete_model(self.File)
+            editor.delete_model(self.Folder)
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command("purge_soft_deleted", "--days", "30", "--chunk-size", "2", "--sleep", "0", *args, stdout=out)
+        return out.getvalue()
+
+    def test_purge(self):
+        self.assertIn("共 5 条", self.purge("--dry-run"))
+        self.assertEqual(self.Folder._base_manager.count(), 8)
+        output = self.purge()
+        self.assertIn("共删除 10 条", output)
+        self.assertEqual(
+            sorted(self.Folder._base_manager.values_list("name", flat=True)), ["alive", "kept", "recent"]
+        )
+        self.assertEqual(self.File._base_manager.count(), 1)
+        self.assertIn("共删除 0 条", self.purge())
+
+    def test_invalid_model(self):
+        with self.assertRaisesMessage(CommandError, "不是软删除模型"):
+            self.purge("--model", "system.Role")
+        with self.assertRaisesMessage(CommandError, "不是软删除模型"):
+            call_command("restore_soft_deleted", "system.Role", "1")
+
+
+class DeptTreeCommandTest(TestCase):
+    """
+    部门路径命令：
+    *   rebuild_dept_tree 修复路径, benchmark_dept_tree 运行后回滚生成的数据
+    """
+
+    def test_rebuild(self):
+        root = Dept.objects.create(name="总部", key="root")
+        child = Dept.objects.create(name="研发部", key="dev", parent=root)
+        Dept.objects.update(tree_path="")
+        out = StringIO()
+        call_command("rebuild_dept_tree", stdout=out)
+        self.assertIn("更新 2 个部门", out.getvalue())
+        self.assertEqual(Dept.objects.get(id=child.id).tree_path, f"/{root.id}/{child.id}/")
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark_dept_tree", "--nodes", "200", "--fanout", "3", "--repeat", "1", stdout=out)
+        self.assertIn("移动", out.getvalue())
+        self.assertEqual(Dept.objects.count(), 0)
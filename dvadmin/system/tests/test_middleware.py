@@ -0,0 +1,606 @@
+import gc
+import json
+import os
+import pstats
+import tempfile
+import threading
+from datetime import datetime
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.db.models import Sum
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import ResolverMatch
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from My_django_vue3_admin import dispatch
+from dvadmin.system.models import Dept, OperationLog, OperationLogRollup, Users
+from dvadmin.utils import log_rollup
+from dvadmin.utils.cache_stats import CacheStats, cache_stats
+from dvadmin.utils.log_policy import ApiLogPolicy, LOG_ALWAYS, LOG_COUNT_ONLY, LOG_ON_ERROR, LOG_SKIP
+from dvadmin.utils.log_rollup import RollupBuffer
+from dvadmin.utils.metrics import MetricsRegistry
+from dvadmin.utils.middleware import (
+    ApiLoggingMiddleware,
+    MetricsMiddleware,
+    QueryProfilingMiddleware,
+    SlowRequestProfilingMiddleware,
+)
+from dvadmin.utils.profiling import list_profiles
+from dvadmin.utils.query_profiler import normalize_sql
+from dvadmin.utils.readiness import ReadinessChecker, default_checks
+from dvadmin.utils.request_util import get_request_data, truncate_text
+from dvadmin.utils.tracing import NOOP_SPAN, OtlpHttpExporter, parse_traceparent, span, start_trace
+
+
+class ApiLogPolicyTest(SimpleTestCase):
+    """
+    日志策略：
+    *   请求方式、路径include/exclude、采样率、出错记录、用户覆盖
+    """
+
+    def test_methods_list_and_all(self):
+        policy = ApiLogPolicy(methods=["POST", "PUT"])
+        self.assertEqual(policy.decide("POST", "/api/x/"), LOG_ALWAYS)
+        self.assertEqual(policy.decide("GET", "/api/x/"), LOG_SKIP)
+        self.assertEqual(ApiLogPolicy(methods="ALL").decide("GET", "/api/x/"), LOG_ALWAYS)
+
+    def test_invalid_methods(self):
+        with self.assertRaises(TypeError):
+            ApiLogPolicy(methods="POST")
+
+    def test_include_and_exclude(self):
+        policy = ApiLogPolicy(
+            {"include": ["/api/*"], "exclude": ["/api/captcha/", "re:^/api/schema/"]},
+            methods="ALL",
+        )
+        self.assertEqual(policy.decide("POST", "/api/login/"), LOG_ALWAYS)
+        self.assertEqual(policy.decide("POST", "/admin/login/"), LOG_SKIP)
+        self.assertEqual(policy.decide("POST", "/api/captcha/"), LOG_SKIP)
+        self.assertEqual(policy.decide("POST", "/api/schema/swagger-ui/"), LOG_SKIP)
+
+    def test_sample_rate_and_log_on_error(self):
+        """rng 返回值小于采样率时记录, 否则按always_log_on_error决定"""
+        config = {"sample_rates": {"put": 0.1}, "always_log_on_error": True}
+        sampled = ApiLogPolicy(config, methods=["PUT"], rng=lambda: 0.05)
+        unsampled = ApiLogPolicy(config, methods=["PUT"], rng=lambda: 0.5)
+        self.assertEqual(sampled.decide("PUT", "/api/x/"), LOG_ALWAYS)
+        self.assertEqual(unsampled.decide("PUT", "/api/x/"), LOG_ON_ERROR)
+
+        config["always_log_on_error"] = False
+        unsampled = ApiLogPolicy(config, methods=["PUT"], rng=lambda: 0.5)
+        self.assertEqual(unsampled.decide("PUT", "/api/x/"), LOG_COUNT_ONLY)
+
+    def test_user_overrides(self):
+        policy = ApiLogPolicy(
+            {"sample_rates": {"PUT": 0}, "user_overrides": {"admin": 1, "robot": 0}},
+            methods=["PUT"],
+        )
+        self.assertEqual(policy.decide("PUT", "/api/x/", lambda: "admin"), LOG_ALWAYS)
+        self.assertEqual(policy.decide("PUT", "/api/x/", lambda: "robot"), LOG_COUNT_ONLY)
+        self.assertEqual(policy.decide("PUT", "/api/x/", lambda: "other"), LOG_COUNT_ONLY)
+
+    def test_username_resolved_only_with_overrides(self):
+        def get_username():
+            raise AssertionError("没有配置user_overrides时不应解析用户")
+
+        policy = ApiLogPolicy(methods=["POST"])
+        self.assertEqual(policy.decide("POST", "/api/x/", get_username), LOG_ALWAYS)
+
+
+class ApiLoggingMiddlewareTest(TestCase):
+    """
+    日志中间件：
+    *   请求参数按大小截断, 文件内容不记录
+    *   流式响应不读取内容
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        log_rollup.get_buffer().clear()
+        self.addCleanup(log_rollup.get_buffer().clear)
+
+    def _run(self, request, response, policy=None):
+        """模拟Django调用顺序: __call__ -> process_view -> 视图"""
+
+        class DeptView(APIView):
+            queryset = Dept.objects.all()
+
+        view = DeptView.as_view()
+        request.session = {}
+        request.resolver_match = ResolverMatch(view, (), {})
+
+        def get_response(req):
+            middleware.process_view(req, view, (), {})
+            return response
+
+        with override_settings(API_LOG_ENABLE=True, API_LOG_POLICY=policy or {}, API_LOG_METHODS="ALL"):
+            middleware = ApiLoggingMiddleware(get_response)
+        return middleware(request)
+
+    def test_log_masks_password_and_truncates_body(self):
+        request = self.factory.post(
+            "/api/dept/",
+            data=json.dumps({"username": "admin", "password": "secret"}),
+            content_type="application/json",
+        )
+        self._run(request, JsonResponse({"code": 2000, "msg": "ok"}))
+        log = OperationLog.objects.get()
+        self.assertEqual(json.loads(log.request_body)["password"], "*" * 8)
+        self.assertTrue(log.status)
+        self.assertEqual(log.request_modular, Dept._meta.verbose_name)
+
+    def test_large_json_body_is_not_read(self):
+        request = self.factory.post(
+            "/api/dept/",
+            data=json.dumps({"data": "x" * 10000}),
+            content_type="application/json",
+        )
+        data = get_request_data(request, max_length=100)
+        self.assertTrue(data["_body"].startswith("[truncated"))
+        self.assertFalse(request._read_started)
+
+    def test_multipart_skips_file_content(self):
+        upload = SimpleUploadedFile("a.txt", b"x" * 2048)
+        request = self.factory.post("/api/dept/", data={"name": "n", "file": upload})
+        data = get_request_data(request)
+        self.assertEqual(data["name"], "n")
+        self.assertEqual(data["_files"], ["file:a.txt(2048 bytes)"])
+
+    def test_streaming_response_not_consumed(self):
+        consumed = []
+
+        def stream():
+            consumed.append(True)
+            yield b'{"code": 4000}'
+
+        request = self.factory.post("/api/dept/", data={"name": "n"})
+        response = StreamingHttpResponse(stream(), content_type="application/json")
+        self._run(request, response)
+        self.assertEqual(consumed, [])
+        # 不读取内容时没有code, 按HTTP状态码记为成功
+        self.assertTrue(OperationLog.objects.get().status)
+
+    def test_response_without_code_on_error_policy(self):
+        """未被采样时, 没有code的成功响应(如文件下载)不算出错"""
+        policy = {"sample_rates": {"GET": 0}, "always_log_on_error": True}
+        response = HttpResponse(b"a,b\n1,2\n", content_type="text/csv")
+        self._run(self.factory.get("/api/dept/export/"), response, policy)
+        self.assertFalse(OperationLog.objects.exists())
+
+        self._run(self.factory.get("/api/dept/export/"), HttpResponse(b"", status=500), policy)
+        log = OperationLog.objects.get()
+        self.assertFalse(log.status)
+        self.assertIsNone(log.response_code)
+
+    def test_sampled_requests_counted_in_rollup(self):
+        """采样率小于1时, 未被采样的请求不写日志, 但小时汇总仍统计全部请求"""
+        policy = {"sample_rates": {"POST": 0.5}, "always_log_on_error": True}
+        requests = [
+            (0.1, JsonResponse({"code": 2000})),  # 被采样
+            (0.9, JsonResponse({"code": 2000})),  # 未被采样, 成功不记录
+            (0.9, JsonResponse({"code": 2000})),
+            (0.9, JsonResponse({"code": 4000})),  # 未被采样, 出错仍记录
+        ]
+        for value, response in requests:
+            with mock.patch("dvadmin.utils.log_policy.random.random", return_value=value):
+                self._run(self.factory.post("/api/dept/", data={"name": "n"}), response, policy)
+        self.assertEqual(OperationLog.objects.count(), 2)
+        # 计数在进程内累计, 还没有写入
+        self.assertFalse(OperationLogRollup.objects.exists())
+        log_rollup.flush()
+        self.assertEqual(
+            dict(OperationLogRollup.objects.values_list("status").annotate(total=Sum("count"))),
+            {True: 3, False: 1},
+        )
+
+        policy["always_log_on_error"] = False
+        with mock.patch("dvadmin.utils.log_policy.random.random", return_value=0.9):
+            self._run(self.factory.post("/api/dept/", data={"name": "n"}), JsonResponse({"code": 4000}), policy)
+        self.assertEqual(OperationLog.objects.count(), 2)
+        log_rollup.flush()
+        self.assertEqual(OperationLogRollup.objects.filter(status=False).get().count, 2)
+
+    def test_rollup_buffer(self):
+        """达到flush_size时合并写入, 写入失败时保留计数"""
+        buffer = RollupBuffer(flush_size=3, flush_interval=3600)
+        key = (datetime(2026, 1, 1, 8), "部门", "/api/dept/", "POST", True, "2000")
+        with self.assertNumQueries(0, using="operation_log"):
+            buffer.add(key)
+            buffer.add(key)
+        buffer.add(key)
+        self.assertEqual(OperationLogRollup.objects.get().count, 3)
+        self.assertEqual(buffer.pending, 0)
+
+        buffer.add(key, 2)
+        with mock.patch("dvadmin.utils.log_rollup._write", side_effect=DatabaseError):
+            with self.assertLogs("log_rollup", "WARNING"):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.counts[key], 2)
+        buffer.flush()
+        self.assertEqual(OperationLogRollup.objects.get().count, 5)
+
+    def test_truncate_text(self):
+        self.assertEqual(truncate_text("abc", 5), "abc")
+        self.assertEqual(truncate_text("abcdef", 3), "abc...[truncated 3 chars]")
+        self.assertIsNone(truncate_text(None, 3))
+
+
+class MetricsTest(TestCase):
+    """
+    请求指标：
+    *   按路由统计请求数、耗时和查询数, 合并其他worker写入的文件, 输出Prometheus格式
+    """
+
+    def test_registry_merges_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            worker = MetricsRegistry(directory)
+            worker.observe("api/login/", "POST", 200, 0.03, 2)
+            worker.observe("api/login/", "POST", 400, 0.2, 1)
+            # 模拟另一个worker写入的文件
+            with open(os.path.join(directory, "metrics_999999.json"), "w") as f:
+                json.dump(worker.snapshot(), f)
+            text = worker.render()
+        self.assertIn('http_requests_total{route="api/login/",method="POST",status="2xx"} 2', text)
+        self.assertIn('http_requests_total{route="api/login/",method="POST",status="4xx"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="api/login/",method="POST",le="0.05"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{route="api/login/",method="POST"} 4', text)
+        self.assertIn('http_request_db_queries_bucket{route="api/login/",method="POST",le="1"} 2', text)
+        self.assertIn('http_request_db_queries_bucket{route="api/login/",method="POST",le="+Inf"} 4', text)
+
+    def test_flush_writes_own_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = MetricsRegistry(directory, flush_interval=0)
+            registry.observe("api/x/", "GET", 200, 0.01, 0)
+            with open(registry.path) as f:
+                self.assertEqual(json.load(f)["requests"], [["api/x/", "GET", "2xx", 1]])
+
+    def test_concurrent_flush(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = MetricsRegistry(directory, flush_interval=0)
+            errors = []
+
+            def worker():
+                try:
+                    for _ in range(50):
+                        registry.observe("api/x/", "GET", 200, 0.01, 0)
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            registry.flush()
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(directory), [os.path.basename(registry.path)])
+            with open(registry.path) as f:
+                self.assertEqual(json.load(f)["requests"], [["api/x/", "GET", "2xx", 400]])
+
+    def test_flush_error_is_logged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = MetricsRegistry(directory, flush_interval=0)
+        # 目录已被删除, 写入失败不影响请求
+        with self.assertLogs("metrics", "WARNING"):
+            registry.observe("api/x/", "GET", 200, 0.01, 0)
+
+    def test_middleware_records_route(self):
+        registry = MetricsRegistry()
+        with mock.patch("dvadmin.utils.middleware.get_registry", return_value=registry):
+            self.client.get("/api/system/operation_log/?limit=1")
+            self.client.get("/not-a-route/")
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('route="api/system/operation_log/",method="GET",status=', text)
+        self.assertIn('route="<unmatched>",method="GET",status="4xx"', text)
+        self.assertNotIn("/metrics", text)
+
+    def test_middleware_counts_queries(self):
+        registry = MetricsRegistry()
+
+        def view(request):
+            request.resolver_match = ResolverMatch(view, (), {}, route="api/dept/")
+            Dept.objects.count()
+            Dept.objects.exists()
+            return JsonResponse({})
+
+        with mock.patch("dvadmin.utils.middleware.get_registry", return_value=registry):
+            MetricsMiddleware(view)(RequestFactory().get("/api/dept/"))
+        _, _, queries = registry.collect()
+        self.assertEqual(queries[("api/dept/", "GET")].total, 2)
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"])
+    def test_metrics_allowed_ips(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    def test_metrics_local_only_by_default(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.2").status_code, 403)
+
+
+class QueryProfilingTest(TestCase):
+    """
+    SQL分析：
+    *   SQL归一化, 重复形状识别为N+1, 输出Server-Timing头和结构化日志, 未采样时不分析
+    """
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t1 WHERE id IN (%s, %s,%s) AND name = 'it''s'  AND age > 18"),
+            "SELECT * FROM t1 WHERE id IN (...) AND name = ? AND age > ?",
+        )
+        self.assertEqual(
+            normalize_sql('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b") VALUES (...)',
+        )
+
+    @staticmethod
+    def n_plus_one_view(request):
+        for dept_id in range(6):
+            Dept.objects.filter(id=dept_id).exists()
+        return JsonResponse({})
+
+    @override_settings(SQL_PROFILE_SAMPLE_RATE=1, SQL_PROFILE_N_PLUS_ONE_THRESHOLD=5)
+    def test_n_plus_one_reported(self):
+        middleware = QueryProfilingMiddleware(self.n_plus_one_view)
+        with self.assertLogs("sql_profile", "WARNING") as logs:
+            response = middleware(RequestFactory().get("/api/dept/"))
+        self.assertIn('db;dur=', response["Server-Timing"])
+        self.assertIn('desc="6 queries"', response["Server-Timing"])
+        self.assertIn("n_plus_one", response["Server-Timing"])
+        data = logs.records[0].sql_profile
+        self.assertEqual(data["queries"], 6)
+        self.assertEqual(len(data["repeated"]), 1)
+        self.assertEqual(data["repeated"][0]["count"], 6)
+        self.assertIn("test_middleware.py", data["repeated"][0]["caller"])
+        self.assertIn("n_plus_one_view", data["repeated"][0]["caller"])
+
+    def test_not_sampled(self):
+        response = QueryProfilingMiddleware(self.n_plus_one_view)(RequestFactory().get("/"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+class SlowRequestProfilingTest(SimpleTestCase):
+    """
+    慢请求profile：
+    *   超过阈值才保存, 文件名包含路由, 超出数量上限删除最旧的
+    """
+
+    @staticmethod
+    def view(request):
+        request.resolver_match = ResolverMatch(JsonResponse, (), {}, route="api/login/")
+        sum(range(1000))
+        return JsonResponse({})
+
+    def test_profiles_saved_and_rotated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                SLOW_REQUEST_PROFILE_SAMPLE_RATE=1,
+                SLOW_REQUEST_PROFILE_THRESHOLD_MS=0,
+                SLOW_REQUEST_PROFILE_DIR=directory,
+                SLOW_REQUEST_PROFILE_MAX_FILES=2,
+            ):
+                middleware = SlowRequestProfilingMiddleware(self.view)
+                with self.assertLogs("slow_request", "WARNING"):
+                    for _ in range(3):
+                        middleware(RequestFactory().post("/api/login/"))
+            profiles = list_profiles(directory)
+            self.assertEqual(len(profiles), 2)
+            self.assertTrue(all("_POST_api_login_" in path for path in profiles))
+            self.assertIsNotNone(pstats.Stats(profiles[0]))
+
+    def test_below_threshold_not_saved(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                SLOW_REQUEST_PROFILE_SAMPLE_RATE=1,
+                SLOW_REQUEST_PROFILE_THRESHOLD_MS=60000,
+                SLOW_REQUEST_PROFILE_DIR=directory,
+            ):
+                SlowRequestProfilingMiddleware(self.view)(RequestFactory().get("/"))
+            self.assertEqual(list_profiles(directory), [])
+
+
+class TracingTest(TestCase):
+    """
+    链路追踪：
+    *   traceparent解析与继承, 未开启时为空操作, 认证、SQL、配置、密码哈希记录span, jsonl/otlp导出
+    """
+
+    traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "traces.jsonl")
+        settings = override_settings(TRACING_ENABLED=True, TRACING_EXPORTER="jsonl", TRACING_JSONL_PATH=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def read_spans(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return {span["name"]: span for span in map(json.loads, f)}
+
+    def test_parse_traceparent(self):
+        self.assertEqual(
+            parse_traceparent(self.traceparent),
+            ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True),
+        )
+        self.assertFalse(parse_traceparent("00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00")[2])
+        self.assertIsNone(parse_traceparent("00-00000000000000000000000000000000-b7ad6b7169203331-01"))
+        self.assertIsNone(parse_traceparent("ff-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"))
+        self.assertIsNone(parse_traceparent("garbage"))
+        self.assertIsNone(parse_traceparent(None))
+
+    def test_disabled_is_noop(self):
+        with override_settings(TRACING_ENABLED=False):
+            self.assertIs(start_trace("GET /"), NOOP_SPAN)
+            self.assertIs(span("x"), NOOP_SPAN)
+            response = self.client.get("/api/captcha/")
+        self.assertFalse(response.has_header("traceresponse"))
+        self.assertEqual(self.read_spans(), {})
+
+    def test_request_trace(self):
+        user = Users.objects.create_user(username="admin", password="admin123456", name="管理员")
+        token = RefreshToken.for_user(user).access_token
+        response = self.client.get(
+            "/api/system/operation_log/",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+            HTTP_TRACEPARENT=self.traceparent,
+        )
+        spans = self.read_spans()
+        root = spans["GET api/system/operation_log/"]
+        self.assertEqual(root["trace_id"], "0af7651916cd43dd8448eb211c80319c")
+        self.assertEqual(root["parent_id"], "b7ad6b7169203331")
+        self.assertEqual(root["attributes"]["http.status_code"], 200)
+        self.assertEqual(response["traceresponse"], f"00-{root['trace_id']}-{root['span_id']}-01")
+        self.assertTrue(spans["auth.jwt"]["attributes"]["auth.authenticated"])
+        self.assertEqual(spans["auth.jwt.get_user"]["parent_id"], spans["auth.jwt"]["span_id"])
+        self.assertIn("db.statement", spans["db.query"]["attributes"])
+        self.assertTrue(all(s["trace_id"] == root["trace_id"] for s in spans.values()))
+
+    def test_unsampled_parent_not_exported(self):
+        self.client.get("/api/captcha/", HTTP_TRACEPARENT=self.traceparent[:-2] + "00")
+        self.assertEqual(self.read_spans(), {})
+
+    def test_config_and_password_spans(self):
+        with start_trace("job"):
+            dispatch.get_system_config()
+            make_password("admin123456")
+        spans = self.read_spans()
+        self.assertEqual(spans["system_config.get"]["parent_id"], spans["job"]["span_id"])
+        self.assertEqual(spans["password.hash"]["attributes"]["algorithm"], "pbkdf2_sha256")
+
+    def test_span_records_error(self):
+        with self.assertRaises(ValueError):
+            with start_trace("job"):
+                with span("step"):
+                    raise ValueError("boom")
+        spans = self.read_spans()
+        self.assertEqual(spans["step"]["error"], "ValueError: boom")
+        self.assertEqual(spans["job"]["error"], "ValueError: boom")
+
+    def test_otlp_payload(self):
+        with start_trace("job"):
+            with span("step", rows=3):
+                pass
+        spans = list(self.read_spans().values())
+        payload = OtlpHttpExporter("http://collector/v1/traces").to_otlp(spans)
+        otlp_spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        step = next(s for s in otlp_spans if s["name"] == "step")
+        self.assertEqual(step["attributes"], [{"key": "rows", "value": {"intValue": "3"}}])
+        self.assertEqual(next(s for s in otlp_spans if s["name"] == "job")["kind"], 2)
+
+
+class ReadinessTest(TestCase):
+    """
+    就绪检查：
+    *   后台检查数据库和缓存, 记录每项耗时, 超时和异常视为未就绪, 探针只返回缓存结果
+    """
+
+    databases = "__all__"
+
+    def test_default_checks(self):
+        checker = ReadinessChecker(default_checks(), interval=60, timeout=5)
+        checker.run_once()
+        ready, data = checker.status()
+        self.assertTrue(ready, data)
+        self.assertIn("db:default", data["checks"])
+        self.assertIn("db:operation_log", data["checks"])
+        self.assertIn("cache:default", data["checks"])
+        self.assertGreaterEqual(data["checks"]["cache:default"]["latency_ms"], 0)
+
+    def test_failure_and_timeout(self):
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+
+        def broken():
+            raise ConnectionError("refused")
+
+        checker = ReadinessChecker({"ok": lambda: None, "slow": slow, "broken": broken}, interval=60, timeout=0.1)
+        self.addCleanup(release.set)
+        with self.assertLogs("healthz", "WARNING"):
+            checker.run_once()
+            checker.run_once()
+            ready, data = checker.status()
+        self.assertFalse(ready)
+        self.assertTrue(data["checks"]["ok"]["ok"])
+        self.assertEqual(data["checks"]["slow"]["error"], "timeout")
+        self.assertEqual(data["checks"]["broken"]["error"], "ConnectionError: refused")
+        # 仍在执行的检查不会重复提交
+        self.assertEqual(len(calls), 1)
+
+        release.set()
+        checker.checks.pop("broken")
+        checker.run_once()
+        self.assertTrue(checker.status()[0])
+
+    def test_stale_result_not_ready(self):
+        checker = ReadinessChecker({"ok": lambda: None}, interval=1, timeout=1)
+        checker.start()
+        checker.checked_at -= 60
+        self.assertFalse(checker.status()[0])
+
+    def test_probe_returns_cached_result(self):
+        checks = mock.Mock(side_effect=ConnectionError("down"))
+        checker = ReadinessChecker({"db:default": checks}, interval=60, timeout=1)
+        with mock.patch("dvadmin.utils.middleware.get_checker", return_value=checker), self.assertLogs("healthz"):
+            for _ in range(3):
+                response = self.client.get("/readiness")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["status"], "fail")
+        self.assertEqual(response.json()["checks"]["db:default"]["error"], "ConnectionError: down")
+        self.assertEqual(checks.call_count, 1)
+        self.assertEqual(self.client.get("/healthz").content, b"OK")
+
+
+class RuntimeStatsTest(TestCase):
+    """
+    运行状态：
+    *   需要token, 不查询数据库, 输出内存、GC、线程、连接、配置大小和缓存命中率
+    """
+
+    def test_disabled_without_token(self):
+        with override_settings(RUNTIME_STATS_TOKEN=None):
+            self.assertEqual(self.client.get("/debug/runtime").status_code, 404)
+
+    @override_settings(RUNTIME_STATS_TOKEN="secret")
+    def test_wrong_token(self):
+        self.assertEqual(self.client.get("/debug/runtime").status_code, 403)
+        self.assertEqual(self.client.get("/debug/runtime", HTTP_AUTHORIZATION="Bearer nope").status_code, 403)
+
+    @override_settings(RUNTIME_STATS_TOKEN="secret")
+    def test_runtime_stats(self):
+        cache_stats.reset()
+        dispatch.get_system_config()
+        gc.collect()
+        with self.assertNumQueries(0):
+            response = self.client.get("/debug/runtime", HTTP_AUTHORIZATION="Bearer secret")
+        data = response.json()
+        self.assertGreater(data["uptime_seconds"], 0)
+        self.assertGreater(data["memory"]["rss_bytes"], 0)
+        self.assertGreaterEqual(data["gc"]["pauses"]["2"]["collections"], 1)
+        self.assertGreaterEqual(data["threads"]["count"], 1)
+        self.assertIn("default", data["db_connections"])
+        self.assertIn("keys", data["system_config"])
+        self.assertEqual(data["caches"]["system_config"]["hits"] + data["caches"]["system_config"]["misses"], 1)
+
+    def test_cache_stats(self):
+        stats = CacheStats()
+        stats.record("dept_tree", hit=True)
+        stats.record("dept_tree", hit=True)
+        stats.record("dept_tree", hit=False)
+        self.assertEqual(stats.snapshot(), {"dept_tree": {"hits": 2, "misses": 1, "hit_rate": 0.6667}})
@@ -0,0 +1,690 @@
+import time
+from collections import Counter
+from datetime import datetime
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, models, router
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, isolate_apps, override_settings
+
+from dvadmin.system.models import Dept, OperationLog, OperationLogRollup, Role, SystemConfig, Users, dept_tree_cache
+from dvadmin.utils.compression import compress_text, decompress_text
+from dvadmin.utils.db_router import ReplicaRouter, request_wrote, reset_replica_state
+from dvadmin.utils.middleware import ReplicaPinningMiddleware
+from dvadmin.utils.models import SoftDeleteModel
+from dvadmin.utils.versioned_cache import VersionedCache
+
+
+class CompressionTest(SimpleTestCase):
+    """
+    日志压缩：
+    *   压缩/解压往返一致, 短内容不压缩, 兼容历史明文
+    """
+
+    def test_round_trip(self):
+        text = '{"username": "admin", "password": "********", "captcha": "abcd"}' * 5
+        compressed = compress_text(text)
+        self.assertLess(len(compressed), len(text.encode()))
+        self.assertEqual(decompress_text(compressed), text)
+        self.assertEqual(decompress_text(memoryview(compressed)), text)
+
+    def test_short_text_stored_raw(self):
+        self.assertEqual(compress_text("abc"), b"\x00abc")
+        self.assertEqual(decompress_text(b"\x00abc"), "abc")
+
+    def test_legacy_plain_text(self):
+        self.assertEqual(decompress_text(b'{"code": 2000}'), '{"code": 2000}')
+        self.assertEqual(decompress_text("旧数据"), "旧数据")
+        self.assertIsNone(decompress_text(None))
+
+
+class OperationLogCompressedFieldTest(TestCase):
+    databases = "__all__"
+
+    def test_field_compresses_transparently(self):
+        body = '{"name": "部门", "status": true, "parent": 1, "sort": 1}' * 10
+        log = OperationLog.objects.create(request_body=body, json_result={"code": 2000})
+        log = OperationLog.objects.get(id=log.id)
+        self.assertEqual(log.request_body, body)
+        self.assertEqual(log.json_result, "{'code': 2000}")
+        with connections[router.db_for_write(OperationLog)].cursor() as cursor:
+            cursor.execute(
+                f"SELECT request_body FROM {OperationLog._meta.db_table} WHERE id = %s", [log.id]
+            )
+            stored = bytes(cursor.fetchone()[0])
+        self.assertLess(len(stored), len(body.encode()))
+
+
+class OperationLogRouterTest(TestCase):
+    """
+    日志分库：
+    *   日志模型在日志库读写, 关联的用户仍在主库, 删除用户不跨库级联
+    """
+
+    databases = "__all__"
+
+    def test_log_models_routed(self):
+        alias = settings.OPERATION_LOG_DATABASE_ALIAS
+        self.assertEqual(router.db_for_write(OperationLog), alias)
+        self.assertEqual(router.db_for_read(OperationLogRollup), alias)
+        self.assertEqual(router.db_for_write(Users), "default")
+        self.assertFalse(router.allow_migrate_model(alias, Users))
+        self.assertFalse(router.allow_migrate_model("default", OperationLog))
+
+    def test_cross_database_creator(self):
+        user = Users.objects.create_user(username="admin", password="admin123456", name="管理员")
+        log = OperationLog.objects.create(creator=user, request_path="/api/login/")
+        log = OperationLog.objects.get(id=log.id)
+        self.assertEqual(log._state.db, settings.OPERATION_LOG_DATABASE_ALIAS)
+        self.assertEqual(log.creator.name, "管理员")
+
+        user_id = user.id
+        user.delete()
+        self.assertEqual(OperationLog.objects.get(id=log.id).creator_id, user_id)
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    """
+    读写分离：
+    *   读按权重选择副本, 写走主库, 写入后粘滞读主库, 副本不可用时回退主库
+    """
+
+    def setUp(self):
+        reset_replica_state()
+        self.addCleanup(reset_replica_state)
+        self.down = set()
+        self.router = ReplicaRouter(
+            replicas={"replica1": 3, "replica2": 1},
+            health_check=lambda alias: alias not in self.down,
+        )
+
+    def test_weighted_read(self):
+        reads = Counter(self.router.db_for_read(Users) for _ in range(2000))
+        self.assertEqual(set(reads), {"replica1", "replica2"})
+        self.assertGreater(reads["replica1"], reads["replica2"] * 2)
+
+    def test_read_your_writes(self):
+        self.assertEqual(self.router.db_for_write(Users), "default")
+        self.assertTrue(request_wrote())
+        self.assertEqual(self.router.db_for_read(Users), "default")
+        reset_replica_state()
+        self.assertIn(self.router.db_for_read(Users), ("replica1", "replica2"))
+
+    def test_log_models_not_pinned(self):
+        self.assertIsNone(self.router.db_for_write(OperationLog))
+        self.assertFalse(request_wrote())
+
+    def test_unhealthy_fallback(self):
+        self.down.add("replica1")
+        self.assertEqual({self.router.db_for_read(Users) for _ in range(50)}, {"replica2"})
+        self.router.mark_unhealthy("replica2")
+        self.assertEqual(self.router.db_for_read(Users), "default")
+
+    def test_no_replicas(self):
+        router = ReplicaRouter(replicas={})
+        self.assertIsNone(router.db_for_read(Users))
+        self.assertIsNone(router.db_for_write(Users))
+        self.assertIsNone(router.allow_migrate("replica1", "system", "users"))
+        self.assertIs(self.router.allow_migrate("replica1", "system", "users"), False)
+
+    def test_pinning_cookie(self):
+        factory = RequestFactory()
+
+        def write_view(request):
+            self.router.db_for_write(Users)
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(write_view)(factory.post("/"))
+        cookie = response.cookies[ReplicaPinningMiddleware.cookie_name]
+        self.assertEqual(cookie["max-age"], settings.REPLICA_STICKY_SECONDS)
+
+        def read_view(request):
+            return HttpResponse(self.router.db_for_read(Users))
+
+        request = factory.get("/")
+        request.COOKIES[ReplicaPinningMiddleware.cookie_name] = cookie.value
+        self.assertEqual(ReplicaPinningMiddleware(read_view)(request).content, b"default")
+        response = ReplicaPinningMiddleware(read_view)(factory.get("/"))
+        self.assertNotEqual(response.content, b"default")
+        self.assertNotIn(ReplicaPinningMiddleware.cookie_name, response.cookies)
+
+
+class BulkInsertTest(TestCase):
+    """
+    批量创建：
+    *   审计字段从request填充一次, 分批插入生成器, 冲突忽略/更新
+    """
+
+    def setUp(self):
+        self.user = Users.objects.create_user(username="admin", password="admin123456", name="管理员")
+        self.request = RequestFactory().post("/")
+        self.request.user = self.user
+
+    def test_generator_batches_and_audit_fields(self):
+        consumed = []
+
+        def rows():
+            for i in range(25):
+                consumed.append(i)
+                yield Role(name=f"角色{i}", key=f"role_{i}") if i % 2 else {"name": f"角色{i}", "key": f"role_{i}"}
+
+        with self.assertNumQueries(3):
+            total = Role.objects.bulk_insert(rows(), request=self.request, batch_size=10)
+        self.assertEqual(total, 25)
+        self.assertEqual(len(consumed), 25)
+        roles = Role.objects.filter(key__startswith="role_")
+        self.assertEqual(roles.count(), 25)
+        self.assertEqual(set(roles.values_list("creator_id", flat=True)), {self.user.id})
+        self.assertEqual(set(roles.values_list("modifier", flat=True)), {str(self.user.id)})
+        self.assertFalse(roles.filter(create_datetime__isnull=True).exists())
+        self.assertFalse(roles.filter(update_datetime__isnull=True).exists())
+
+    def test_existing_audit_values_kept(self):
+        other = Users.objects.create_user(username="other", password="other123456", name="其他")
+        Role.objects.bulk_insert([Role(name="a", key="a", creator=other)], request=self.request)
+        self.assertEqual(Role.objects.get(key="a").creator_id, other.id)
+
+    def test_without_request(self):
+        self.assertEqual(Role.objects.bulk_insert(iter([Role(name="a", key="a")])), 1)
+        self.assertIsNone(Role.objects.get(key="a").creator_id)
+        self.assertEqual(Role.objects.bulk_insert([]), 0)
+        with self.assertRaises(ValueError):
+            Role.objects.bulk_insert([], batch_size=0)
+
+    def test_conflicts(self):
+        Role.objects.bulk_insert([Role(name="旧", key="a")])
+        Role.objects.filter(key="a").update(update_datetime=datetime(2020, 1, 1))
+
+        Role.objects.bulk_insert([Role(name="忽略", key="a"), Role(name="b", key="b")], ignore_conflicts=True)
+        self.assertEqual(Role.objects.get(key="a").name, "旧")
+        self.assertTrue(Role.objects.filter(key="b").exists())
+
+        Role.objects.bulk_insert(
+            [Role(name="新", key="a")],
+            request=self.request,
+            update_conflicts=True,
+            update_fields=["name"],
+            unique_fields=["key"],
+        )
+        role = Role.objects.get(key="a")
+        self.assertEqual(role.name, "新")
+        self.assertEqual(role.modifier, str(self.user.id))
+        self.assertGreater(role.update_datetime, datetime(2020, 1, 1))
+
+
+class FieldPlanTest(TestCase):
+    """
+    模型转字典：
+    *   字段计划每个类只算一次, 按名称排除审计字段, 外键只取id且不查询, to_dicts与to_data一致
+    """
+
+    def setUp(self):
+        self.root = Dept.objects.create(name="总部", key="root")
+        self.child = Dept.objects.create(name="研发部", key="dev", parent=self.root, description="研发")
+
+    def test_plan_cached_and_excludes_by_name(self):
+        plan = Dept.get_field_plan()
+        self.assertIs(Dept.get_field_plan(), plan)
+        self.assertIsNot(Role.get_field_plan(), plan)
+        names = self.child.get_need_fields_names()
+        for excluded in ("id", "creator", "modifier", "create_datetime", "update_datetime", "dept_belong_id"):
+            self.assertNotIn(excluded, names)
+        self.assertIn(("parent", "parent_id"), plan)
+
+    def test_to_data(self):
+        child = Dept.objects.get(id=self.child.id)
+        with self.assertNumQueries(0):
+            data = child.to_data()
+        self.assertEqual(data["parent"], self.root.id)
+        self.assertEqual(data["name"], "研发部")
+        self.assertEqual(data, child.DATA)
+        self.assertEqual(child.to_dict_data()["parent"], self.root)
+
+    def test_to_dicts(self):
+        queryset = Dept.objects.order_by("id")
+        with self.assertNumQueries(1):
+            rows = list(Dept.to_dicts(queryset))
+        self.assertEqual(rows, [dept.to_data() for dept in queryset])
+        self.assertEqual(len(list(Dept.to_dicts())), 2)
+
+
+class DirtyTrackingTest(TestCase):
+    """
+    修改跟踪：
+    *   update()/save() 只写入修改过的字段和update_datetime, 没有修改时不执行SQL
+    *   JSON字段的原地修改也能识别, SystemConfig没有修改时不刷新系统配置
+    """
+
+    def setUp(self):
+        Role.objects.create(name="管理员", key="admin")
+        self.role = Role.objects.get(key="admin")
+        self.request = RequestFactory().post("/")
+
+    def test_update_without_changes(self):
+        self.assertFalse(self.role.has_changes())
+        with self.assertNumQueries(0):
+            self.role.update(self.request, {"name": "管理员", "sort": 1})
+
+    def test_update_writes_dirty_fields_only(self):
+        created = self.role.create_datetime
+        with CaptureQueriesContext(connections["default"]) as queries:
+            self.role.update(self.request, {"name": "超级管理员"})
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]["sql"]
+        self.assertIn('"name"', sql)
+        self.assertIn('"update_datetime"', sql)
+        self.assertNotIn('"key"', sql)
+        self.assertNotIn('"create_datetime"', sql)
+        self.assertFalse(self.role.has_changes())
+        role = Role.objects.get(id=self.role.id)
+        self.assertEqual(role.name, "超级管理员")
+        self.assertEqual(role.create_datetime, created)
+
+    def test_update_keeps_modifier_without_changes(self):
+        """已有修改人的记录没有修改时不写入, 有修改时记录当前用户id"""
+        Role.objects.filter(id=self.role.id).update(modifier="7")
+        role = Role.objects.get(id=self.role.id)
+        self.request.user = Users.objects.create_user(username="test", password="test123456", name="测试")
+        with self.assertNumQueries(0):
+            role.update(self.request, {"name": "管理员"})
+        self.assertEqual(Role.objects.get(id=role.id).modifier, "7")
+
+        role.update(self.request, {"name": "超级管理员"})
+        self.assertEqual(Role.objects.get(id=role.id).modifier, str(self.request.user.id))
+        self.assertFalse(role.has_changes())
+
+    def test_deferred_and_copied_instances(self):
+        role = Role.objects.only("name").get(id=self.role.id)
+        role.name = "新名称"
+        with CaptureQueriesContext(connections["default"]) as queries:
+            role.save()
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"sort"', queries[0]["sql"])
+        # 清空主键复制一条记录时按新建处理
+        self.role.pk = None
+        self.role.key = "copy"
+        self.role.save()
+        self.assertEqual(Role.objects.count(), 2)
+
+    def test_json_field_and_system_config_refresh(self):
+        with patch("dvadmin.system.models.dispatch.refresh_system_config") as refresh:
+            SystemConfig.objects.create(title="基础配置", key="base", value={"items": [1]})
+            config = SystemConfig.objects.get(key="base")
+            config.save()
+            self.assertEqual(refresh.call_count, 1)
+            config.value["items"].append(2)
+            self.assertEqual(config.get_dirty_fields(), ["value"])
+            config.save()
+            self.assertEqual(refresh.call_count, 2)
+        self.assertEqual(SystemConfig.objects.get(key="base").value, {"items": [1, 2]})
+
+
+@isolate_apps("dvadmin.system")
+class CascadeSoftDeleteTest(TransactionTestCase):
+    """
+    级联软删除：
+    *   按模型逐层批量更新, 查询次数与记录数量无关
+    *   只沿 on_delete=CASCADE 级联, 不能软删除的模型不受影响, 自关联的循环不会死循环
+    """
+
+    def setUp(self):
+        class Parent(SoftDeleteModel):
+            name = models.CharField(max_length=32)
+
+        class Child(SoftDeleteModel):
+            parent = models.ForeignKey(Parent, on_delete=models.CASCADE)
+
+        class GrandChild(SoftDeleteModel):
+            child = models.ForeignKey(Child, on_delete=models.CASCADE)
+
+        class Note(SoftDeleteModel):
+            parent = models.ForeignKey(Parent, on_delete=models.SET_NULL, null=True)
+
+        class Plain(models.Model):
+            parent = models.ForeignKey(Parent, on_delete=models.CASCADE)
+
+        class Node(SoftDeleteModel):
+            parent = models.ForeignKey("self", on_delete=models.CASCADE, null=True)
+
+        self.models = [Parent, Child, GrandChild, Note, Plain, Node]
+        with connection.schema_editor() as editor:
+            for model in self.models:
+                editor.create_model(model)
+        self.addCleanup(self.drop_tables)
+        self.Parent, self.Child, self.GrandChild, self.Note, self.Plain, self.Node = self.models
+
+    def drop_tables(self):
+        with connection.schema_editor() as editor:
+            for model in reversed(self.models):
+                editor.delete_model(model)
+
+    def make_tree(self, children: int):
+        parent = self.Parent._base_manager.create(name="p")
+        self.Child._base_manager.bulk_create([self.Child(parent=parent) for _ in range(children)])
+        self.GrandChild._base_manager.bulk_create(
+            [self.GrandChild(child=child) for child in self.Child._base_manager.filter(parent=parent) for _ in range(2)]
+        )
+        return parent
+
+    def test_query_count_independent_of_size(self):
+        small, large = self.make_tree(1), self.make_tree(50)
+        with CaptureQueriesContext(connection) as small_queries:
+            small.delete()
+        with CaptureQueriesContext(connection) as large_queries:
+            total, summary = large.delete()
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertEqual(total, 151)
+        self.assertEqual(summary, {"system.Parent": 1, "system.Child": 50, "system.GrandChild": 100})
+        self.assertTrue(large.is_deleted)
+        self.assertEqual(self.GrandChild._base_manager.filter(is_deleted=False).count(), 0)
+
+    def test_only_cascade_relations(self):
+        parent = self.make_tree(1)
+        note = self.Note._base_manager.create(parent=parent)
+        self.Plain._base_manager.create(parent=parent)
+        parent.delete()
+        note.refresh_from_db()
+        self.assertFalse(note.is_deleted)
+        self.assertEqual(self.Plain._base_manager.count(), 1)
+        # 已删除的记录再次删除不重复计数
+        self.assertEqual(parent.delete(), (0, {}))
+
+    def test_cycle(self):
+        first = self.Node._base_manager.create()
+        second = self.Node._base_manager.create(parent=first)
+        self.Node._base_manager.filter(pk=first.pk).update(parent=second)
+        self.assertEqual(first.delete(), (2, {"system.Node": 2}))
+
+    def test_hard_delete(self):
+        parent = self.make_tree(1)
+        parent.delete(soft_delete=False)
+        self.assertEqual(self.GrandChild._base_manager.count(), 0)
+
+    def test_restore_same_deletion_only(self):
+        parent = self.make_tree(2)
+        first, second = self.Child._base_manager.filter(parent=parent).order_by("id")
+        first.delete()
+        self.Child._base_manager.filter(pk=first.pk).update(delete_datetime=datetime(2020, 1, 1))
+        self.GrandChild._base_manager.filter(child=first).update(delete_datetime=datetime(2020, 1, 1))
+        self.assertEqual(parent.delete()[0], 4)
+        self.assertEqual(
+            parent.restore(), (4, {"system.Parent": 1, "system.Child": 1, "system.GrandChild": 2})
+        )
+        self.assertTrue(self.Child._base_manager.get(pk=first.pk).is_deleted)
+        self.assertEqual(self.GrandChild._base_manager.filter(is_deleted=True).count(), 2)
+        self.assertIsNone(self.Child._base_manager.get(pk=second.pk).delete_datetime)
+
+    def test_restore_resumable(self):
+        parent = self.make_tree(3)
+        parent.delete()
+        # 模拟中断: 只有部分下级记录已恢复
+        restored = list(self.GrandChild._base_manager.order_by("id").values_list("pk", flat=True)[:4])
+        self.GrandChild._base_manager.filter(pk__in=restored).update(is_deleted=False, delete_datetime=None)
+        self.assertEqual(parent.restore(), (6, {"system.Parent": 1, "system.Child": 3, "system.GrandChild": 2}))
+        self.assertEqual(parent.restore(), (0, {}))
+        self.assertEqual(self.GrandChild._base_manager.filter(is_deleted=True).count(), 0)
+
+
+@isolate_apps("dvadmin.system")
+class SoftDeleteQuerySetTest(TransactionTestCase):
+    """
+    软删除查询：
+    *   默认只查未删除, dead()/with_deleted()/filter(is_deleted=...) 切换范围, 互不影响
+    *   queryset.delete() 软删除并级联, hard_delete() 物理删除
+    *   alive_index_fields 生成 WHERE is_deleted = false 的部分索引
+    """
+
+    def setUp(self):
+        class Article(SoftDeleteModel):
+            title = models.CharField(max_length=32)
+            alive_index_fields = [("title",)]
+
+        class Comment(SoftDeleteModel):
+            article = models.ForeignKey(Article, on_delete=models.CASCADE)
+
+        self.Article, self.Comment = Article, Comment
+        with connection.schema_editor() as editor:
+            editor.create_model(Article)
+            editor.create_model(Comment)
+        self.addCleanup(self.drop_tables)
+        self.alive = Article._base_manager.create(title="a")
+        self.dead = Article._base_manager.create(title="b", is_deleted=True)
+        Comment._base_manager.create(article=self.alive)
+        Comment._base_manager.create(article=self.alive, is_deleted=True)
+
+    def drop_tables(self):
+        with connection.schema_editor() as editor:
+            editor.delete_model(self.Comment)
+            editor.delete_model(self.Article)
+
+    def titles(self, queryset):
+        return sorted(queryset.values_list("title", flat=True))
+
+    def test_visibility(self):
+        objects = self.Article.objects
+        self.assertEqual(self.titles(objects.all()), ["a"])
+        self.assertEqual(self.titles(objects.dead()), ["b"])
+        self.assertEqual(self.titles(objects.with_deleted()), ["a", "b"])
+        self.assertEqual(self.titles(objects.filter(is_deleted=True)), ["b"])
+        self.assertEqual(self.titles(objects.filter(title__in=["a", "b"]).with_deleted()), ["a", "b"])
+        self.assertEqual(self.titles(objects.with_deleted().alive()), ["a"])
+        # 上面的查询不影响之后的默认范围
+        self.assertEqual(self.titles(objects.all()), ["a"])
+        self.assertEqual(objects.count(), 1)
+        self.assertEqual(self.alive.comment_set.count(), 1)
+        self.assertEqual(objects.update(title="c"), 1)
+        self.assertEqual(self.titles(objects.dead()), ["b"])
+
+    def test_visibility_q(self):
+        objects = self.Article.objects
+        self.assertEqual(self.titles(objects.filter(Q(is_deleted=True))), ["b"])
+        self.assertEqual(self.titles(objects.filter(Q(is_deleted=True) | Q(title="a"))), ["a", "b"])
+        self.assertEqual(self.titles(objects.filter(Q(title="x") | (Q(title="b") & Q(is_deleted__in=[True])))), ["b"])
+        self.assertEqual(self.titles(objects.exclude(~Q(is_deleted=True))), ["b"])
+        # 不含is_deleted的Q对象仍保留默认条件
+        self.assertEqual(self.titles(objects.filter(Q(title="a") | Q(title="b"))), ["a"])
+
+    def test_delete(self):
+        self.assertEqual(
+            self.Article.objects.all().delete(), (2, {"system.Article": 1, "system.Comment": 1})
+        )
+        self.assertEqual(self.Article.objects.count(), 0)
+        self.assertEqual(self.Article.objects.with_deleted().count(), 2)
+        self.Article.objects.dead().hard_delete()
+        self.assertEqual(self.Article._base_manager.count(), 0)
+
+    def test_partial_index(self):
+        index = next(index for index in self.Article._meta.indexes if index.condition is not None)
+        self.assertEqual(index.fields, ["title"])
+        self.assertTrue(index.name.endswith("_alv"))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = %s", [index.name])
+            sql = cursor.fetchone()[0]
+        self.assertIn("WHERE", sql)
+
+
+class DeptTreeTest(TestCase):
+    """
+    部门物化路径：
+    *   新增、移动时维护tree_path, 子树和祖先查询次数固定
+    *   不能移动到自己的下级, rebuild_tree 修复批量导入或损坏的路径
+    """
+
+    def setUp(self):
+        self.root = Dept.objects.create(name="总部", key="root")
+        self.dev = Dept.objects.create(name="研发部", key="dev", parent=self.root)
+        self.team = Dept.objects.create(name="后端组", key="team", parent=self.dev)
+        self.sales = Dept.objects.create(name="销售部", key="sales", parent=self.root)
+
+    def test_paths_and_lookups(self):
+        self.assertEqual(self.root.tree_path, f"/{self.root.id}/")
+        team = Dept.objects.get(id=self.team.id)
+        self.assertEqual(team.tree_path, f"/{self.root.id}/{self.dev.id}/{self.team.id}/")
+        self.assertEqual(team.get_ancestor_ids(), [self.root.id, self.dev.id])
+        with self.assertNumQueries(2):
+            ids = Dept.get_descendant_ids(self.dev.id)
+        self.assertCountEqual(ids, [self.dev.id, self.team.id])
+        all_ids = [dept.id for dept in (self.root, self.dev, self.team, self.sales)]
+        self.assertCountEqual(Dept.recursion_all_dept(self.root.id), all_ids)
+        self.assertEqual(Dept.get_descendant_ids(self.team.id, include_self=False), [])
+        # 传入部门列表时在列表中查找
+        dept_all_list = [{"id": 2, "parent": 1}, {"id": 3, "parent": 2}, {"id": 4, "parent": None}]
+        self.assertCountEqual(Dept.recursion_all_dept(1, dept_all_list), [1, 2, 3])
+
+    def test_bulk_created_descendants(self):
+        # bulk_create不调用save(), 导入的部门没有tree_path, 按上级部门逐层查找
+        Dept.objects.bulk_create([Dept(id=100, name="导入", key="import"), Dept(id=101, name="一组", key="g1")])
+        Dept.objects.bulk_create([Dept(id=102, name="二组", key="g2", parent_id=101)])
+        Dept.objects.filter(id=101).update(parent_id=100)
+        self.assertCountEqual(Dept.get_descendant_ids(100), [100, 101, 102])
+        self.assertCountEqual(Dept.get_descendant_ids(100, include_self=False), [101, 102])
+        self.assertCountEqual(Dept.recursion_all_dept(100), [100, 101, 102])
+        # bulk_insert插入后补全tree_path
+        Dept.objects.bulk_insert([{"id": 103, "name": "三组", "key": "g3", "parent_id": 102}])
+        self.assertEqual(Dept.objects.get(id=103).tree_path, "/100/101/102/103/")
+        self.assertCountEqual(Dept.get_descendant_ids(101), [101, 102, 103])
+
+    def test_move_and_delete(self):
+        dev = Dept.objects.get(id=self.dev.id)
+        with self.assertNumQueries(0):
+            dev.save()
+        dev.parent = self.sales
+        dev.save()
+        team = Dept.objects.get(id=self.team.id)
+        self.assertEqual(team.get_ancestor_ids(), [self.root.id, self.sales.id, self.dev.id])
+        self.assertCountEqual(Dept.get_descendant_ids(self.sales.id), [self.sales.id, self.dev.id, self.team.id])
+        root = Dept.objects.get(id=self.root.id)
+        root.parent = team
+        with self.assertRaises(ValidationError):
+            root.save()
+        self.assertIsNone(Dept.objects.get(id=self.root.id).parent_id)
+        dev.delete()
+        self.assertFalse(Dept.objects.filter(id=self.team.id).exists())
+
+    def test_rebuild_tree(self):
+        Dept.objects.update(tree_path="")
+        orphan = Dept.objects.create(name="孤立", key="orphan")
+        Dept.objects.filter(id=orphan.id).update(parent_id=999999)
+        first = Dept.objects.create(name="甲", key="a")
+        second = Dept.objects.create(name="乙", key="b", parent=first)
+        Dept.objects.filter(id=first.id).update(parent_id=second.id)
+        updated, cyclic = Dept.rebuild_tree()
+        self.assertEqual(cyclic, {first.id, second.id})
+        self.assertEqual(updated, 5)
+        self.assertEqual(
+            Dept.objects.get(id=self.team.id).tree_path, f"/{self.root.id}/{self.dev.id}/{self.team.id}/"
+        )
+        self.assertEqual(Dept.objects.get(id=orphan.id).tree_path, f"/{orphan.id}/")
+        self.assertEqual(Dept.rebuild_tree(), (0, cyclic))
+
+
+class RegionNameTest(TestCase):
+    """
+    部门全称：
+    *   按tree_path批量解析, 查询次数与层级和数量无关, 结果缓存在进程内
+    *   部门改名、移动、删除后缓存失效
+    """
+
+    def setUp(self):
+        # 测试之间会复用自增id, 先让进程内缓存失效
+        dept_tree_cache.bump()
+        self.root = Dept.objects.create(name="总部", key="root")
+        self.dev = Dept.objects.create(name="研发部", key="dev", parent=self.root)
+        self.team = Dept.objects.create(name="后端组", key="team", parent=self.dev)
+        self.sales = Dept.objects.create(name="销售部", key="sales", parent=self.root)
+
+    def test_region_names(self):
+        ids = [self.team.id, self.sales.id, self.root.id, 999999]
+        with self.assertNumQueries(2):
+            names = Dept.get_region_names(ids)
+        self.assertEqual(
+            names, {self.team.id: "总部/研发部/后端组", self.sales.id: "总部/销售部", self.root.id: "总部"}
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(Dept.get_region_name(self.team), "总部/研发部/后端组")
+        dept_tree_cache.bump()
+        # 传入实例时不需要再查路径
+        with self.assertNumQueries(1):
+            self.assertEqual(Dept.get_region_name(self.team), "总部/研发部/后端组")
+
+    def test_reads_primary(self):
+        # 重新加载的数据会缓存到下一次bump(), 不能从有复制延迟的只读副本读取
+        with patch.object(ReplicaRouter, "db_for_read", return_value="replica_not_configured"):
+            self.assertEqual(Dept.get_region_names([self.team.id]), {self.team.id: "总部/研发部/后端组"})
+            self.assertEqual(len(Dept.get_tree(using="default")), 1)
+
+    def test_invalidation(self):
+        Dept.get_region_names([self.team.id])
+        dev = Dept.objects.get(id=self.dev.id)
+        dev.name = "技术部"
+        with self.captureOnCommitCallbacks(execute=True):
+            dev.save()
+        self.assertEqual(Dept.get_region_name(self.team), "总部/技术部/后端组")
+        dev.parent = self.sales
+        with self.captureOnCommitCallbacks(execute=True):
+            dev.save()
+        self.assertEqual(Dept.get_region_names([self.team.id])[self.team.id], "总部/销售部/技术部/后端组")
+        with self.captureOnCommitCallbacks(execute=True):
+            dev.delete()
+        self.assertEqual(Dept.get_region_names([self.team.id]), {})
+
+
+class VersionedCacheTest(SimpleTestCase):
+    """
+    带版本号的进程内缓存：
+    *   bump()后数据失效; 版本号有有效期, 不共享缓存的其他进程最多读到有效期内的旧数据
+    """
+
+    def setUp(self):
+        self.versioned = VersionedCache("test_versioned_cache")
+        self.addCleanup(cache.delete, self.versioned.key)
+
+    def test_bump(self):
+        self.versioned.sync()["key"] = 1
+        self.assertEqual(self.versioned.sync(), {"key": 1})
+        self.versioned.bump()
+        self.assertEqual(self.versioned.sync(), {})
+
+    @override_settings(VERSIONED_CACHE_TIMEOUT=60)
+    def test_version_expires(self):
+        # 另一个进程的bump()通知不到本进程(LocMemCache), 版本号过期后重新加载
+        self.versioned.sync()["key"] = 1
+        now = time.time()
+        with patch("django.core.cache.backends.locmem.time.time", return_value=now + 30):
+            self.assertEqual(self.versioned.sync(), {"key": 1})
+        with patch("django.core.cache.backends.locmem.time.time", return_value=now + 61):
+            self.assertEqual(self.versioned.sync(), {})
+        self.assertEqual(VersionedCache("test_versioned_cache", timeout=5).get_timeout(), 5)
+
+
+class RegionNameAutocommitTest(TransactionTestCase):
+    """
+    部门全称(不在事务中)：
+    *   autocommit下on_commit立即执行, 缓存必须在写入之后失效,
+        失效和写入之间到达的请求不能把旧名称缓存到新版本下
+    """
+
+    def setUp(self):
+        dept_tree_cache.bump()
+        self.root = Dept.objects.create(name="总部")
+        self.dev = Dept.objects.create(name="研发部", parent=self.root)
+
+    def test_rename_without_transaction(self):
+        self.assertEqual(Dept.get_region_name(self.dev), "总部/研发部")
+        bump = dept_tree_cache.bump
+
+        def bump_then_read():
+            bump()
+            # 模拟缓存失效后立刻到达的另一个请求
+            Dept.get_region_names([self.dev.id])
+
+        with patch.object(dept_tree_cache, "bump", side_effect=bump_then_read) as patched:
+            self.root.name = "集团"
+            self.root.save()
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(Dept.get_region_names([self.dev.id]), {self.dev.id: "集团/研发部"})
@@ -0,0 +1,363 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.db import connections, router
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from dvadmin.system.models import Dept, OperationLog, OperationLogRollup, Users, dept_tree_cache
+from dvadmin.utils import log_rollup, log_search
+from dvadmin.system.views.dept import DeptTreeView
+from dvadmin.system.views.operation_log import OperationLogView, encode_cursor
+from dvadmin.utils.memory_profiler import memory_profiler
+
+
+class OperationLogViewTest(APITestCase):
+    """
+    操作日志列表：
+    *   游标分页不重复不遗漏, 过滤条件生效, 未登录不可访问
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = Users.objects.create_user(username="admin", password="admin123456", name="管理员", is_staff=True)
+        base = datetime(2026, 1, 1, 12, 0, 0)
+        for i in range(25):
+            log = OperationLog.objects.create(
+                request_path="/api/login/" if i % 2 else "/api/dept/",
+                request_method="POST",
+                status=bool(i % 2),
+                creator=self.user,
+            )
+            # 每两条使用相同时间, 验证时间相同的情况下按id翻页
+            OperationLog.objects.filter(id=log.id).update(create_datetime=base + timedelta(minutes=i // 2))
+        self.url = reverse("operation_log")
+
+    def test_requires_authentication(self):
+        response = self.client.get(self.url)
+        self.assertNotEqual(response.json().get("code"), 2000)
+
+    def test_requires_admin(self):
+        user = Users.objects.create_user(username="test", password="test123456", name="测试")
+        self.client.force_authenticate(user)
+        self.assertNotEqual(self.client.get(self.url).json().get("code"), 2000)
+        self.assertNotEqual(self.client.get(reverse("operation_log_rollup")).json().get("code"), 2000)
+
+    def test_cursor_pagination(self):
+        self.client.force_authenticate(self.user)
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 10}
+            if cursor:
+                params["cursor"] = cursor
+            data = self.client.get(self.url, params).json()
+            self.assertEqual(data["code"], 2000)
+            ids.extend(row["id"] for row in data["data"]["results"])
+            cursor = data["data"]["next"]
+            if not cursor:
+                break
+        expected = list(
+            OperationLog.objects.order_by("-create_datetime", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_filters(self):
+        self.client.force_authenticate(self.user)
+        data = self.client.get(self.url, {"path": "/api/login/", "status": "true"}).json()
+        results = data["data"]["results"]
+        self.assertEqual(len(results), 12)
+        self.assertTrue(all(row["request_path"] == "/api/login/" for row in results))
+        self.assertEqual(results[0]["creator_name"], "管理员")
+
+        data = self.client.get(self.url, {"start": "2026-01-01 12:10:00"}).json()
+        self.assertEqual(len(data["data"]["results"]), 5)
+
+    def test_cursor_uses_time_index(self):
+        """游标条件按 (create_datetime, id) 索引顺序扫描, 不把游标之前的所有行取出再排序"""
+        if connections[router.db_for_read(OperationLog)].vendor != "sqlite":
+            self.skipTest("只检查SQLite的执行计划")
+        log = OperationLog.objects.order_by("-create_datetime", "-id")[10]
+        queryset = OperationLogView.filter_cursor(OperationLog.objects.all(), encode_cursor(
+            {"create_datetime": log.create_datetime, "id": log.id}
+        ))
+        plan = queryset.order_by("-create_datetime", "-id").values(*OperationLogView.list_fields)[:11].explain()
+        # 按索引从游标位置开始范围查找, 而不是全表扫描或取出后排序
+        self.assertRegex(plan, r"SEARCH \S+ USING (COVERING )?INDEX op_log_time_idx \(create_datetime<\?\)")
+        self.assertNotIn("TEMP B-TREE", plan)
+        self.assertNotIn("MULTI-INDEX OR", plan)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.user)
+        data = self.client.get(self.url, {"cursor": "invalid"}).json()
+        self.assertEqual(data["code"], 4000)
+
+    def test_invalid_filters(self):
+        self.client.force_authenticate(self.user)
+        for params in ({"creator": "abc"}, {"start": "2026-13-40T00:00"}, {"end": "2026-02-30 00:00:00"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.json()["code"], 4000, params)
+        data = self.client.get(reverse("operation_log_rollup"), {"start": "2026-13-40T00:00"}).json()
+        self.assertEqual(data["code"], 4000)
+
+
+class OperationLogSearchTest(APITestCase):
+    """
+    全文检索：
+    *   日志写入后可按请求地址、请求参数检索, 清理日志时同步删除索引
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = Users.objects.create_user(username="admin", password="admin123456", is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.logs = [
+            OperationLog.objects.create(request_path="/api/order/1001/", request_body='{"remark": "退款"}'),
+            OperationLog.objects.create(request_path="/api/order/1002/", request_body='{"remark": "发货"}'),
+            OperationLog.objects.create(request_path="/api/dept/", request_body='{"order_id": 1001}'),
+        ]
+        log_search.index_logs(self.logs)
+        self.url = reverse("operation_log")
+
+    def _search(self, text):
+        data = self.client.get(self.url, {"search": text}).json()
+        return sorted(row["id"] for row in data["data"]["results"])
+
+    def test_search_path_and_body(self):
+        self.assertEqual(self._search("1001"), [self.logs[0].id, self.logs[2].id])
+        self.assertEqual(self._search("/api/order/1002/"), [self.logs[1].id])
+        self.assertEqual(self._search("发货"), [self.logs[1].id])
+        # 引号等FTS语法字符按普通文本处理
+        self.assertEqual(self._search('"order AND'), [])
+
+    def test_search_chinese_words(self):
+        """操作说明为连续的中文时可以检索其中的词语, 少于3个字符的词也可以"""
+        log = OperationLog.objects.create(request_path="/api/dept/import/", request_msg="批量导入部门数据成功")
+        log_search.index_logs([log])
+        self.assertEqual(self._search("导入部门"), [log.id])
+        self.assertEqual(self._search("部门"), [log.id])
+        self.assertEqual(self._search("导入 成功"), [log.id])
+        self.assertEqual(self._search("100%"), [])
+
+    def test_delete_logs(self):
+        log_search.delete_logs([self.logs[0].id])
+        self.assertEqual(self._search("1001"), [self.logs[2].id])
+
+
+class OperationLogRollupTest(APITestCase):
+    """
+    日志汇总：
+    *   增量累加与从历史重建结果一致, 接口按维度聚合
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        # 进程内的计数可能来自其他测试
+        log_rollup.get_buffer().clear()
+        self.addCleanup(log_rollup.get_buffer().clear)
+        self.user = Users.objects.create_user(username="admin", password="admin123456", is_staff=True)
+        self.client.force_authenticate(self.user)
+        hour = datetime(2026, 1, 1, 8, 0, 0)
+        specs = [
+            ("系统配置", "/api/config/", True, 10),
+            ("系统配置", "/api/config/", True, 20),
+            ("系统配置", "/api/config/", False, 30),
+            ("部门", "/api/dept/", True, 70),
+        ]
+        for modular, path, status, minute in specs:
+            log = OperationLog.objects.create(
+                request_modular=modular,
+                request_path=path,
+                request_method="POST",
+                status=status,
+                response_code="2000" if status else "4000",
+            )
+            log.create_datetime = hour + timedelta(minutes=minute)
+            OperationLog.objects.filter(id=log.id).update(create_datetime=log.create_datetime)
+            log_rollup.record(log)
+        # 4个请求合并为3行, 每行一条UPDATE
+        with CaptureQueriesContext(connections["operation_log"]) as queries:
+            self.assertEqual(log_rollup.flush(), 3)
+        self.assertEqual(sum(query["sql"].startswith("UPDATE") for query in queries), 3)
+
+    def _rows(self):
+        return list(
+            OperationLogRollup.objects.order_by("hour", "request_path", "status").values_list(
+                "hour", "request_path", "status", "count"
+            )
+        )
+
+    def test_record_and_rebuild_match(self):
+        recorded = self._rows()
+        self.assertEqual(
+            recorded,
+            [
+                (datetime(2026, 1, 1, 8), "/api/config/", False, 1),
+                (datetime(2026, 1, 1, 8), "/api/config/", True, 2),
+                (datetime(2026, 1, 1, 9), "/api/dept/", True, 1),
+            ],
+        )
+        OperationLogRollup.objects.update(count=0)
+        log_rollup.rebuild(datetime(2026, 1, 1), datetime(2026, 1, 2), chunk_size=2)
+        self.assertEqual(self._rows(), recorded)
+
+    def test_rollup_view(self):
+        url = reverse("operation_log_rollup")
+        data = self.client.get(url, {"group_by": "request_modular"}).json()
+        self.assertEqual(
+            data["data"],
+            [{"request_modular": "系统配置", "count": 3}, {"request_modular": "部门", "count": 1}],
+        )
+        data = self.client.get(url, {"group_by": "status", "path": "/api/config/"}).json()
+        self.assertEqual(data["data"], [{"status": False, "count": 1}, {"status": True, "count": 2}])
+        data = self.client.get(url, {"group_by": "id"}).json()
+        self.assertEqual(data["code"], 4000)
+
+
+class MemoryProfileViewTest(APITestCase):
+    """
+    内存分析接口：
+    *   仅管理员可用, 开始、快照、报告、停止
+    """
+
+    def setUp(self):
+        self.url = reverse("memory_profile")
+        self.admin = Users.objects.create_user(username="admin", password="admin123456", name="管理员", is_staff=True)
+        self.addCleanup(memory_profiler.stop)
+
+    def test_requires_admin(self):
+        user = Users.objects.create_user(username="test", password="test123456", name="测试")
+        self.client.force_authenticate(user)
+        self.assertNotEqual(self.client.post(self.url, {"action": "start"}).json().get("code"), 2000)
+        self.assertFalse(memory_profiler.running)
+
+    def test_profile_cycle(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(self.url).json()["data"], {"running": False})
+        self.assertEqual(self.client.post(self.url, {"action": "snapshot"}).json()["code"], 4000)
+
+        self.assertTrue(self.client.post(self.url, {"action": "start", "frames": 5}).json()["data"]["running"])
+        leak = [bytearray(1024) for _ in range(1000)]
+        self.client.post(self.url, {"action": "snapshot"})
+        report = self.client.get(self.url, {"limit": 5}).json()["data"]
+        self.assertEqual(len(report["snapshots"]), 2)
+        self.assertLessEqual(len(report["modules"]), 5)
+        self.assertIn("dvadmin.system.tests.test_views", [item["module"] for item in report["modules"]])
+        del leak
+
+        self.assertFalse(self.client.post(self.url, {"action": "stop"}).json()["data"]["running"])
+
+    def test_invalid_action(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(self.url, {"action": "dump"}).json()["code"], 4000)
+        self.assertEqual(self.client.post(self.url, {"action": "start", "frames": 0}).json()["code"], 4000)
+
+
+class DeptTreeViewTest(APITestCase):
+    """
+    部门树：
+    *   一次查询生成按sort排序的嵌套树, status过滤, ETag返回304
+    *   缓存命中只查询部门表状态, 部门变化后(包括其他进程的修改)失效
+    """
+
+    def setUp(self):
+        dept_tree_cache.bump()
+        self.url = reverse("dept_tree")
+        self.user = Users.objects.create_user(username="admin", password="admin123456", name="管理员")
+        self.root = Dept.objects.create(name="总部", sort=1)
+        self.dev = Dept.objects.create(name="研发部", sort=2, parent=self.root)
+        self.sales = Dept.objects.create(name="销售部", sort=1, parent=self.root)
+        self.backend = Dept.objects.create(name="后端组", sort=1, parent=self.dev, status=False)
+        self.client.force_authenticate(self.user)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertNotEqual(self.client.get(self.url).json().get("code"), 2000)
+
+    def test_nested_tree(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        data = response.json()
+        self.assertEqual(data["code"], 2000)
+        [root] = data["data"]
+        self.assertEqual(root["name"], "总部")
+        self.assertEqual([child["name"] for child in root["children"]], ["销售部", "研发部"])
+        self.assertEqual(root["children"][1]["children"][0]["name"], "后端组")
+        self.assertEqual(root["children"][1]["children"][0]["parent_id"], self.dev.id)
+
+    def test_status_filter(self):
+        [root] = self.client.get(self.url, {"status": "true"}).json()["data"]
+        self.assertEqual(root["children"][1]["children"], [])
+        # 上级被过滤掉的部门作为根节点
+        self.assertEqual([dept["name"] for dept in self.client.get(self.url, {"status": "false"}).json()["data"]], ["后端组"])
+        self.assertEqual(self.client.get(self.url, {"status": "x"}).json()["code"], 4000)
+
+    def test_etag_and_cache(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).content, response.content)
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_changed_by_other_process(self):
+        etag = self.client.get(self.url)["ETag"]
+        # 其他进程的修改: 本进程的缓存版本号没有变化
+        with patch.object(dept_tree_cache, "bump"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.sales.name = "市场部"
+                self.sales.save()
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+            self.assertEqual(response.json()["data"][0]["children"][0]["name"], "市场部")
+            with self.captureOnCommitCallbacks(execute=True):
+                Dept.objects.filter(id=self.backend.id).delete()
+            self.assertNotIn("后端组", self.client.get(self.url).content.decode())
+
+    def test_invalidated_on_change(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sales.sort = 3
+            self.sales.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([child["name"] for child in response.json()["data"][0]["children"]], ["研发部", "销售部"])
+
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dev.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual([child["name"] for child in response.json()["data"][0]["children"]], ["销售部"])
+
+
+class DeptTreeAutocommitTest(APITransactionTestCase):
+    """
+    部门树(不在事务中)：
+    *   缓存失效和写入之间到达的请求不能把旧的部门树和ETag缓存到新版本下
+    """
+
+    def setUp(self):
+        dept_tree_cache.bump()
+        self.url = reverse("dept_tree")
+        self.client.force_authenticate(Users.objects.create_user(username="admin", password="admin123456"))
+        self.root = Dept.objects.create(name="总部")
+
+    def test_etag_changes_after_rename(self):
+        etag = self.client.get(self.url)["ETag"]
+        bump = dept_tree_cache.bump
+
+        def bump_then_read():
+            bump()
+            # 模拟缓存失效后立刻到达的另一个请求
+            DeptTreeView.get_cached_tree()
+
+        with patch.object(dept_tree_cache, "bump", side_effect=bump_then_read):
+            self.root.name = "集团"
+            self.root.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["data"][0]["name"], "集团")
@@ -0,0 +1,74 @@
+import hashlib
+import json
+
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from dvadmin.system.models import Dept, dept_tree_cache
+from dvadmin.utils.authentication import TracedJWTAuthentication
+from dvadmin.utils.cache_stats import cache_stats
+from dvadmin.utils.custom_exception.Validation import CustomValidationError
+
+STATUS_PARAMS = {"true": True, "1": True, "false": False, "0": False}
+
+
+class DeptTreeView(APIView):
+    """
+    完整部门树
+    序列化后的JSON和ETag缓存在进程内(dept_tree_cache), 部门新增、修改、删除时失效:
+    客户端带 If-None-Match 且部门未变化时返回304, 否则大部分请求直接返回缓存的字节, 不查询部门、不序列化
+    其他进程的修改不一定能通知到本进程(见 VersionedCache), 每次请求先查一次部门表的
+    (最后修改时间, 部门数)(Dept.get_tree_state), 与缓存时不同则重新生成
+    """
+
+    authentication_classes = [TracedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="部门树",
+        description="按sort排序的嵌套部门树, 参数status(true/false)只返回该状态的部门; 支持ETag/If-None-Match",
+        parameters=[OpenApiParameter("status", str, required=False, enum=list(STATUS_PARAMS))],
+        responses={"2000": {"type": "string", "example": "成功返回部门树"}},
+    )
+    def get(self, request: Request):
+        status = request.query_params.get("status")
+        if status is not None:
+            if status.lower() not in STATUS_PARAMS:
+                raise CustomValidationError("status必须为true或false")
+            status = STATUS_PARAMS[status.lower()]
+        etag, body = self.get_cached_tree(status)
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type="application/json")
+            response["ETag"] = etag
+        # 浏览器每次都带ETag重新验证, 不直接使用本地缓存
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def get_cached_tree(status: bool = None) -> tuple[str, bytes]:
+        """
+        :return: (ETag, 与DetailResponse格式相同的响应内容)
+        ETag取内容的摘要而不是缓存版本号, 多个进程各自生成的相同内容ETag相同
+        缓存到下一次 bump(), 从主库读取, 不读可能有延迟的只读副本
+        """
+        data = dept_tree_cache.sync()
+        key = f"tree:{status}"
+        # 先取状态再生成部门树, 两次查询之间有修改时缓存的状态偏旧, 下一次请求会重新生成
+        state = Dept.get_tree_state(using=DEFAULT_DB_ALIAS)
+        cached = data.get(key)
+        hit = cached is not None and cached[0] == state
+        cache_stats.record("dept_tree", hit=hit)
+        if not hit:
+            body = json.dumps(
+                {"code": 2000, "data": Dept.get_tree(status=status, using=DEFAULT_DB_ALIAS), "msg": "success"},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ).encode()
+            cached = data[key] = (state, f'"{hashlib.md5(body).hexdigest()}"', body)
+        return cached[1:]
@@ -17,6 +17,7 @@ from My_django_vue3_admin.dispatch import get_system_config_values
 from dvadmin.system.models import Users
 from dvadmin.utils.custom_exception.Validation import CustomValidationError
 from dvadmin.utils.json_response import DetailResponse, ErrorResponse
+from dvadmin.utils.tracing import span
 
 
 class CaptchaView(APIView):
@@ -36,7 +37,8 @@ class CaptchaView(APIView):
             hash_key: str = CaptchaStore.generate_key()
             captcha = CaptchaStore.objects.get(hashkey=hash_key)
             # 获取图片（通过 captcha_image 视图）
-            image_response = captcha_image(request, captcha.hashkey)
+            with span("captcha.render"):
+                image_response = captcha_image(request, captcha.hashkey)
             image_data = image_response.content
 
             # 转base64
@@ -0,0 +1,61 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from dvadmin.utils.authentication import TracedJWTAuthentication
+from dvadmin.utils.custom_exception.Validation import CustomValidationError
+from dvadmin.utils.json_response import DetailResponse
+from dvadmin.utils.memory_profiler import memory_profiler
+
+
+class MemoryProfileView(APIView):
+    """
+    内存分析, 仅管理员
+    只作用于处理该请求的worker进程, 多worker部署时需要多次请求或直接用 manage.py memory_profile
+    """
+
+    authentication_classes = [TracedJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    actions = ("start", "snapshot", "stop")
+
+    @extend_schema(
+        summary="内存分析报告",
+        description="返回最新快照相对开始时增长最多的模块和代码行, 参数limit(默认30)",
+        responses={"2000": {"type": "string", "example": "成功返回报告"}},
+    )
+    def get(self, request: Request):
+        try:
+            limit = int(request.query_params.get("limit", 30))
+        except ValueError:
+            raise CustomValidationError("limit必须为整数")
+        return DetailResponse(data=memory_profiler.report(limit=min(max(limit, 1), 200)))
+
+    @extend_schema(
+        summary="内存分析控制",
+        description="action: start(开始, 可选frames调用栈深度、interval自动快照间隔秒数) / snapshot(拍快照) / stop(停止)",
+        responses={"2000": {"type": "string", "example": "操作成功"}},
+    )
+    def post(self, request: Request):
+        action = request.data.get("action")
+        if action not in self.actions:
+            raise CustomValidationError(f"action必须为{'/'.join(self.actions)}之一")
+        if action == "start":
+            try:
+                frames = int(request.data.get("frames", 10))
+                interval = float(request.data["interval"]) if request.data.get("interval") else None
+            except (TypeError, ValueError):
+                raise CustomValidationError("frames、interval必须为数字")
+            if not 1 <= frames <= 50:
+                raise CustomValidationError("frames范围为1-50")
+            if interval is not None and interval < 1:
+                raise CustomValidationError("interval不能小于1秒")
+            memory_profiler.start(frames=frames, interval=interval)
+        elif action == "snapshot":
+            if not memory_profiler.running:
+                raise CustomValidationError("内存分析未开始")
+            memory_profiler.snapshot()
+        else:
+            memory_profiler.stop()
+        return DetailResponse(data={"running": memory_profiler.running}, msg="操作成功")
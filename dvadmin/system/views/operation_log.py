@@ -0,0 +1,200 @@
+import base64
+import json
+
+from django.db.models import Q, Sum
+from django.utils.dateparse import parse_datetime
+from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from dvadmin.system.models import OperationLog, OperationLogRollup, Users
+from dvadmin.utils import log_rollup, log_search
+from dvadmin.utils.authentication import TracedJWTAuthentication
+from dvadmin.utils.custom_exception.Validation import CustomValidationError
+from dvadmin.utils.json_response import DetailResponse, SuccessResponse
+
+
+def encode_cursor(row: dict) -> str:
+    """把最后一条日志的(create_datetime, id)编码为不透明的游标"""
+    raw = json.dumps([row["create_datetime"].isoformat(), row["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        create_datetime, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        create_datetime = parse_datetime(create_datetime)
+        log_id = int(log_id)
+    except (ValueError, TypeError):
+        raise CustomValidationError("cursor无效")
+    if create_datetime is None:
+        raise CustomValidationError("cursor无效")
+    return create_datetime, log_id
+
+
+class OperationLogView(APIView):
+    """
+    操作日志查询, 包含所有用户的操作记录, 仅管理员
+    使用(create_datetime, id)游标分页而不是offset, 配合组合索引, 翻到第几页都只扫描一页数据
+    """
+
+    authentication_classes = [TracedJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    # 列表不返回请求参数、返回信息, 避免逐行解压
+    list_fields = (
+        "id",
+        "request_modular",
+        "request_path",
+        "request_method",
+        "request_msg",
+        "request_ip",
+        "request_browser",
+        "request_os",
+        "response_code",
+        "status",
+        "creator_id",
+        "create_datetime",
+    )
+    default_limit = 20
+    max_limit = 100
+
+    def _get_limit(self, params) -> int:
+        try:
+            limit = int(params.get("limit", self.default_limit))
+        except ValueError:
+            raise CustomValidationError("limit必须为整数")
+        return min(max(limit, 1), self.max_limit)
+
+    @staticmethod
+    def _parse_datetime(value: str, name: str):
+        try:
+            # 格式正确但日期不存在(如 2026-13-40)时抛出ValueError
+            result = parse_datetime(value)
+        except ValueError:
+            result = None
+        if result is None:
+            raise CustomValidationError(f"{name}格式应为 YYYY-MM-DD HH:MM:SS")
+        return result
+
+    def filter_queryset(self, params):
+        """
+        支持的过滤参数: path(请求地址), method(请求方式), status(true/false),
+        creator(创建人id), ip, start/end(创建时间范围,包含start不包含end),
+        search(全文检索请求地址、请求参数、操作说明)
+        """
+        # create_datetime 为空的行无法参与游标比较
+        queryset = OperationLog.objects.filter(create_datetime__isnull=False)
+        if params.get("path"):
+            queryset = queryset.filter(request_path=params["path"])
+        if params.get("method"):
+            queryset = queryset.filter(request_method=params["method"].upper())
+        if params.get("status") in ("true", "1"):
+            queryset = queryset.filter(status=True)
+        elif params.get("status") in ("false", "0"):
+            queryset = queryset.filter(status=False)
+        if params.get("creator"):
+            try:
+                creator_id = int(params["creator"])
+            except ValueError:
+                raise CustomValidationError("creator必须为整数")
+            queryset = queryset.filter(creator_id=creator_id)
+        if params.get("ip"):
+            queryset = queryset.filter(request_ip=params["ip"])
+        if params.get("start"):
+            queryset = queryset.filter(create_datetime__gte=self._parse_datetime(params["start"], "start"))
+        if params.get("end"):
+            queryset = queryset.filter(create_datetime__lt=self._parse_datetime(params["end"], "end"))
+        search = params.get("search", "").strip()
+        if search:
+            queryset = queryset.filter(log_search.search_filter(search))
+        return queryset
+
+    @staticmethod
+    def filter_cursor(queryset, cursor: str):
+        """
+        游标之后(更早)的日志: (create_datetime, id) < 游标
+        多余的 create_datetime <= 游标时间 作为索引范围条件, 只有OR条件时SQLite会
+        取出游标之前的所有行再排序(MULTI-INDEX OR + TEMP B-TREE), 越往后翻越慢
+        """
+        create_datetime, log_id = decode_cursor(cursor)
+        return queryset.filter(
+            Q(create_datetime__lt=create_datetime) | Q(create_datetime=create_datetime, id__lt=log_id),
+            create_datetime__lte=create_datetime,
+        )
+
+    @staticmethod
+    def _fill_creator_name(rows: list[dict]):
+        """创建人名称单独查询, 不JOIN用户表"""
+        creator_ids = {row["creator_id"] for row in rows if row["creator_id"]}
+        names = dict(Users.objects.filter(id__in=creator_ids).values_list("id", "name")) if creator_ids else {}
+        for row in rows:
+            row["creator_name"] = names.get(row["creator_id"])
+
+    @extend_schema(
+        summary="操作日志列表",
+        description="游标分页, 返回的next作为下一页的cursor参数, 为null表示没有下一页",
+        responses={"2000": {"type": "string", "example": "成功返回日志列表"}},
+    )
+    def get(self, request: Request):
+        params = request.query_params
+        limit = self._get_limit(params)
+        queryset = self.filter_queryset(params)
+        if params.get("cursor"):
+            queryset = self.filter_cursor(queryset, params["cursor"])
+        # 多取一条判断是否还有下一页, 不需要count
+        rows = list(
+            queryset.order_by("-create_datetime", "-id").values(*self.list_fields)[: limit + 1]
+        )
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
+        self._fill_creator_name(rows)
+        return SuccessResponse(
+            data={"results": rows, "next": next_cursor}, limit=limit, total=len(rows)
+        )
+
+
+class OperationLogRollupView(APIView):
+    """
+    操作日志小时汇总, 供看板使用
+    只查询汇总表, 如"每个模块每小时请求数": group_by=hour,request_modular
+    "各地址错误率": group_by=request_path,status
+    仅管理员
+    """
+
+    authentication_classes = [TracedJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    group_fields = ("hour", *log_rollup.DIMENSIONS)
+    filter_fields = {
+        "module": "request_modular",
+        "path": "request_path",
+        "method": "request_method",
+        "code": "response_code",
+    }
+
+    @extend_schema(
+        summary="操作日志汇总",
+        description="参数: start/end(时间范围), group_by(逗号分隔, 可选hour,request_modular,request_path,"
+        "request_method,status,response_code), module/path/method/code(过滤)",
+        responses={"2000": {"type": "string", "example": "成功返回汇总数据"}},
+    )
+    def get(self, request: Request):
+        params = request.query_params
+        group_by = [field for field in params.get("group_by", "hour").split(",") if field]
+        invalid = set(group_by) - set(self.group_fields)
+        if invalid:
+            raise CustomValidationError(f"group_by不支持: {','.join(sorted(invalid))}")
+
+        queryset = OperationLogRollup.objects.all()
+        if params.get("start"):
+            start = OperationLogView._parse_datetime(params["start"], "start")
+            queryset = queryset.filter(hour__gte=log_rollup.truncate_hour(start))
+        if params.get("end"):
+            queryset = queryset.filter(hour__lt=OperationLogView._parse_datetime(params["end"], "end"))
+        for param, field in self.filter_fields.items():
+            if params.get(param):
+                queryset = queryset.filter(**{field: params[param]})
+        rows = list(queryset.values(*group_by).annotate(count=Sum("count")).order_by(*group_by))
+        return DetailResponse(data=rows)
@@ -0,0 +1,24 @@
+"""
+认证类
+"""
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from dvadmin.utils.tracing import span
+
+
+class TracedJWTAuthentication(JWTAuthentication):
+    """JWT认证, 记录token校验和查询用户的耗时"""
+
+    def authenticate(self, request):
+        with span("auth.jwt") as current:
+            result = super().authenticate(request)
+            current.set_attribute("auth.authenticated", result is not None)
+            return result
+
+    def get_validated_token(self, raw_token):
+        with span("auth.jwt.validate_token"):
+            return super().get_validated_token(raw_token)
+
+    def get_user(self, validated_token):
+        with span("auth.jwt.get_user"):
+            return super().get_user(validated_token)
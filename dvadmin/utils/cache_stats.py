@@ -0,0 +1,38 @@
+"""
+项目内缓存的命中统计, 由 /debug/runtime 输出
+cache_stats.record("system_config", hit=True)
+"""
+import threading
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 名称 -> [命中次数, 未命中次数]
+        self._counts: dict[str, list[int]] = {}
+
+    def record(self, name: str, hit: bool):
+        with self._lock:
+            counts = self._counts.get(name)
+            if counts is None:
+                counts = self._counts[name] = [0, 0]
+            counts[0 if hit else 1] += 1
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            items = [(name, hits, misses) for name, (hits, misses) in self._counts.items()]
+        return {
+            name: {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            }
+            for name, hits, misses in items
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+cache_stats = CacheStats()
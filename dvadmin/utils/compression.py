@@ -0,0 +1,134 @@
+"""
+日志文本压缩
+使用zlib的预置字典(zdict), 把日志里反复出现的JSON片段放进字典, 短小相似的日志也能压缩得很好
+存储格式(第一个字节为格式标记):
+    * b"\\x00" + utf-8文本                    太短不值得压缩的内容
+    * b"\\x01" + 字典编号(1字节) + zlib数据    压缩内容
+    * 其他                                   历史未压缩的utf-8文本
+"""
+import re
+import zlib
+from collections import Counter
+from typing import Iterable
+
+RAW_MARKER = 0
+ZLIB_MARKER = 1
+
+# 预置字典: zlib优先匹配字典末尾的内容, 越常见的片段越靠后
+# 注意: 已经用于写入的字典内容不能修改, 需要新字典时增加新的编号
+DEFAULT_ZDICT = "".join(
+    [
+        '"_files": [',
+        '"_body": "[truncated ',
+        ' bytes]"',
+        '...[truncated ',
+        ' chars]',
+        '"description": null, ',
+        '"create_datetime": "',
+        '"update_datetime": "',
+        '"dept_belong_id": ',
+        '"placeholder": ',
+        '"form_item_type": ',
+        '"data_options": ',
+        '"parent": null, ',
+        '"parent": ',
+        '"title": "',
+        '"value": ',
+        '"owner": ',
+        '"phone": ',
+        '"email": ',
+        '"mobile": "',
+        '"avatar": ',
+        '"gender": ',
+        '"role": [',
+        '"post": [',
+        '"dept": ',
+        '"sort": ',
+        '"key": "',
+        '"name": "',
+        '"id": ',
+        '"status": true, ',
+        '"status": false, ',
+        '"limit": "20", ',
+        '"page": "1", ',
+        '"hashkey": "',
+        '"captcha": "',
+        '"password": "********", ',
+        '"username": "',
+        '"msg": "账号/密码错误;重试',
+        '"msg": "登入请求成功!"',
+        '"code": 4000, "msg": "',
+        '{"code": 2000, "msg": "success"}',
+    ]
+).encode()
+
+ZDICTS: dict[int, bytes] = {1: DEFAULT_ZDICT}
+DEFAULT_ZDICT_ID = 1
+
+
+def compress_text(text: str, zdict_id: int = DEFAULT_ZDICT_ID, min_length: int = 64, level: int = 6) -> bytes:
+    """
+    压缩文本
+    :param zdict_id: 预置字典编号, 0表示不使用字典
+    :param min_length: 小于该长度(字节)的内容不压缩
+    """
+    data = text.encode("utf-8")
+    if len(data) < min_length:
+        return bytes([RAW_MARKER]) + data
+    zdict = ZDICTS.get(zdict_id)
+    compressor = (
+        zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, zdict=zdict)
+        if zdict
+        else zlib.compressobj(level)
+    )
+    compressed = compressor.compress(data) + compressor.flush()
+    # 压缩后没有变小就原样存储
+    if len(compressed) + 2 >= len(data) + 1:
+        return bytes([RAW_MARKER]) + data
+    return bytes([ZLIB_MARKER, zdict_id if zdict else 0]) + compressed
+
+
+def decompress_text(value) -> str | None:
+    """
+    解压文本, 兼容历史未压缩的数据
+    :param value: bytes/memoryview(postgresql)/str(sqlite中未迁移的旧数据)/None
+    """
+    if value is None or isinstance(value, str):
+        return value
+    data = bytes(value)
+    if not data:
+        return ""
+    marker = data[0]
+    if marker == RAW_MARKER:
+        return data[1:].decode("utf-8")
+    if marker == ZLIB_MARKER:
+        zdict = ZDICTS.get(data[1])
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS, zdict=zdict) if zdict else zlib.decompressobj()
+        return (decompressor.decompress(data[2:]) + decompressor.flush()).decode("utf-8")
+    return data.decode("utf-8", errors="replace")
+
+
+_TOKEN_PATTERN = re.compile(r'"[^"\\]{1,40}": ?|"[^"\\]{1,40}"|[\[\]{},]')
+
+
+def train_zdict(samples: Iterable[str], size: int = 4 * 1024) -> bytes:
+    """
+    根据样本训练预置字典
+    统计JSON键、短字符串值等片段的出现次数, 按 次数*长度 排序, 收益最高的放在字典末尾
+    :param samples: 有代表性的日志内容
+    :param size: 字典最大字节数(zlib最多使用32KB)
+    """
+    counter = Counter()
+    for sample in samples:
+        counter.update(_TOKEN_PATTERN.findall(sample))
+    scored = sorted(
+        (token for token, count in counter.items() if count > 1),
+        key=lambda token: counter[token] * len(token.encode("utf-8")),
+    )
+    result = b""
+    for token in reversed(scored):
+        encoded = token.encode("utf-8")
+        if len(result) + len(encoded) > size:
+            break
+        result = encoded + result
+    return result
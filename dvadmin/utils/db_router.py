@@ -0,0 +1,165 @@
+"""
+数据库路由
+在 settings.DATABASE_ROUTERS 中配置
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class OperationLogRouter:
+    """
+    操作日志分库
+    settings.OPERATION_LOG_MODELS 中的模型(如 system.operationlog)读写、迁移都在
+    settings.OPERATION_LOG_DATABASE_ALIAS 对应的数据库, 该别名不在 DATABASES 中时不做任何路由
+    日志模型和其他模型之间只保存id(db_constraint=False), 查询时不能跨库JOIN
+    """
+
+    def __init__(self):
+        self.alias = getattr(settings, "OPERATION_LOG_DATABASE_ALIAS", "operation_log")
+        self.enabled = self.alias in settings.DATABASES
+        self.models = {label.lower() for label in getattr(settings, "OPERATION_LOG_MODELS", [])}
+
+    def is_log_model(self, model) -> bool:
+        return model._meta.label_lower in self.models
+
+    def _db_for(self, model, **hints):
+        if not self.enabled:
+            return None
+        if self.is_log_model(model):
+            return self.alias
+        # 通过日志访问关联对象(如 log.creator)时, Django默认使用日志所在的数据库, 这里改回主库
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db == self.alias:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not self.enabled:
+            return None
+        if self.is_log_model(obj1.__class__) or self.is_log_model(obj2.__class__):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not self.enabled or model_name is None:
+            return None
+        if f"{app_label}.{model_name}" in self.models:
+            return db == self.alias
+        if db == self.alias:
+            return False
+        return None
+
+
+# 写入后在该时间点之前的读操作都走主库(time.monotonic()), 每个请求由 ReplicaPinningMiddleware 重置
+_pinned_until: ContextVar[float] = ContextVar("replica_pinned_until", default=0.0)
+# 当前请求是否写过主库
+_wrote: ContextVar[bool] = ContextVar("replica_wrote", default=False)
+
+
+def pin_primary(seconds: float):
+    """接下来seconds秒内的读操作走主库"""
+    _pinned_until.set(max(_pinned_until.get(), time.monotonic() + seconds))
+
+
+def reset_replica_state():
+    _pinned_until.set(0.0)
+    _wrote.set(False)
+
+
+def request_wrote() -> bool:
+    return _wrote.get()
+
+
+class ReplicaRouter:
+    """
+    读写分离
+    * 读操作按权重随机选择健康的只读副本(settings.DATABASE_REPLICAS = {别名: 权重})
+    * 写操作走主库, 写入后REPLICA_STICKY_SECONDS秒内的读操作也走主库(read-your-writes),
+      跨请求的粘滞由 ReplicaPinningMiddleware 通过cookie实现
+    * 副本每REPLICA_HEALTH_CHECK_INTERVAL秒检查一次连接, 不可用时不再选择, 全部不可用时读主库
+    * 日志模型(OPERATION_LOG_MODELS)每个请求都会写入, 不参与读写分离, 也不触发粘滞
+    """
+
+    def __init__(self, replicas: dict[str, int] = None, health_check: Callable[[str], bool] = None):
+        if replicas is None:
+            replicas = {
+                alias: weight
+                for alias, weight in getattr(settings, "DATABASE_REPLICAS", {}).items()
+                if alias in settings.DATABASES
+            }
+        self.replicas = {alias: weight for alias, weight in replicas.items() if weight > 0}
+        self.sticky_seconds = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+        self.check_interval = getattr(settings, "REPLICA_HEALTH_CHECK_INTERVAL", 10)
+        self.health_check = health_check or self._check_connection
+        self.excluded_models = {label.lower() for label in getattr(settings, "OPERATION_LOG_MODELS", [])}
+        # {别名: (是否可用, 检查时间)}
+        self._health: dict[str, tuple[bool, float]] = {}
+        self.logger = logging.getLogger("db_router")
+
+    @staticmethod
+    def _check_connection(alias: str) -> bool:
+        connection = connections[alias]
+        if connection.connection is None:
+            connection.ensure_connection()
+            return True
+        return connection.is_usable()
+
+    def is_healthy(self, alias: str) -> bool:
+        now = time.monotonic()
+        healthy, checked_at = self._health.get(alias, (True, None))
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return healthy
+        try:
+            healthy = bool(self.health_check(alias))
+        except Exception as e:
+            self.logger.warning("只读副本 %s 不可用: %s", alias, e)
+            healthy = False
+        self._health[alias] = (healthy, now)
+        return healthy
+
+    def mark_unhealthy(self, alias: str):
+        """查询副本出错时可以主动标记, 下次检查前不再使用"""
+        self._health[alias] = (False, time.monotonic())
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or model._meta.label_lower in self.excluded_models:
+            return None
+        if time.monotonic() < _pinned_until.get():
+            return DEFAULT_DB_ALIAS
+        healthy = [alias for alias in self.replicas if self.is_healthy(alias)]
+        if not healthy:
+            return DEFAULT_DB_ALIAS
+        return random.choices(healthy, weights=[self.replicas[alias] for alias in healthy])[0]
+
+    def db_for_write(self, model, **hints):
+        if not self.replicas or model._meta.label_lower in self.excluded_models:
+            return None
+        _wrote.set(True)
+        pin_primary(self.sticky_seconds)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not self.replicas:
+            return None
+        databases = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本由数据库复制同步, 不执行迁移
+        if db in self.replicas:
+            return False
+        return None
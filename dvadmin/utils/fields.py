@@ -0,0 +1,51 @@
+"""
+自定义模型字段
+"""
+from django.db import models
+
+from dvadmin.utils.compression import DEFAULT_ZDICT_ID, compress_text, decompress_text
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    压缩存储的文本字段
+    数据库里是二进制列, 读写时自动解压/压缩, 使用方式和TextField一样(不支持文本查询,如icontains)
+    """
+
+    description = "压缩存储的文本"
+
+    def __init__(self, *args, zdict_id: int = DEFAULT_ZDICT_ID, min_length: int = 64, **kwargs):
+        """
+        :param zdict_id: 压缩使用的预置字典编号, 见 dvadmin.utils.compression.ZDICTS
+        :param min_length: 小于该长度的内容不压缩
+        """
+        self.zdict_id = zdict_id
+        self.min_length = min_length
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.zdict_id != DEFAULT_ZDICT_ID:
+            kwargs["zdict_id"] = self.zdict_id
+        if self.min_length != 64:
+            kwargs["min_length"] = self.min_length
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress_text(value)
+        return value
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        if not isinstance(value, str):
+            value = str(value)
+        return compress_text(value, zdict_id=self.zdict_id, min_length=self.min_length)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
@@ -0,0 +1,18 @@
+"""
+密码哈希, 在 settings.PASSWORD_HASHERS 中配置
+"""
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+from dvadmin.utils.tracing import span
+
+
+class TracedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """与 PBKDF2PasswordHasher 相同的算法(pbkdf2_sha256), 已有的密码不受影响, 只增加耗时记录"""
+
+    def encode(self, password, salt, iterations=None):
+        with span("password.hash", algorithm=self.algorithm):
+            return super().encode(password, salt, iterations)
+
+    def verify(self, password, encoded):
+        with span("password.verify", algorithm=self.algorithm):
+            return super().verify(password, encoded)
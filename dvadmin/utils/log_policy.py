@@ -0,0 +1,101 @@
+"""
+API日志记录策略
+在中间件初始化时把配置编译成一个匹配器, 请求时只做几次正则匹配和一次随机数比较
+"""
+import fnmatch
+import random
+import re
+from typing import Callable
+
+# 记录决策
+LOG_ALWAYS = "always"  # 记录
+LOG_ON_ERROR = "on_error"  # 未被采样, 但响应出错时仍然记录
+LOG_COUNT_ONLY = "count_only"  # 未被采样, 不记录日志, 只计入小时汇总
+LOG_SKIP = "skip"  # 不记录, 也不计入汇总(请求方式、路径不匹配)
+
+REGEX_PREFIX = "re:"
+
+
+def _compile_patterns(patterns) -> re.Pattern | None:
+    """
+    把多个路径规则合并成一个正则
+    * "re:^/api/.*$" 以re:开头的是正则
+    * "/api/*" 其他按glob处理
+    :return: 没有规则时返回None
+    """
+    if not patterns:
+        return None
+    sources = []
+    for pattern in patterns:
+        if pattern.startswith(REGEX_PREFIX):
+            sources.append(pattern[len(REGEX_PREFIX):])
+        else:
+            # fnmatch.translate 返回形如 (?s:/api/.*)\Z 的正则
+            sources.append(fnmatch.translate(pattern))
+    return re.compile("|".join(f"(?:{source})" for source in sources))
+
+
+def _normalize_rate(rate) -> float:
+    """采样率限制在[0, 1], True/False 分别当作1和0"""
+    return min(max(float(rate), 0.0), 1.0)
+
+
+class ApiLogPolicy:
+    """
+    编译后的日志策略
+    配置格式(settings.API_LOG_POLICY):
+        {
+            "include": ["/api/*"],            # 只记录匹配的路径, 为空表示全部
+            "exclude": ["re:^/api/schema/"],  # 排除的路径, 优先于include
+            "methods": ["POST", "PUT"],       # 记录的请求方式, 'ALL'表示全部, 默认取API_LOG_METHODS
+            "sample_rates": {"PUT": 0.1},     # 按请求方式采样, 未配置的为1
+            "always_log_on_error": True,      # 未被采样的请求出错时仍然记录
+            "user_overrides": {"admin": 1},   # 按用户账号覆盖采样率, 0表示不记录
+        }
+    """
+
+    def __init__(self, config: dict = None, methods=None, rng: Callable[[], float] = None):
+        config = config or {}
+        methods = config.get("methods", methods)
+        if methods == "ALL":
+            self.methods = None
+        else:
+            if not isinstance(methods, (list, tuple, set, frozenset)):
+                raise TypeError("API_LOG_METHODS 必须是 'ALL' 或可迭代对象（列表、元组或集合）")
+            self.methods = frozenset(method.upper() for method in methods)
+        self.include = _compile_patterns(config.get("include"))
+        self.exclude = _compile_patterns(config.get("exclude"))
+        self.sample_rates = {
+            method.upper(): _normalize_rate(rate)
+            for method, rate in (config.get("sample_rates") or {}).items()
+        }
+        self.always_log_on_error = bool(config.get("always_log_on_error", False))
+        self.user_overrides = {
+            username: _normalize_rate(rate)
+            for username, rate in (config.get("user_overrides") or {}).items()
+        }
+        self.rng = rng or random.random
+
+    def match_method(self, method: str) -> bool:
+        return self.methods is None or method in self.methods
+
+    def match_path(self, path: str) -> bool:
+        if self.exclude is not None and self.exclude.match(path):
+            return False
+        return self.include is None or self.include.match(path) is not None
+
+    def decide(self, method: str, path: str, get_username: Callable[[], str | None] = None) -> str:
+        """
+        决定一个请求是否记录日志
+        采样只影响是否写入明细日志, 请求方式、路径匹配的请求都计入小时汇总, 汇总的请求数和错误率不受采样率影响
+        :param get_username: 返回当前用户账号的函数, 只有配置了user_overrides才会调用
+        :return: LOG_ALWAYS / LOG_ON_ERROR / LOG_COUNT_ONLY / LOG_SKIP
+        """
+        if not self.match_method(method) or not self.match_path(path):
+            return LOG_SKIP
+        rate = self.sample_rates.get(method, 1.0)
+        if self.user_overrides and get_username is not None:
+            rate = self.user_overrides.get(get_username(), rate)
+        if rate >= 1.0 or (rate > 0.0 and self.rng() < rate):
+            return LOG_ALWAYS
+        return LOG_ON_ERROR if self.always_log_on_error else LOG_COUNT_ONLY
@@ -0,0 +1,193 @@
+"""
+操作日志按小时汇总(OperationLogRollup)
+* record: 请求结束后计数, 由日志写入方(ApiLoggingMiddleware)调用;
+  未被采样(不写明细日志)的请求也会计数, 汇总反映全部请求.
+  计数先累加在进程内, 每 OPERATION_LOG_ROLLUP_FLUSH_SIZE 个请求或 OPERATION_LOG_ROLLUP_FLUSH_INTERVAL 秒
+  合并写入一次(每个汇总行一条UPDATE), 请求不再逐个更新同一行, 汇总数据最多延迟一个间隔
+* rebuild: 从历史日志分批重建, 供 manage.py rebuild_operation_log_rollup 调用;
+  只能统计写入了的明细日志, 配置了采样率时重建结果小于增量累加的结果
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncHour
+
+DIMENSIONS = ("request_modular", "request_path", "request_method", "status", "response_code")
+
+logger = logging.getLogger("log_rollup")
+
+
+def truncate_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _dimensions(values: dict) -> dict:
+    return {
+        "request_modular": values.get("request_modular") or "",
+        "request_path": values.get("request_path") or "",
+        "request_method": values.get("request_method") or "",
+        "status": bool(values.get("status")),
+        "response_code": str(values.get("response_code") or ""),
+    }
+
+
+class RollupBuffer:
+    """进程内的汇总计数, (hour, *维度) -> 请求数"""
+
+    def __init__(self, flush_size: int = 500, flush_interval: float = 10):
+        """
+        :param flush_size: 累计多少个请求写入一次
+        :param flush_interval: 距上次写入超过多少秒时写入
+        """
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.counts = Counter()
+        self.pending = 0
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, key: tuple, count: int = 1):
+        with self.lock:
+            self.counts[key] += count
+            self.pending += count
+            due = self.pending >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            # 在请求线程中执行, 其他线程正在写时直接跳过
+            self.flush(blocking=False)
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+            self.pending = 0
+
+    def flush(self, blocking: bool = True) -> int:
+        """
+        把累计的计数写入数据库, 写入失败时放回缓冲区, 下次再写
+        :return: 写入的汇总行数
+        """
+        if not self._flush_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            with self.lock:
+                counts, self.counts = self.counts, Counter()
+                self.pending = 0
+                self._last_flush = time.monotonic()
+            if not counts:
+                return 0
+            try:
+                _write(counts)
+            except DatabaseError:
+                logger.warning("写入操作日志汇总失败, %s 行稍后重试", len(counts), exc_info=True)
+                with self.lock:
+                    self.counts.update(counts)
+                    self.pending += sum(counts.values())
+                return 0
+            return len(counts)
+        finally:
+            self._flush_lock.release()
+
+
+def _write(counts: Counter):
+    """每个汇总行先UPDATE累加, 不存在再INSERT, 并发插入冲突时重试UPDATE"""
+    from dvadmin.system.models import OperationLogRollup
+
+    using = router.db_for_write(OperationLogRollup)
+    manager = OperationLogRollup.objects.using(using)
+    with transaction.atomic(using=using):
+        for key, count in counts.items():
+            values = {"hour": key[0], **dict(zip(DIMENSIONS, key[1:]))}
+            rollups = manager.filter(**values)
+            if rollups.update(count=F("count") + count):
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    manager.create(count=count, **values)
+            except IntegrityError:
+                rollups.update(count=F("count") + count)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> RollupBuffer:
+    """当前进程的汇总缓冲区, 第一次使用时按settings创建"""
+    global _buffer
+    if _buffer is None:
+        from django.conf import settings
+
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = RollupBuffer(
+                    getattr(settings, "OPERATION_LOG_ROLLUP_FLUSH_SIZE", 500),
+                    getattr(settings, "OPERATION_LOG_ROLLUP_FLUSH_INTERVAL", 10),
+                )
+                # 进程退出前写入剩余的计数
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def record(log):
+    """
+    日志计数+1, 先累加在进程内, 见 RollupBuffer
+    :param log: 操作日志, 未被采样的请求传入未保存的OperationLog
+    """
+    if log.create_datetime is None:
+        return
+    dimensions = _dimensions({name: getattr(log, name) for name in DIMENSIONS})
+    get_buffer().add((truncate_hour(log.create_datetime), *dimensions.values()))
+
+
+def flush() -> int:
+    """立即写入进程内累计的计数, 如测试或需要最新数据时调用"""
+    return get_buffer().flush()
+
+
+def rebuild(start: datetime, end: datetime, chunk_size: int = 10000, on_chunk=None) -> int:
+    """
+    从操作日志重建[start, end)小时范围内的汇总
+    按主键范围分批聚合, 每批只 GROUP BY 一个主键区间, 合并后整体替换
+    :param on_chunk: 每批完成后的回调 on_chunk(start_id, end_id)
+    :return: 写入的汇总行数
+    """
+    from dvadmin.system.models import OperationLog, OperationLogRollup
+
+    start, end = truncate_hour(start), truncate_hour(end)
+    logs = OperationLog._base_manager.filter(create_datetime__gte=start, create_datetime__lt=end)
+    first = logs.order_by("id").values_list("id", flat=True).first()
+    last = logs.order_by("-create_datetime", "-id").values_list("id", flat=True).first()
+
+    counter = Counter()
+    if first is not None:
+        chunk_start = first
+        while chunk_start <= last:
+            chunk_end = chunk_start + chunk_size
+            rows = (
+                logs.filter(id__gte=chunk_start, id__lt=chunk_end)
+                .annotate(hour=TruncHour("create_datetime"))
+                .values("hour", *DIMENSIONS)
+                .annotate(total=Count("id"))
+                .order_by()
+            )
+            for row in rows:
+                dimensions = _dimensions(row)
+                counter[(row["hour"], *dimensions.values())] += row["total"]
+            if on_chunk:
+                on_chunk(chunk_start, chunk_end)
+            chunk_start = chunk_end
+
+    objs = [
+        OperationLogRollup(hour=key[0], count=count, **dict(zip(DIMENSIONS, key[1:])))
+        for key, count in counter.items()
+    ]
+    with transaction.atomic(using=router.db_for_write(OperationLogRollup)):
+        OperationLogRollup.objects.filter(hour__gte=start, hour__lt=end).delete()
+        OperationLogRollup.objects.bulk_create(objs, batch_size=1000)
+    return len(objs)
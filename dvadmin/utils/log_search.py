@@ -0,0 +1,122 @@
+"""
+操作日志全文检索
+根据数据库引擎(config.env 中的 ENGINE)选择实现, 索引表由迁移0006、0010创建:
+    * sqlite: FTS5 虚拟表, rowid 即日志id, trigram分词(SQLite 3.34+), 可检索中文等任意子串;
+      少于3个字符的词无法用trigram索引, 对索引表做LIKE查询
+    * postgresql: 单独的 tsvector 表 + GIN 索引, 'simple' 配置把连续的中文当作一个词,
+      检索词包含中文时同时对请求地址、操作说明做 icontains 查询
+    * 其他数据库: 不建索引, 退化为 icontains 查询
+request_body 压缩存储后无法直接检索, 索引表里保存的是解压后的文本
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from dvadmin.utils.models import table_prefix
+
+FTS_TABLE = table_prefix + "system_operation_log_fts"
+SUPPORTED_VENDORS = ("sqlite", "postgresql")
+TRIGRAM_MIN_LENGTH = 3
+FTS_COLUMNS = ("request_path", "request_body", "request_msg")
+LIKE_CONDITION = "(%s)" % " OR ".join(f"{column} LIKE %s ESCAPE '\\'" for column in FTS_COLUMNS)
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+
+def _get_connection(using: str = None):
+    from dvadmin.system.models import OperationLog
+
+    return connections[using or router.db_for_write(OperationLog)]
+
+
+def index_logs(logs, using: str = None):
+    """
+    写入或更新日志的索引, 由日志写入方(ApiLoggingMiddleware)在日志保存后调用
+    :param logs: OperationLog 列表
+    :param using: 数据库别名, 默认为OperationLog写入的数据库
+    """
+    connection = _get_connection(using)
+    if connection.vendor not in SUPPORTED_VENDORS or not logs:
+        return
+    rows = [
+        (log.id, log.request_path or "", log.request_body or "", log.request_msg or "")
+        for log in logs
+    ]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, request_path, request_body, request_msg) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (log_id, document) "
+                f"VALUES (%s, to_tsvector('simple', concat_ws(' ', %s, %s, %s))) "
+                f"ON CONFLICT (log_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+
+def delete_logs(log_ids, using: str = None):
+    """删除日志的索引, 清理日志时调用"""
+    connection = _get_connection(using)
+    if connection.vendor not in SUPPORTED_VENDORS or not log_ids:
+        return
+    column = "rowid" if connection.vendor == "sqlite" else "log_id"
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE {column} = %s", [(log_id,) for log_id in log_ids])
+
+
+def _fts5_query(terms: list[str]) -> str:
+    """每个词用双引号包起来, 避免用户输入被当成FTS5语法, 多个词之间为AND"""
+    return " ".join('"%s"' % term.replace('"', '""') for term in terms)
+
+
+def _like_pattern(term: str) -> str:
+    return "%%%s%%" % term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _uses_trigram(connection) -> bool:
+    """SQLite低于3.34时迁移0010保留unicode61分词, 按表结构判断"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and "trigram" in row[0]
+
+
+def _sqlite_filter(connection, text: str) -> Q:
+    terms = text.split()
+    if not _uses_trigram(connection):
+        return Q(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts5_query(terms)]))
+    conditions, params = [], []
+    long_terms = [term for term in terms if len(term) >= TRIGRAM_MIN_LENGTH]
+    if long_terms:
+        conditions.append(f"{FTS_TABLE} MATCH %s")
+        params.append(_fts5_query(long_terms))
+    for term in terms:
+        if len(term) < TRIGRAM_MIN_LENGTH:
+            # trigram对少于3个字符的词不能用索引, LIKE会扫描索引表
+            conditions.append(LIKE_CONDITION)
+            params.extend([_like_pattern(term)] * len(FTS_COLUMNS))
+    return Q(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {' AND '.join(conditions)}", params))
+
+
+def search_filter(text: str) -> Q:
+    """
+    返回用于 OperationLog.objects.filter() 的检索条件, 检索请求地址、请求参数和操作说明
+    """
+    connection = _get_connection()
+    if connection.vendor == "sqlite":
+        return _sqlite_filter(connection, text)
+    if connection.vendor == "postgresql":
+        condition = Q(
+            id__in=RawSQL(
+                f"SELECT log_id FROM {FTS_TABLE} WHERE document @@ plainto_tsquery('simple', %s)", [text]
+            )
+        )
+        if CJK_RE.search(text):
+            condition |= Q(request_path__icontains=text) | Q(request_msg__icontains=text)
+        return condition
+    return Q(request_path__icontains=text) | Q(request_msg__icontains=text)
@@ -0,0 +1,153 @@
+"""
+基于 tracemalloc 的内存分析
+start() 后以第一次快照为基准, 之后每隔一段时间(或手动)拍快照, 报告最新快照相对基准增长最多的分配位置, 按模块汇总
+报告可以写成JSON文件, 用 compare_reports 比较两个版本
+由 /api/system/memory_profile/ (只在处理请求的worker中生效) 和 manage.py memory_profile 使用
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+
+def module_name(filename: str) -> str:
+    """文件路径转为模块名, 如 .../site-packages/django/db/models/query.py -> django.db.models.query"""
+    path = os.path.abspath(filename)
+    best = ""
+    for entry in sys.path:
+        entry = os.path.abspath(entry or os.curdir)
+        if path.startswith(entry + os.sep) and len(entry) > len(best):
+            best = entry
+    if best:
+        path = path[len(best) + 1:]
+    path = os.path.splitext(path)[0]
+    if path.endswith("__init__"):
+        path = path[: -len("__init__")].rstrip(os.sep)
+    return path.replace(os.sep, ".") or filename
+
+
+class MemoryProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.baseline = None
+        self.latest = None
+        self.started_at = None
+        # 每次快照的 (时间, 当前内存, 峰值内存)
+        self.history: list[tuple[float, int, int]] = []
+        self.started_by_us = False
+
+    @property
+    def running(self) -> bool:
+        return self.baseline is not None
+
+    def start(self, frames: int = 10, interval: float = None):
+        """
+        开始追踪并拍基准快照
+        :param frames: 每个分配记录的调用栈深度, 越大开销越高
+        :param interval: 自动拍快照的间隔(秒), 为空时只在调用snapshot()时拍
+        """
+        with self._lock:
+            if self.running:
+                return
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self.started_by_us = True
+            self.started_at = time.time()
+            self.history = []
+            self.baseline = self.latest = self._take()
+        if interval:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, args=(interval,), name="memory-profiler", daemon=True)
+            self._thread.start()
+
+    def _loop(self, interval: float):
+        while not self._stop_event.wait(interval):
+            self.snapshot()
+
+    def _take(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+        current, peak = tracemalloc.get_traced_memory()
+        self.history.append((time.time(), current, peak))
+        return snapshot
+
+    def snapshot(self):
+        with self._lock:
+            if self.running:
+                self.latest = self._take()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            if self.started_by_us:
+                tracemalloc.stop()
+            self.baseline = self.latest = None
+            self.started_by_us = False
+
+    def report(self, limit: int = 30) -> dict:
+        """最新快照相对基准的增长, 按模块汇总, 另附增长最多的代码行"""
+        with self._lock:
+            if not self.running:
+                return {"running": False}
+            baseline, latest, history = self.baseline, self.latest, list(self.history)
+        stats = latest.compare_to(baseline, "lineno")
+        modules = defaultdict(lambda: {"size": 0, "size_diff": 0, "count": 0, "count_diff": 0})
+        for stat in stats:
+            module = modules[module_name(stat.traceback[0].filename)]
+            module["size"] += stat.size
+            module["size_diff"] += stat.size_diff
+            module["count"] += stat.count
+            module["count_diff"] += stat.count_diff
+        top_modules = sorted(modules.items(), key=lambda item: item[1]["size_diff"], reverse=True)[:limit]
+        return {
+            "running": True,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "snapshots": [
+                {"time": taken_at, "traced_bytes": current, "peak_bytes": peak}
+                for taken_at, current, peak in history
+            ],
+            "modules": [{"module": name, **values} for name, values in top_modules],
+            "lines": [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+
+def write_report(report: dict, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def compare_reports(old: dict, new: dict) -> list[dict]:
+    """比较两个版本的报告中各模块的增长量, 按变化量倒序"""
+    old_sizes = {item["module"]: item["size_diff"] for item in old.get("modules", [])}
+    new_sizes = {item["module"]: item["size_diff"] for item in new.get("modules", [])}
+    rows = [
+        {
+            "module": module,
+            "old_size_diff": old_sizes.get(module, 0),
+            "new_size_diff": new_sizes.get(module, 0),
+            "change": new_sizes.get(module, 0) - old_sizes.get(module, 0),
+        }
+        for module in old_sizes.keys() | new_sizes.keys()
+    ]
+    return sorted(rows, key=lambda row: abs(row["change"]), reverse=True)
+
+
+memory_profiler = MemoryProfiler()
@@ -0,0 +1,199 @@
+"""
+进程内请求指标, 由 MetricsMiddleware 采集, /metrics 以Prometheus文本格式输出
+* 按路由(URL pattern, 不是实际路径)统计请求数、状态码分类、耗时直方图、SQL查询数直方图
+* 直方图的桶在启动时固定, 每次请求只做一次二分查找和计数
+* 配置 METRICS_DIR 后每个进程定期把计数写到该目录下的 metrics_<pid>.json,
+  /metrics 合并目录下所有文件, 得到gunicorn所有worker的汇总; 部署启动前应清空该目录
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+# 耗时桶(秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SQL查询数桶
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger("metrics")
+
+
+class Histogram:
+    """非累加的桶计数, 最后一个桶为+Inf, 输出时再累加"""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self, size: int, counts=None, total: float = 0):
+        self.counts = list(counts) if counts else [0] * (size + 1)
+        self.total = total
+
+    def observe(self, buckets, value):
+        self.counts[bisect_left(buckets, value)] += 1
+        self.total += value
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+
+
+class MetricsRegistry:
+    def __init__(self, directory: str = None, flush_interval: float = 5):
+        """
+        :param directory: 多进程共享目录, 为空时只统计当前进程
+        :param flush_interval: 写共享目录的最小间隔(秒)
+        """
+        self.directory = str(directory) if directory else None
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        # 同一时间只有一个线程写文件
+        self._flush_lock = threading.Lock()
+        # (route, method, status_class) -> 请求数
+        self.requests: dict[tuple, int] = {}
+        # (route, method) -> Histogram
+        self.latency: dict[tuple, Histogram] = {}
+        self.queries: dict[tuple, Histogram] = {}
+        self._last_flush = time.monotonic()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"metrics_{os.getpid()}.json")
+
+    def observe(self, route: str, method: str, status: int, duration: float, queries: int):
+        key = (route, method)
+        status_key = (route, method, f"{status // 100}xx")
+        with self.lock:
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            latency = self.latency.get(key)
+            if latency is None:
+                latency = self.latency[key] = Histogram(len(LATENCY_BUCKETS))
+                self.queries[key] = Histogram(len(QUERY_BUCKETS))
+            latency.observe(LATENCY_BUCKETS, duration)
+            self.queries[key].observe(QUERY_BUCKETS, queries)
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            # 在请求线程中执行, 其他线程正在写时直接跳过, 不等待
+            self.flush(blocking=False)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "latency": [[*key, h.counts, h.total] for key, h in self.latency.items()],
+                "queries": [[*key, h.counts, h.total] for key, h in self.queries.items()],
+            }
+
+    def flush(self, blocking: bool = True):
+        """
+        先写临时文件再重命名, 读取方不会读到写了一半的文件
+        写入失败(磁盘满、目录被删除等)只记录日志, 不影响请求
+        :param blocking: 其他线程正在写时是否等待
+        """
+        if not self.directory:
+            return
+        if not self._flush_lock.acquire(blocking=blocking):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            # 临时文件名唯一, 以".tmp"结尾不会被当作指标文件读取
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f"metrics_{os.getpid()}_", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self.snapshot(), f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            logger.warning("写入指标文件失败: %s", self.directory, exc_info=True)
+        finally:
+            self._flush_lock.release()
+
+    def _load_snapshots(self) -> list[dict]:
+        snapshots = [self.snapshot()]
+        if not self.directory:
+            return snapshots
+        own = os.path.basename(self.path)
+        for name in os.listdir(self.directory):
+            if not name.startswith("metrics_") or not name.endswith(".json") or name == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def collect(self):
+        """合并所有进程的计数, 返回 (requests, latency, queries)"""
+        requests, latency, queries = {}, {}, {}
+        for snapshot in self._load_snapshots():
+            for route, method, status_class, count in snapshot["requests"]:
+                key = (route, method, status_class)
+                requests[key] = requests.get(key, 0) + count
+            for target, size, rows in (
+                (latency, len(LATENCY_BUCKETS), snapshot["latency"]),
+                (queries, len(QUERY_BUCKETS), snapshot["queries"]),
+            ):
+                for route, method, counts, total in rows:
+                    target.setdefault((route, method), Histogram(size)).merge(Histogram(size, counts, total))
+        return requests, latency, queries
+
+    def render(self) -> str:
+        """Prometheus text format 0.0.4"""
+        requests, latency, queries = self.collect()
+        lines = [
+            "# HELP http_requests_total Total HTTP requests by route, method and status class.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (route, method, status_class), count in sorted(requests.items()):
+            labels = _labels(route=route, method=method, status=status_class)
+            lines.append(f"http_requests_total{{{labels}}} {count}")
+        for name, help_text, buckets, histograms in (
+            ("http_request_duration_seconds", "HTTP request latency in seconds.", LATENCY_BUCKETS, latency),
+            ("http_request_db_queries", "Database queries per HTTP request.", QUERY_BUCKETS, queries),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (route, method), histogram in sorted(histograms.items()):
+                labels = _labels(route=route, method=method)
+                cumulative = 0
+                for le, count in zip((*buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels) -> str:
+    return ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    """当前进程的指标, 在第一次使用时按settings创建(gunicorn fork之后, 保证pid正确)"""
+    global _registry
+    if _registry is None:
+        from django.conf import settings
+
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry(
+                    getattr(settings, "METRICS_DIR", None),
+                    getattr(settings, "METRICS_FLUSH_INTERVAL", 5),
+                )
+                # 进程退出前写入最后一次计数
+                atexit.register(_registry.flush)
+    return _registry
@@ -1,16 +1,31 @@
 """
 日志 django中间件
 """
+import cProfile
+import hmac
 import json
 import logging
+import random
+import time
+from contextlib import ExitStack
+from datetime import datetime
 from typing import Callable
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.http import HttpResponse, HttpResponseServerError
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound, JsonResponse
 from rest_framework.request import Request
 
 from dvadmin.system.models import OperationLog
+from dvadmin.utils import log_rollup, log_search, runtime_stats
+from dvadmin.utils.db_router import pin_primary, request_wrote, reset_replica_state
+from dvadmin.utils.log_policy import ApiLogPolicy, LOG_ALWAYS, LOG_COUNT_ONLY, LOG_ON_ERROR, LOG_SKIP
+from dvadmin.utils.metrics import get_registry
+from dvadmin.utils.profiling import save_profile
+from dvadmin.utils.query_profiler import QueryProfile
+from dvadmin.utils.readiness import get_checker
+from dvadmin.utils.tracing import NOOP_SPAN, span, start_trace
 from dvadmin.utils.request_util import (
     get_request_ip,
     get_request_data,
@@ -19,6 +34,7 @@ from dvadmin.utils.request_util import (
     get_request_user,
     get_os,
     get_browser,
+    truncate_text,
 )
 
 
@@ -36,6 +52,13 @@ class ApiLoggingMiddleware:
         # 那么 getattr 会返回那个假值而不是默认的空集合
         # 此时or后面就成立，返回set()
         self.methods = getattr(settings, "API_LOG_METHODS", set()) or set()
+        # 路径规则、采样率等在这里编译一次, 请求时直接匹配
+        self.policy = ApiLogPolicy(getattr(settings, "API_LOG_POLICY", None), methods=self.methods)
+        # 请求参数、返回信息的最大记录长度, 超出部分截断
+        self.max_body_length = getattr(settings, "API_LOG_MAX_BODY_LENGTH", 4096)
+        # 超过该大小的响应不再解析, 避免大文件导出时整个读入内存
+        self.max_response_length = getattr(settings, "API_LOG_MAX_RESPONSE_LENGTH", 65536)
+
     def __call__(self, request):
         """
         标准中间件入口（替代 process_request/process_response）
@@ -44,54 +67,62 @@ class ApiLoggingMiddleware:
         """
 
         # 1. 请求处理前（原 process_request）
-        self._handle_request(request)
-        # 2. 视图处理前（原 process_view）
-        self._handle_view(request)
-        # 3. 调用后续中间件和视图
+        with span("api_log.request"):
+            self._handle_request(request)
+        # 2. 调用后续中间件和视图, 视图处理前会调用 process_view
         response = self.get_response(request)
-        # 4. 响应处理后（原 process_response）
-        self._handle_response(request, response)
+        # 3. 响应处理后（原 process_response）
+        with span("api_log.response"):
+            self._handle_response(request, response)
         return response
 
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+        URL解析完成后、视图执行前由Django调用, 此时 request.resolver_match 已经有值
+        返回None表示继续执行视图
+        """
+        with span("api_log.view"):
+            self._handle_view(request)
+        return None
+
     def _handle_request(self,request):
-        """处理请求前的初始化"""
+        """处理请求前的初始化, 请求参数等确定要记录日志时才读取"""
         request.request_ip = get_request_ip(request)
-        request.request_data = get_request_data(request)
         request.request_path = get_request_path(request)
 
     def _handle_view(self, request:Request):
         """视图处理前的逻辑（原 process_view）"""
-        # 如果API_LOG_ENABLE=False或者request请求不在self.methods列表里就不记录日志，返回
+        # 如果API_LOG_ENABLE=False就不记录日志，返回
         if not self.enable:
             return
-
-        # 确保 methods 是可迭代对象并且不是 'ALL'
-        if self.methods != 'ALL':
-            if not isinstance(self.methods, (list, tuple, set)):
-                raise TypeError("self.methods 必须是一个可迭代对象（列表、元组或集合）")
-            if request.method not in self.methods:
-                return
-        #在 Django 中，当一个请求到达时，URL 调度器会根据 URL 模式找到对应的视图函数，这个匹配结果就存储在 request.resolver_match 中
-        #定义: queryset 是一个包含模型实例集合的属性，通常用于指定视图操作的数据源
-        #检查这个视图函数是否属于基于类的视图 and 检查视图函数是否包含 queryset 属性
-        resolver_match = getattr(request, 'resolver_match', None)
-        if not resolver_match:
+        # 不能用 not queryset 判断, 会执行查询
+        queryset = self._get_view_queryset(request)
+        if queryset is None:
             return
 
-        view_func = getattr(resolver_match, 'func', None)
-        if not view_func:
+        # 按日志策略决定是否记录(请求方式、路径规则、采样率、用户覆盖)
+        decision = self.policy.decide(
+            request.method,
+            request.path,
+            lambda: getattr(get_request_user(request), "username", None),
+        )
+        request.api_log_decision = decision
+        if decision == LOG_SKIP:
             return
 
-        view_cls = getattr(view_func, 'cls', None)
-        if not view_cls:
+        modular_name = get_verbose_name(queryset)
+        if decision == LOG_COUNT_ONLY:
+            # 只计入小时汇总, 不读取请求参数
+            request.api_log_modular = modular_name
             return
-
-        queryset = getattr(view_cls, 'queryset', None)
-        if not queryset:
+        # 只有需要记录的请求才读取请求参数, 且必须在视图读取请求体之前
+        request.request_data = get_request_data(request, self.max_body_length)
+        if decision == LOG_ON_ERROR:
+            # 未被采样的请求先不写库, 响应出错时再记录
+            request.api_log_modular = modular_name
             return
 
         try:
-            modular_name = get_verbose_name(queryset)
             log = OperationLog(request_modular=modular_name)
             log.save()
             request.request_data['log_id'] = log.id
@@ -100,32 +131,63 @@ class ApiLoggingMiddleware:
             # print(f"[OperationLog] 日志保存失败: {e}")
             raise e
 
+    @staticmethod
+    def _get_view_queryset(request):
+        """
+        在 Django 中，当一个请求到达时，URL 调度器会根据 URL 模式找到对应的视图函数，这个匹配结果就存储在 request.resolver_match 中
+        定义: queryset 是一个包含模型实例集合的属性，通常用于指定视图操作的数据源
+        检查这个视图函数是否属于基于类的视图 and 检查视图函数是否包含 queryset 属性
+        """
+        resolver_match = getattr(request, 'resolver_match', None)
+        if not resolver_match:
+            return None
+
+        view_func = getattr(resolver_match, 'func', None)
+        if not view_func:
+            return None
+
+        view_cls = getattr(view_func, 'cls', None)
+        if not view_cls:
+            return None
+
+        return getattr(view_cls, 'queryset', None)
+
     def _handle_response(self, request, response):
         """响应处理后的日志记录（原 process_response）"""
-        # 如果API_LOG_ENABLE=False或者request请求不在self.methods列表里就不记录日志，返回
-        if not self.enable or (self.methods != 'ALL' and request.method not in self.methods):
+        # 如果API_LOG_ENABLE=False或者日志策略决定不记录，返回
+        decision = getattr(request, "api_log_decision", LOG_SKIP)
+        if not self.enable or decision == LOG_SKIP:
             return
 
-        if 'log_id' not in request.request_data:
+        # 提取
+        log_id = request.request_data.pop('log_id', None) if decision == LOG_ALWAYS else None
+        if decision == LOG_ALWAYS and log_id is None:
             return
 
-        # 提取
-        log_id = request.request_data.pop('log_id')
+        # 解析响应数据
+        response_data = self._get_response_data(response)
+
+        # 未被采样的请求只在出错时记录; 文件下载、流式等没有code的响应按HTTP状态码判断
+        is_success = response.status_code < 400 and response_data.get("code", 2000) == 2000
+        if decision == LOG_COUNT_ONLY or (decision == LOG_ON_ERROR and is_success):
+            # 不写明细日志, 但仍计入小时汇总, 汇总的请求数、错误率不受采样影响
+            log_rollup.record(
+                OperationLog(
+                    request_modular=getattr(request, "api_log_modular", None)
+                    or settings.API_MODEL_MAP.get(request.request_path),
+                    request_path=request.request_path,
+                    request_method=request.method,
+                    status=is_success,
+                    response_code=response_data.get("code"),
+                    create_datetime=datetime.now(),
+                )
+            )
+            return
         # 覆盖敏感信息
         body = getattr(request,'request_data',{})
         if isinstance(body,dict) and 'password' in body:
             body['password'] = '*' * 8
 
-        # 解析响应数据
-        response_data = {}
-        if hasattr(response,'data') and isinstance(response.data, dict):
-            response_data = response.data
-        elif response.content:
-            try:
-                response_data = json.loads(response.content.decode())
-            except (TypeError, json.JSONDecodeError):
-                pass
-
         # 构建日志数据
         user = get_request_user(request)
         info = {
@@ -134,31 +196,274 @@ class ApiLoggingMiddleware:
             "dept_belong_id": getattr(request, "dept_belong_id", None),
             "request_method": request.method,
             "request_path": request.request_path,
-            "request_body": request.body,
+            "request_body": truncate_text(
+                json.dumps(body, ensure_ascii=False, default=str), self.max_body_length
+            ),
             "response_code": response_data.get("code"),
             "request_os": get_os(request),
             "request_browser": get_browser(request),
             "request_msg": request.session.get("request_msg"),
-            "status": response_data.get("code") == 2000,
-            "json_result": {
-                "code": response_data.get("code"),
-                "msg": response_data.get("msg"),
-            },
+            "status": is_success,
+            "json_result": json.dumps(
+                {
+                    "code": response_data.get("code"),
+                    "msg": truncate_text(response_data.get("msg"), self.max_body_length),
+                },
+                ensure_ascii=False,
+                default=str,
+            ),
         }
         # 保存操作日志
-        operation_log, _ = OperationLog.objects.update_or_create(defaults=info, id=log_id)
+        if log_id is None:
+            info["request_modular"] = getattr(request, "api_log_modular", None)
+            operation_log = OperationLog.objects.create(**info)
+        else:
+            operation_log, _ = OperationLog.objects.update_or_create(defaults=info, id=log_id)
         if not operation_log.request_modular and settings.API_MODEL_MAP.get(request.request_path):
             operation_log.request_modular = settings.API_MODEL_MAP.get(request.request_path)
         operation_log.save()
+        # 增量维护全文检索索引和小时汇总
+        log_search.index_logs([operation_log])
+        log_rollup.record(operation_log)
+
+    def _get_response_data(self, response) -> dict:
+        """
+        获取响应数据, 只解析JSON响应
+        * DRF的Response直接使用response.data, 不需要再反序列化
+        * StreamingHttpResponse 不读取内容, 避免把整个流读入内存
+        * 超过max_response_length的响应不解析
+        """
+        data = getattr(response, "data", None)
+        if isinstance(data, dict):
+            return data
+        if getattr(response, "streaming", False):
+            return {}
+        if "json" not in response.get("Content-Type", ""):
+            return {}
+        content = response.content
+        if not content or len(content) > self.max_response_length:
+            return {}
+        try:
+            data = json.loads(content.decode())
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+class TracingMiddleware:
+    """
+    链路追踪, 见 dvadmin.utils.tracing, 应放在中间件列表的第一个
+    请求带有 traceparent 头时继承上游的trace, 被追踪的请求每条SQL记录一个span,
+    响应头 traceresponse 返回本次请求的trace id
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        root = start_trace(
+            f"{request.method} {request.path}",
+            request.META.get("HTTP_TRACEPARENT"),
+            **{"http.method": request.method, "http.target": request.path},
+        )
+        if root is NOOP_SPAN:
+            return self.get_response(request)
+        with root:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self._trace_query))
+                response = self.get_response(request)
+            match = getattr(request, "resolver_match", None)
+            if match:
+                root.name = f"{request.method} {match.route}"
+                root.set_attribute("http.route", str(match.route))
+            root.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                root.error = f"HTTP {response.status_code}"
+        response["traceresponse"] = root.traceparent
+        return response
+
+    @staticmethod
+    def _trace_query(execute, sql, params, many, context):
+        connection = context["connection"]
+        with span("db.query", **{"db.system": connection.vendor, "db.name": connection.alias, "db.statement": sql[:1000]}):
+            return execute(sql, params, many, context)
+
+
+class ReplicaPinningMiddleware:
+    """
+    读写分离的read-your-writes, 配合 dvadmin.utils.db_router.ReplicaRouter 使用
+    请求写过主库时下发cookie, 有效期内同一客户端的后续请求都读主库, 避免读到复制延迟前的旧数据
+    """
+
+    cookie_name = "replica_pin"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+    def __call__(self, request):
+        reset_replica_state()
+        try:
+            pinned_until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            pinned_until = 0
+        remaining = pinned_until - time.time()
+        if remaining > 0:
+            pin_primary(min(remaining, self.sticky_seconds))
+        response = self.get_response(request)
+        if request_wrote():
+            response.set_cookie(
+                self.cookie_name,
+                str(time.time() + self.sticky_seconds),
+                max_age=self.sticky_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        reset_replica_state()
+        return response
+
+
+class MetricsMiddleware:
+    """
+    请求指标采集, 见 dvadmin.utils.metrics
+    GET /metrics 输出Prometheus文本格式, 只允许 METRICS_ALLOWED_IPS 中的地址访问(未配置时只允许本机, 为空时不限制)
+    """
+
+    metrics_path = "/metrics"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+
+    def __call__(self, request):
+        if request.path == self.metrics_path and request.method == "GET":
+            return self.render(request)
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        # 按路由统计, 未匹配的路径统一计入一项, 避免扫描类请求撑大指标
+        match = getattr(request, "resolver_match", None)
+        route = str(match.route) if match else "<unmatched>"
+        get_registry().observe(route, request.method, response.status_code, duration, queries)
+        return response
+
+    def render(self, request):
+        if self.allowed_ips and request.META.get("REMOTE_ADDR") not in self.allowed_ips:
+            return HttpResponseForbidden()
+        return HttpResponse(get_registry().render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class QueryProfilingMiddleware:
+    """
+    按 SQL_PROFILE_SAMPLE_RATE 采样分析请求中的SQL, 见 dvadmin.utils.query_profiler
+    结果写入 Server-Timing 响应头和 sql_profile 日志(extra["sql_profile"]为结构化数据), 发现N+1时为warning
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "SQL_PROFILE_SAMPLE_RATE", 0)
+        self.threshold = getattr(settings, "SQL_PROFILE_N_PLUS_ONE_THRESHOLD", 5)
+        self.logger = logging.getLogger("sql_profile")
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+        profile = QueryProfile(self.threshold)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        server_timing = f"{profile.server_timing()}, total;dur={total * 1000:.2f}"
+        if response.has_header("Server-Timing"):
+            server_timing = f"{response['Server-Timing']}, {server_timing}"
+        response["Server-Timing"] = server_timing
+
+        match = getattr(request, "resolver_match", None)
+        repeated = profile.repeated()
+        data = {
+            "method": request.method,
+            "path": request.path,
+            "route": str(match.route) if match else None,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 2),
+            "queries": profile.count,
+            "db_duration_ms": round(profile.duration * 1000, 2),
+            "repeated": repeated,
+        }
+        self.logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps(data, ensure_ascii=False),
+            extra={"sql_profile": data},
+        )
+        return response
+
+
+class SlowRequestProfilingMiddleware:
+    """
+    按 SLOW_REQUEST_PROFILE_SAMPLE_RATE 采样用cProfile分析请求,
+    耗时超过 SLOW_REQUEST_PROFILE_THRESHOLD_MS 时保存到 SLOW_REQUEST_PROFILE_DIR, 最多保留 SLOW_REQUEST_PROFILE_MAX_FILES 个
+    用 manage.py profile_summary 汇总
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "SLOW_REQUEST_PROFILE_SAMPLE_RATE", 0)
+        self.threshold = getattr(settings, "SLOW_REQUEST_PROFILE_THRESHOLD_MS", 1000) / 1000
+        self.directory = getattr(settings, "SLOW_REQUEST_PROFILE_DIR", None)
+        self.max_files = getattr(settings, "SLOW_REQUEST_PROFILE_MAX_FILES", 50)
+        self.logger = logging.getLogger("slow_request")
+
+    def __call__(self, request):
+        if not self.directory or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # 同一线程已有其他profiler在运行
+            return self.get_response(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - start
+        if duration >= self.threshold:
+            match = getattr(request, "resolver_match", None)
+            route = str(match.route) if match else "unmatched"
+            try:
+                path = save_profile(profiler, self.directory, route, request.method, duration, self.max_files)
+                self.logger.warning("慢请求 %s %s 耗时 %.0fms, profile: %s", request.method, request.path, duration * 1000, path)
+            except OSError as e:
+                self.logger.exception(e)
+        return response
+
 
 #copy过来的
 class HealthCheckMiddleware:
     """
-    存活检查中间件（已使用标准 __call__）
+    存活检查中间件（已使用标准 __call__）, 应放在中间件列表的第一个
+    GET /healthz: 进程存活
+    GET /readiness: 返回后台检查的数据库、缓存状态, 见 dvadmin.utils.readiness
+    GET /debug/runtime: 进程运行状态, 见 dvadmin.utils.runtime_stats, 需要 RUNTIME_STATS_TOKEN
     """
     def __init__(self, get_response):
         self.get_response = get_response
         self.logger = logging.getLogger("healthz")
+        self.runtime_token = getattr(settings, "RUNTIME_STATS_TOKEN", None)
 
     def __call__(self, request):
         if request.method == "GET":
@@ -166,6 +471,8 @@ class HealthCheckMiddleware:
                 return self.readiness(request)
             elif request.path == "/healthz":
                 return self.healthz(request)
+            elif request.path == "/debug/runtime":
+                return self.runtime(request)
         return self.get_response(request)
 
     def healthz(self, request):
@@ -173,28 +480,18 @@ class HealthCheckMiddleware:
         return HttpResponse("OK")
 
     def readiness(self, request):
-        """就绪检查端点"""
-        try:
-            from django.db import connections
-            for name in connections:
-                cursor = connections[name].cursor()
-                cursor.execute("SELECT 1;")
-                if cursor.fetchone() is None:
-                    return HttpResponseServerError("db: invalid response")
-        except Exception as e:
-            self.logger.exception(e)
-            return HttpResponseServerError("db: cannot connect to database.")
+        """就绪检查端点, 只读取缓存的检查结果, 未就绪时返回503"""
+        ready, data = get_checker().status()
+        return JsonResponse({"status": "ok" if ready else "fail", **data}, status=200 if ready else 503)
 
-        try:
-            from django.core.cache import caches
-            from django.core.cache.backends.memcached import BaseMemcachedCache
-            for cache in caches.all():
-                if isinstance(cache, BaseMemcachedCache):
-                    stats = cache._cache.get_stats()
-                    if len(stats) != len(cache._servers):
-                        return HttpResponseServerError("cache: cannot connect to cache.")
-        except Exception as e:
-            self.logger.exception(e)
-            return HttpResponseServerError("cache: cannot connect to cache.")
-
-        return HttpResponse("OK")
+    def runtime(self, request):
+        """
+        运行状态端点, 请求头 Authorization: Bearer <RUNTIME_STATS_TOKEN>
+        只比较配置的token, 不查询用户, 未配置token时不开放
+        """
+        if not self.runtime_token:
+            return HttpResponseNotFound()
+        scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), self.runtime_token.encode()):
+            return HttpResponseForbidden()
+        return JsonResponse(runtime_stats.collect())
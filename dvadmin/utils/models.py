@@ -1,10 +1,18 @@
+import copy
+from collections.abc import Iterable
 from datetime import datetime
+from itertools import islice
 from typing import Any
 
-from django.db import models
+from django.db import models, router
+from django.db.models import Q
+from django.db.models.lookups import Exact
+from django.db.models.signals import class_prepared
+from django.db.models.sql.where import AND
 from rest_framework.request import Request
 
 from My_django_vue3_admin import settings
+from dvadmin.utils.soft_delete import cascade_restore, cascade_soft_delete
 
 table_prefix = settings.TABLE_PREFIX  # 数据库表名前缀
 
@@ -36,9 +44,67 @@ class CoreModelManager(models.Manager):
             data["creator"] = request_user
             # 这里存储user.id，modifier可能有空的
             data["modifier"] = request_user.id
-            data["dept_belong_id"] = request_user.dept_id
+            data["dept_belong_id"] = getattr(request_user, "dept_id", None)
         return super().create(**data)
 
+    def bulk_insert(
+        self,
+        objs: Iterable,
+        request: Request = None,
+        batch_size: int = 1000,
+        ignore_conflicts: bool = False,
+        update_conflicts: bool = False,
+        update_fields: list[str] = None,
+        unique_fields: list[str] = None,
+    ) -> int:
+        """
+        批量创建, create(request=...) 的批量版本, 用于大量导入
+        审计字段(creator/modifier/dept_belong_id)从request取一次, 对象上已有值的不覆盖
+        create_datetime/update_datetime 由 bulk_create 调用字段的 pre_save 填充(auto_now_add/auto_now)
+        按batch_size分批从objs中取出并插入, objs可以是生成器, 不会一次性全部加载到内存
+        每批单独提交, 需要整体回滚时由调用方包在 transaction.atomic() 中
+        :param objs: 模型实例或字段字典
+        :param update_conflicts: 冲突时更新update_fields, 会自动加上update_datetime和modifier
+        :return: 提交插入的行数(ignore_conflicts时包含被忽略的行)
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size必须大于0")
+        field_names = {field.attname for field in self.model._meta.concrete_fields}
+        audit = {}
+        user = getattr(request, "user", None) if request is not None else None
+        if user is not None and user.is_authenticated:
+            audit = {
+                "creator_id": user.id,
+                "modifier": user.id,
+                "dept_belong_id": getattr(user, "dept_id", None),
+            }
+            audit = {name: value for name, value in audit.items() if name in field_names}
+        if update_conflicts and update_fields:
+            # 冲突更新时同样要记录修改时间和修改人
+            extra_fields = ["update_datetime"] + (["modifier"] if "modifier" in audit else [])
+            update_fields = list(update_fields) + [
+                name for name in extra_fields if name in field_names and name not in update_fields
+            ]
+
+        iterator = iter(objs)
+        total = 0
+        while batch := list(islice(iterator, batch_size)):
+            batch = [obj if isinstance(obj, self.model) else self.model(**obj) for obj in batch]
+            if audit:
+                for obj in batch:
+                    for name, value in audit.items():
+                        if getattr(obj, name) is None:
+                            setattr(obj, name, value)
+            self.bulk_create(
+                batch,
+                ignore_conflicts=ignore_conflicts,
+                update_conflicts=update_conflicts,
+                update_fields=update_fields if update_conflicts else None,
+                unique_fields=unique_fields if update_conflicts else None,
+            )
+            total += len(batch)
+        return total
+
 
 class CoreModel(models.Model):
     """
@@ -162,12 +228,14 @@ class CoreModel(models.Model):
         """
         返回字典：
             * 更新时间
-            * 修改人
+            * 修改人, 与 CoreModelManager.create 相同记录用户id, 没有登录用户时不修改
         """
-        return {
-            "update_datetime": datetime.now(),
-            "modifier": self.get_request_username(request),
-        }
+        data = {"update_datetime": datetime.now()}
+        user_id = getattr(self.get_request_user(request), "id", None)
+        if user_id is not None:
+            # modifier为字符串字段, 转为字符串后与数据库读出的值比较才不会被当作修改
+            data["modifier"] = str(user_id)
+        return data
 
     # ==================== 获取字段=================================
     exclude_fields = [
@@ -206,11 +274,41 @@ class CoreModel(models.Model):
 
     def get_need_fields_names(self):
         """获取字段名，不包括排除的内容"""
-        return [
-            field.name
-            for field in self.get_all_fields()
-            if field not in self.exclude_fields
-        ]
+        return [name for name, _ in self.get_field_plan()]
+
+    @classmethod
+    def get_field_plan(cls) -> tuple[tuple[str, str], ...]:
+        """
+        需要输出的字段, 每个模型类只计算一次, 按名称排除 exclude_fields
+        :return: ((字段名, to_data读取的属性名), ...), 关联CoreModel的外键读取xxx_id, 不查询关联对象
+        """
+        plan = cls.__dict__.get("_field_plan")
+        if plan is None:
+            exclude = set(cls.exclude_fields)
+            plan = tuple(
+                (
+                    field.name,
+                    field.attname
+                    if isinstance(field.related_model, type) and issubclass(field.related_model, CoreModel)
+                    else field.name,
+                )
+                for field in cls._meta.fields
+                if field.name not in exclude and field.attname not in exclude
+            )
+            cls._field_plan = plan
+        return plan
+
+    @classmethod
+    def to_dicts(cls, queryset: models.QuerySet = None, chunk_size: int = 2000):
+        """
+        批量转换为字典, 与to_data的结果相同, 但通过values()直接读取, 不创建模型实例
+        关联字段只返回id
+        :return: 迭代器, 按chunk_size分批从数据库读取
+        """
+        if queryset is None:
+            queryset = cls._default_manager.all()
+        names = [name for name, _ in cls.get_field_plan()]
+        return queryset.values(*names).iterator(chunk_size=chunk_size)
 
     # ============模型转换为字典==========================
     def to_data(self):
@@ -220,19 +318,8 @@ class CoreModel(models.Model):
             * 避免复杂嵌套：防止序列化时出现深层嵌套或循环引用
             * 返回简化数据：关联对象字段只返回主键值，而非完整对象
         """
-        res = {}
-
-        for field in self.get_need_fields_names():
-            # 取得self对象的field属性
-            field_value = getattr(self, field)
-            # res[field]为了避免在序列化模型时出现循环引用或复杂嵌套对象：
-            # 对于普通字段（如字符串、数字等）：直接返回字段值
-            # 对于关联对象字段（如 ForeignKey）：只返回关联对象的 ID，而不是整个关联对象
-            res[field] = (
-                field_value.id
-                if issubclass(field_value.__class__, CoreModel)
-                else field_value
-            )
+        # 关联CoreModel的字段在字段计划中已换成xxx_id, 直接读取外键值, 不会查询关联对象
+        return {name: getattr(self, attname) for name, attname in self.get_field_plan()}
 
     @property
     def DATA(self):
@@ -245,7 +332,7 @@ class CoreModel(models.Model):
         保持原始数据结构：如果字段是关联对象，会返回完整的对象
         简单转换：只是将模型字段转换为字典格式
         """
-        return {field: getattr(self, field) for field in self.get_need_fields_names()}
+        return {name: getattr(self, name) for name, _ in self.get_field_plan()}
 
     @property
     def DICT_DATA(self):
@@ -264,56 +351,209 @@ class CoreModel(models.Model):
     def update(self, request, update_data: dict[str, Any] = None):
         # 我们要求更新的内容必须以字典的形式传过来
         assert isinstance(update_data, dict), "update_data必须为字典"
-        validated_data = {**self.common_insert_data(request), **update_data}
-        for key, value in validated_data.items():
+        # 更新时不覆盖创建人和创建时间
+        for key, value in update_data.items():
             # 更新时不允许修改pk,id,uuid
             if key in ["pk", "id", "uuid"]:
                 continue
             if hasattr(self, key):
                 setattr(self, key, value)
+        # 有修改时才记录修改人, 否则修改人本身会被当作修改, 每次都要写入
+        if self.has_changes():
+            for key, value in self.common_update_data(request).items():
+                if key not in update_data:
+                    setattr(self, key, value)
+        # 只写入修改过的字段, 没有修改时不执行SQL
         self.save()
         return self
 
+    # ================== 字段修改跟踪 =================================
+    @classmethod
+    def get_tracked_fields(cls) -> tuple[tuple[str, str, bool], ...]:
+        """
+        参与修改跟踪的字段, 每个模型类只计算一次
+        auto_now字段(update_datetime)每次保存都会变化, 不参与比较, 在有修改时自动写入
+        :return: ((字段名, 属性名, 是否需要深拷贝), ...), JSONField的值可能被原地修改, 快照时需要深拷贝
+        """
+        fields = cls.__dict__.get("_tracked_fields")
+        if fields is None:
+            fields = tuple(
+                (field.name, field.attname, isinstance(field, models.JSONField))
+                for field in cls._meta.concrete_fields
+                if not field.primary_key and not getattr(field, "auto_now", False)
+            )
+            cls._tracked_fields = fields
+        return fields
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._store_loaded_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._store_loaded_values(fields)
+
+    def _store_loaded_values(self, fields=None):
+        """
+        记录字段当前的值, 作为之后比较的基准
+        :param fields: 只记录这些字段(字段名或属性名), 为空时记录所有已加载的字段
+        """
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        loaded[self._meta.pk.attname] = self.pk
+        for name, attname, deep in self.get_tracked_fields():
+            if attname not in self.__dict__:
+                # 延迟加载(defer/only)且没有访问过的字段
+                continue
+            if fields is not None and name not in fields and attname not in fields:
+                continue
+            value = self.__dict__[attname]
+            loaded[attname] = copy.deepcopy(value) if deep else value
+
+    def get_dirty_fields(self) -> list[str]:
+        """
+        与加载时相比被修改过的字段名, 没有加载基准(新建的对象)时返回所有字段
+        """
+        loaded = self.__dict__.get("_loaded_values")
+        if loaded is None:
+            return [name for name, _, _ in self.get_tracked_fields()]
+        missing = object()
+        return [
+            name
+            for name, attname, _ in self.get_tracked_fields()
+            if attname in self.__dict__ and loaded.get(attname, missing) != self.__dict__[attname]
+        ]
+
+    def has_changes(self) -> bool:
+        """是否有需要写入数据库的修改, 新建的对象总是返回True"""
+        return self._state.adding or bool(self.get_dirty_fields())
+
+    def _can_track_save(self, args, kwargs) -> bool:
+        """只对已从数据库加载、主键和数据库都没有变化的普通save()按修改字段更新"""
+        loaded = self.__dict__.get("_loaded_values")
+        return (
+            not args
+            and loaded is not None
+            and not self._state.adding
+            and self.pk is not None
+            and loaded.get(self._meta.pk.attname) == self.pk
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not kwargs.get("force_update")
+            and kwargs.get("using") in (None, self._state.db)
+        )
+
+    def save(self, *args, **kwargs):
+        """
+        已加载的对象只更新修改过的字段和update_datetime, 没有修改时不执行SQL(也不发送pre_save/post_save信号)
+        显式传入update_fields时按调用方指定的字段保存
+        """
+        if self._can_track_save(args, kwargs):
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            auto_now = [
+                field.name
+                for field in self._meta.concrete_fields
+                if getattr(field, "auto_now", False)
+            ]
+            kwargs["update_fields"] = dirty + auto_now
+        super().save(*args, **kwargs)
+        self._store_loaded_values(kwargs.get("update_fields"))
+
+
+class _AliveByDefault(Exact):
+    """
+    SoftDeleteManager 默认添加的 is_deleted=False 条件
+    单独一个类以便 with_deleted()/dead()/filter(is_deleted=...) 时找到并移除
+    """
+
+
 class SoftDeleteQuerySet(models.QuerySet):
-    pass
+    """
+    Model.objects 默认只返回未删除的记录:
+        * Model.objects.all() / .filter(...)         未删除的记录
+        * Model.objects.dead()                        已删除的记录
+        * Model.objects.with_deleted()                全部记录
+        * Model.objects.filter(is_deleted=True)       显式按is_deleted过滤时(包括Q对象中), 不再添加默认条件
+    可见范围保存在每个QuerySet自己的查询条件中, 管理器上没有共享状态
+    """
+
+    def _without_default(self):
+        clone = self._chain()
+        where = clone.query.where
+        # 默认条件在顶层的AND中, 合并(|)之后的查询不处理
+        if where.connector == AND and not where.negated:
+            where.children = [child for child in where.children if not isinstance(child, _AliveByDefault)]
+        return clone
+
+    @classmethod
+    def _filters_is_deleted(cls, lookups) -> bool:
+        """
+        查询条件中是否有 is_deleted 字段, 包括Q对象中(含 | 组合、~取反)嵌套的条件
+        :param lookups: kwargs的键, 或Q对象的children((键, 值) 或 Q)
+        """
+        for lookup in lookups:
+            if isinstance(lookup, Q):
+                if cls._filters_is_deleted(lookup.children):
+                    return True
+                continue
+            key = lookup[0] if isinstance(lookup, tuple) else lookup
+            if isinstance(key, str) and (key == "is_deleted" or key.startswith("is_deleted__")):
+                return True
+        return False
+
+    def _filter_or_exclude(self, negate, args, kwargs):
+        if self._filters_is_deleted(kwargs) or self._filters_is_deleted(args):
+            self = self._without_default()
+        return super()._filter_or_exclude(negate, args, kwargs)
+
+    def alive(self):
+        return self.filter(is_deleted=False)
 
-class SoftDeleteManager(models.Manager):
-    def __init__(self):
-        self.__add_is_del_filter = False
-        super().__init__()
+    def dead(self):
+        return self.filter(is_deleted=True)
 
-    def filter(self, *args, **kwargs):
-        # 考虑是否主动传入is_deleted
-        if not kwargs.get("is_deleted") is None:
-            self.__add_is_del_filter = True
-        super().filter(*args,**kwargs)
+    def with_deleted(self):
+        return self._without_default()
 
+    def delete(self):
+        """软删除, 级联规则见 dvadmin.utils.soft_delete"""
+        return cascade_soft_delete(self)
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def hard_delete(self):
+        return super().delete()
+
+    hard_delete.alters_data = True
+    hard_delete.queryset_only = True
+
+    def restore(self):
+        """恢复已删除的记录, 以及同一次删除中被级联删除的记录"""
+        return cascade_restore(self)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
     def get_queryset(self):
-        """
-        当用户不指定 is_deleted 时（__add_is_del_filter = False）
-        默认自动过滤掉已软删除的记录
-            * MyModel.objects.all()
-            * MyModel.objects.filter(name='test')
-        当用户显式指定 is_deleted 时私有属性会变成True (__add_is_del_filter = True）
-            * MyModel.objects.filter(is_deleted=True)   # 查询已软删除的记录
-            * MyModel.objects.filter(is_deleted=False)  # 查询未软删除的记录
-        """
-        if self.__add_is_del_filter:
-            # 要操作哪个模型的数据(self.model)
-            # 要在哪个数据库上执行查询(using=self._db)
-            # exclude(is_deleted=False) 查询时不包含is_deleted=False的字段
-            return SoftDeleteQuerySet(self.model, using=self._db).exclude(
-                is_deleted=False
-            )
-        return SoftDeleteQuerySet().exclude(is_deleted=True)
+        """返回的QuerySet带有 is_deleted=False 的默认条件"""
+        queryset = super().get_queryset()
+        query = queryset.query
+        field = self.model._meta.get_field("is_deleted")
+        query.where.add(_AliveByDefault(field.get_col(query.get_initial_alias()), False), AND)
+        return queryset
 
-    def get_by_natural_key(self,name):
+    def get_by_natural_key(self, name):
         """根据不同name获取对应模型实例"""
-        return SoftDeleteQuerySet(self.model).get(username=name)
+        return self.get(username=name)
 
 
 class SoftDeleteModel(models.Model):
     is_deleted = models.BooleanField(default=False, verbose_name="是否软删除")
+    # 同一次级联删除的记录时间相同, 恢复(cascade_restore)和清理(purge_soft_deleted)都以此为准
+    delete_datetime = models.DateTimeField(null=True, blank=True, verbose_name="删除时间", help_text="删除时间")
     objects = SoftDeleteManager()
 
     class Meta:
@@ -324,30 +564,50 @@ class SoftDeleteModel(models.Model):
         # 加快基于软删除状态的查询速度
         indexes = [models.Index(fields=["is_deleted"])]
 
+    # 只包含未删除记录的部分索引(WHERE is_deleted = false), 如 [("name",), ("parent", "sort")]
+    # 由 class_prepared 为每个子类生成, 查询未删除的记录时不需要扫描已删除的数据
+    # MySQL不支持部分索引, Django会跳过这些索引(系统检查 models.W037)
+    alive_index_fields = ()
+
     def delete(self, using=None, soft_delete=True, *args, **kwargs):
         """
         重写删除方法，开启软删除时相关联的模型内容被软删除
+        级联按模型逐层批量更新(见 dvadmin.utils.soft_delete), 不会逐条加载关联对象
         :param using:如果你的项目配置了多个数据库,可以通过 using 参数指定具体使用哪一个
-        :return:
+        :return: (软删除的总数, {模型label: 数量})
         """
         if soft_delete:
-            self.is_deleted = True
-            self.save(using=using)
-            # 级联软删除关联对象
-            # 通过 self._meta.related_objects 获取当前模型的所有关联关系，包括外键关联、一对一、一对多等关系
-            for related_object in self._meta.related_objects:
-                # 使用 get_accessor_name() 获取反向关联的属性名，getattr获取具体模型实例
-                related_model = getattr(self, related_object.get_accessor_name())
-                # 处理一对多和多对多的关联对象
-                # 如果是一对多或多对多就获取所有关联对象集合
-                if related_object.one_to_many or related_object.many_to_many:
-                    related_objects = related_model.all()
-                elif related_object.one_to_one:
-                    related_objects = [related_model]
-                else:
-                    continue
-
-                for obj in related_objects:
-                    obj.delete(soft_delete=True)
+            using = using or router.db_for_write(self.__class__, instance=self)
+            queryset = self.__class__._base_manager.using(using).filter(pk=self.pk)
+            result = cascade_soft_delete(queryset)
+            self.is_deleted, self.delete_datetime = queryset.values_list("is_deleted", "delete_datetime").get()
+            return result
         else:
-            super().delete(using=using, *args, **kwargs)
+            return super().delete(using=using, *args, **kwargs)
+
+    def restore(self, using=None):
+        """
+        恢复本条记录和同一次删除中被级联删除的记录
+        :return: (恢复的总数, {模型label: 数量})
+        """
+        using = using or router.db_for_write(self.__class__, instance=self)
+        queryset = self.__class__._base_manager.using(using).filter(pk=self.pk)
+        result = cascade_restore(queryset)
+        self.is_deleted, self.delete_datetime = False, None
+        return result
+
+
+def _add_alive_indexes(sender, **kwargs):
+    if not issubclass(sender, SoftDeleteModel) or sender._meta.proxy:
+        return
+    names = {index.name for index in sender._meta.indexes}
+    for fields in sender.alive_index_fields:
+        # 带条件的索引必须指定名称, 先占位再按模型生成, 后缀与同字段的普通索引(idx)区分
+        index = models.Index(fields=list(fields), condition=Q(is_deleted=False), name="alive")
+        index.suffix = "alv"
+        index.set_name_with_model(sender)
+        if index.name not in names:
+            sender._meta.indexes.append(index)
+
+
+class_prepared.connect(_add_alive_indexes)
@@ -0,0 +1,56 @@
+"""
+慢请求cProfile文件的保存和轮转, 由 SlowRequestProfilingMiddleware 写入, manage.py profile_summary 汇总
+文件名: <时间>_<耗时>ms_<请求方式>_<路由>_<pid>.pstats, 按时间排序, 超过上限时删除最旧的
+"""
+import os
+import re
+import time
+
+PROFILE_SUFFIX = ".pstats"
+
+
+def route_slug(route: str) -> str:
+    """路由转为文件名, 如 api/system/menu/<int:pk>/ -> api_system_menu_int_pk"""
+    return re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")[:80] or "root"
+
+
+def list_profiles(directory) -> list[str]:
+    """目录下的profile文件, 从旧到新"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIX)
+    )
+
+
+def save_profile(profiler, directory, route: str, method: str, duration: float, max_files: int) -> str:
+    """
+    保存profile并删除超出max_files的旧文件
+    :param profiler: cProfile.Profile
+    :param duration: 请求耗时(秒)
+    :return: 文件路径
+    """
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    name = "%s%06d_%dms_%s_%s_%d%s" % (
+        time.strftime("%Y%m%d%H%M%S", time.localtime(now)),
+        int(now % 1 * 1000000),
+        duration * 1000,
+        method,
+        route_slug(route),
+        os.getpid(),
+        PROFILE_SUFFIX,
+    )
+    path = os.path.join(directory, name)
+    tmp_path = path + ".tmp"
+    profiler.dump_stats(tmp_path)
+    os.replace(tmp_path, path)
+
+    profiles = list_profiles(directory)
+    for old in profiles[: max(len(profiles) - max_files, 0)]:
+        try:
+            os.remove(old)
+        except FileNotFoundError:
+            # 其他worker已经删除
+            pass
+    return path
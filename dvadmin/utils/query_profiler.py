@@ -0,0 +1,83 @@
+"""
+请求级SQL分析, 由 QueryProfilingMiddleware 按采样率开启
+* 统计查询次数、数据库耗时
+* 把SQL归一化为"形状"(参数、字面量、IN列表替换为占位符), 同一形状重复执行达到阈值视为N+1,
+  并记录第一次达到阈值时项目代码中的调用位置
+"""
+import re
+import traceback
+from time import perf_counter
+
+from django.conf import settings
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LIST_RE = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    SQL归一化, 只保留语句结构
+    normalize_sql("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'a'") -> "SELECT * FROM t WHERE id IN (...) AND name = ?"
+    """
+    sql = _LITERAL_RE.sub("?", sql.replace("%s", "?"))
+    sql = _PLACEHOLDER_LIST_RE.sub("(...)", sql)
+    sql = _REPEATED_LIST_RE.sub("(...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def _caller() -> str:
+    """调用栈中最近的项目代码位置(排除第三方库和本模块)"""
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        filename = frame.filename
+        if filename.startswith(base_dir) and "site-packages" not in filename and filename != __file__:
+            return f"{filename[len(base_dir) + 1:]}:{frame.lineno} in {frame.name}"
+    return ""
+
+
+class QueryProfile:
+    """作为 connection.execute_wrapper 的包装函数使用"""
+
+    def __init__(self, n_plus_one_threshold: int = 5):
+        self.threshold = n_plus_one_threshold
+        self.count = 0
+        self.duration = 0.0
+        # 形状 -> [次数, 耗时, 调用位置]
+        self.shapes: dict[str, list] = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            shape = normalize_sql(sql)
+            stat = self.shapes.get(shape)
+            if stat is None:
+                stat = self.shapes[shape] = [0, 0.0, ""]
+            stat[0] += 1
+            stat[1] += duration
+            if stat[0] == self.threshold:
+                stat[2] = _caller()
+
+    def repeated(self) -> list[dict]:
+        """重复次数达到阈值的形状, 按次数倒序"""
+        return [
+            {"sql": shape, "count": count, "duration_ms": round(duration * 1000, 2), "caller": caller}
+            for shape, (count, duration, caller) in sorted(
+                self.shapes.items(), key=lambda item: item[1][0], reverse=True
+            )
+            if count >= self.threshold
+        ]
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头, 浏览器开发者工具的Timing面板可以直接查看"""
+        value = f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+        repeated = self.repeated()
+        if repeated:
+            value += f', n_plus_one;desc="{len(repeated)} repeated, max {repeated[0]["count"]}"'
+        return value
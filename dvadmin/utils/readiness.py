@@ -0,0 +1,150 @@
+"""
+就绪检查, 供 HealthCheckMiddleware 的 /readiness 使用
+后台线程每 READINESS_CHECK_INTERVAL 秒检查一次所有数据库和缓存, 每项检查最多等待 READINESS_CHECK_TIMEOUT 秒,
+探针只读取最近一次的结果, 不会因为探针频繁或依赖变慢而堆积数据库连接
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger("healthz")
+
+
+def check_database(alias: str):
+    connection = connections[alias]
+    # 检查线程中的连接会一直复用, 失效时先关闭再重连
+    connection.close_if_unusable_or_obsolete()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        if cursor.fetchone() is None:
+            raise RuntimeError("invalid response")
+
+
+def check_cache(alias: str):
+    """读写一个键, 适用于所有缓存后端"""
+    cache = caches[alias]
+    key = f"readiness:{os.getpid()}:{threading.get_ident()}"
+    value = str(time.time())
+    cache.set(key, value, timeout=60)
+    if cache.get(key) != value:
+        raise RuntimeError("cache get/set mismatch")
+
+
+def default_checks() -> dict[str, Callable[[], None]]:
+    databases = getattr(settings, "READINESS_DATABASES", None)
+    if databases is None:
+        databases = list(connections)
+    cache_aliases = getattr(settings, "READINESS_CACHES", None)
+    if cache_aliases is None:
+        cache_aliases = list(settings.CACHES)
+    checks = {f"db:{alias}": (lambda alias=alias: check_database(alias)) for alias in databases}
+    checks.update({f"cache:{alias}": (lambda alias=alias: check_cache(alias)) for alias in cache_aliases})
+    return checks
+
+
+class ReadinessChecker:
+    def __init__(self, checks: dict[str, Callable[[], None]], interval: float = 5, timeout: float = 2):
+        """
+        :param checks: {名称: 检查函数}, 检查函数抛出异常表示失败
+        :param interval: 检查间隔(秒)
+        :param timeout: 每项检查的超时时间(秒)
+        """
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        # 超过该时间没有完成新一轮检查, 说明检查线程本身出了问题
+        self.max_age = interval * 3 + timeout
+        self.results: dict[str, dict] = {}
+        self.checked_at: float | None = None
+        self._executor = ThreadPoolExecutor(max_workers=max(len(checks), 1), thread_name_prefix="readiness")
+        # 上一轮超时仍未结束的检查, 不重复提交
+        self._running: dict[str, tuple[Future, float]] = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _timed(self, check: Callable[[], None]) -> float:
+        start = time.perf_counter()
+        check()
+        return time.perf_counter() - start
+
+    def run_once(self):
+        """并发执行所有检查, 总耗时不超过timeout"""
+        for name, check in self.checks.items():
+            if name not in self._running:
+                self._running[name] = (self._executor.submit(self._timed, check), time.perf_counter())
+        deadline = time.monotonic() + self.timeout
+        results = {}
+        for name in self.checks:
+            future, started = self._running[name]
+            try:
+                latency = future.result(timeout=max(deadline - time.monotonic(), 0))
+                results[name] = {"ok": True, "latency_ms": round(latency * 1000, 2), "error": None}
+            except FutureTimeoutError:
+                results[name] = {
+                    "ok": False,
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "error": "timeout",
+                }
+                continue
+            except Exception as e:
+                logger.warning("就绪检查 %s 失败: %s", name, e)
+                results[name] = {
+                    "ok": False,
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "error": f"{type(e).__name__}: {e}",
+                }
+            del self._running[name]
+        self.results = results
+        self.checked_at = time.monotonic()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception(e)
+
+    def start(self):
+        """第一次调用时同步检查一次, 之后由后台线程定期检查"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self.run_once()
+                self._thread = threading.Thread(target=self._loop, name="readiness-checker", daemon=True)
+                self._thread.start()
+
+    def status(self) -> tuple[bool, dict]:
+        """
+        :return: (是否就绪, {"checks": {名称: 结果}, "age": 距离上次检查的秒数})
+        """
+        self.start()
+        age = time.monotonic() - self.checked_at
+        ready = age <= self.max_age and all(result["ok"] for result in self.results.values())
+        return ready, {"checks": self.results, "age": round(age, 3)}
+
+
+_checker = None
+_checker_lock = threading.Lock()
+
+
+def get_checker() -> ReadinessChecker:
+    """当前进程的检查器, 第一次探针时创建(gunicorn fork之后)"""
+    global _checker
+    if _checker is None:
+        with _checker_lock:
+            if _checker is None:
+                _checker = ReadinessChecker(
+                    default_checks(),
+                    getattr(settings, "READINESS_CHECK_INTERVAL", 5),
+                    getattr(settings, "READINESS_CHECK_TIMEOUT", 2),
+                )
+    return _checker
@@ -3,9 +3,10 @@ import json
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import AnonymousUser
 from rest_framework.request import Request
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from user_agents import parse
 
+from dvadmin.utils.authentication import TracedJWTAuthentication
+
 
 def get_request_ip(request):
     """
@@ -23,27 +24,58 @@ def get_request_ip(request):
     return ip or "unknown"
 
 
-def get_request_data(request):
+def truncate_text(text, max_length: int | None):
+    """
+    截断过长的文本, 末尾加上截断标记
+    :param text: 非字符串原样返回
+    :param max_length: None表示不限制
+    """
+    if not isinstance(text, str) or max_length is None or len(text) <= max_length:
+        return text
+    return f"{text[:max_length]}...[truncated {len(text) - max_length} chars]"
+
+
+def get_request_data(request, max_length: int | None = None):
     """
     获取请求参数
+    * 表单、multipart只取普通字段, 文件部分只记录文件名和大小
+    * JSON请求体超过max_length时不读取, 只记录长度
     :param request:
+    :param max_length: 请求体最大读取长度, None表示不限制
     :return:
     """
     request_data = getattr(request, "request_data", None)
     if request_data:
         return request_data
     # /api/users?page=1&size=10&search=john 会生成字典：{'page': '1', 'size': '10', 'search': 'john'}
-    # username=admin&password=123456 会生成字典：{'username': 'admin', 'password': '123456'}
-    data: dict = {**request.GET.dict(), **request_data.POST.dict()}
-    if not data:
-        try:
-            body = request.body
-            if body:
-                body = json.loads(body)
-        except Exception as e:
-            pass
-        if not isinstance(data, dict):
-            data = {"data": data}
+    data: dict = request.GET.dict()
+    content_type = getattr(request, "content_type", "") or ""
+    if content_type in ("application/x-www-form-urlencoded", "multipart/form-data"):
+        # username=admin&password=123456 会生成字典：{'username': 'admin', 'password': '123456'}
+        data.update(request.POST.dict())
+        # 上传的文件保存在request.FILES, 不复制文件内容
+        files = [
+            f"{name}:{upload.name}({upload.size} bytes)"
+            for name, upload in request.FILES.items()
+        ]
+        if files:
+            data["_files"] = files
+        return data
+
+    content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    if not content_length or "json" not in content_type:
+        return data
+    if max_length is not None and content_length > max_length:
+        data["_body"] = f"[truncated {content_length} bytes]"
+        return data
+    try:
+        body = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return data
+    if isinstance(body, dict):
+        data.update(body)
+    else:
+        data["data"] = body
     return data
 
 
@@ -97,7 +129,7 @@ def get_request_user(request: Request) -> AbstractBaseUser | None:
     if user and user.is_authenticated:
         return user
 
-    auth_result = JWTAuthentication().authenticate(request)
+    auth_result = TracedJWTAuthentication().authenticate(request)
     if auth_result is not None:
         user, token = auth_result
     else:
@@ -107,13 +139,13 @@ def get_request_user(request: Request) -> AbstractBaseUser | None:
 
 def get_os(request: Request):
     """获取操作系统"""
-    us_string: str = request.META["HTTP_USER_AGENT"]
+    us_string: str = request.META.get("HTTP_USER_AGENT", "")
     user_agent = parse(us_string)
     return user_agent.get_os()
 
 
 def get_browser(request: Request):
-    us_string: str = request.META["HTTP_USER_AGENT"]
+    us_string: str = request.META.get("HTTP_USER_AGENT", "")
     user_agent = parse(us_string)
     return user_agent.get_browser()
 
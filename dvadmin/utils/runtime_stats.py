@@ -0,0 +1,97 @@
+"""
+进程运行状态, 供 /debug/runtime 使用, 只读取进程内的数据, 不查询数据库
+"""
+import gc
+import json
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from dvadmin.utils.cache_stats import cache_stats
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STARTED_AT = time.time()
+
+
+class GcPauseTracker:
+    """通过 gc.callbacks 记录每一代垃圾回收的次数和停顿时间"""
+
+    def __init__(self):
+        self._start = None
+        # 代 -> [次数, 总耗时, 最大耗时]
+        self.pauses = {generation: [0, 0.0, 0.0] for generation in range(3)}
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            duration = time.perf_counter() - self._start
+            self._start = None
+            stats = self.pauses[info["generation"]]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+
+    def snapshot(self) -> dict:
+        return {
+            str(generation): {
+                "collections": count,
+                "total_pause_ms": round(total * 1000, 3),
+                "max_pause_ms": round(longest * 1000, 3),
+            }
+            for generation, (count, total, longest) in self.pauses.items()
+        }
+
+
+gc_pause_tracker = GcPauseTracker()
+gc.callbacks.append(gc_pause_tracker)
+
+
+def _memory() -> dict:
+    data = {"rss_bytes": None, "max_rss_bytes": None}
+    try:
+        with open("/proc/self/statm") as f:
+            data["rss_bytes"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux单位为KB, macOS为字节
+        data["max_rss_bytes"] = max_rss if sys.platform == "darwin" else max_rss * 1024
+    return data
+
+
+def _system_config_size() -> dict:
+    config = getattr(settings, "SYSTEM_CONFIG", None) or {}
+    return {
+        "keys": len(config),
+        "bytes": len(json.dumps(config, ensure_ascii=False, default=str).encode()),
+    }
+
+
+def collect() -> dict:
+    threads = threading.enumerate()
+    return {
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - STARTED_AT, 3),
+        "memory": _memory(),
+        "gc": {
+            "counts": gc.get_count(),
+            "thresholds": gc.get_threshold(),
+            "collections": [stats["collections"] for stats in gc.get_stats()],
+            "pauses": gc_pause_tracker.snapshot(),
+        },
+        "threads": {"count": len(threads), "names": sorted(thread.name for thread in threads)},
+        # 数据库连接按线程保存, 这里只能看到处理本请求的线程
+        "db_connections": {alias: connections[alias].connection is not None for alias in connections},
+        "system_config": _system_config_size(),
+        "caches": cache_stats.snapshot(),
+    }
@@ -0,0 +1,128 @@
+"""
+级联软删除
+从要删除的记录出发, 按模型逐层(广度优先)找到通过外键(on_delete=CASCADE)引用它们的记录,
+每层每个模型只执行一次 update(is_deleted=True), 不加载模型实例, 也不发送 pre_save/post_save 信号
+没有 is_deleted 字段的模型不能软删除, 不会继续向下级联
+cascade_restore 按 delete_datetime 恢复同一次删除的整棵子树, 物理清理见 manage.py purge_soft_deleted
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, transaction
+from django.db.models import Q
+
+# 每条SQL中 pk IN (...) 的最大参数个数, SQLite 默认最多999个参数
+BATCH_SIZE = 900
+
+
+def is_soft_deletable(model) -> bool:
+    try:
+        return model._meta.get_field("is_deleted").concrete
+    except FieldDoesNotExist:
+        return False
+
+
+def _chunks(pks: list, size: int = BATCH_SIZE):
+    for start in range(0, len(pks), size):
+        yield pks[start : start + size]
+
+
+def cascade_relations(model):
+    """引用model且会随之删除的反向外键/一对一关系: [(引用模型, 外键字段名)]"""
+    return [
+        (relation.related_model, relation.field.name)
+        for relation in model._meta.related_objects
+        if (relation.one_to_many or relation.one_to_one)
+        and relation.on_delete is models.CASCADE
+        and is_soft_deletable(relation.related_model)
+    ]
+
+
+def soft_deletable_models() -> list:
+    return [model for model in apps.get_models() if is_soft_deletable(model) and not model._meta.proxy]
+
+
+def _walk(model, pks, using: str, related_filter: Q = None):
+    """
+    从model的pks出发广度优先遍历级联关系, 逐层返回 (模型, 本层第一次出现的pk列表)
+    调用方可以在处理完一层之后再继续迭代, 下一层的pk在这之后才查询
+    :param related_filter: 只沿满足条件的关联记录继续遍历
+    """
+    visited: dict[type, set] = defaultdict(set)
+    level = {model: set(pks)}
+    while level:
+        next_level = defaultdict(set)
+        for model, pks in level.items():
+            pks = list(pks - visited[model])
+            if not pks:
+                continue
+            visited[model].update(pks)
+            yield model, pks
+            for related_model, field_name in cascade_relations(model):
+                queryset = related_model._base_manager.using(using)
+                if related_filter is not None:
+                    queryset = queryset.filter(related_filter)
+                for chunk in _chunks(pks):
+                    next_level[related_model].update(
+                        queryset.filter(**{f"{field_name}__pk__in": chunk}).values_list("pk", flat=True)
+                    )
+        level = next_level
+
+
+def _update_values(model, now: datetime, **values) -> dict:
+    """update()的字段, 有update_datetime时一并更新, 去掉模型中没有的字段(如自定义软删除模型没有delete_datetime)"""
+    names = {field.name for field in model._meta.concrete_fields}
+    values["update_datetime"] = now
+    return {name: value for name, value in values.items() if name in names}
+
+
+def cascade_soft_delete(queryset: models.QuerySet) -> tuple[int, dict[str, int]]:
+    """
+    软删除queryset中的记录以及所有级联的记录, 在一个事务中执行
+    同一次删除的记录 delete_datetime 相同, cascade_restore 据此只恢复这一次删除的记录
+    已经访问过的记录不会重复处理, 自关联(如部门的上级)或模型之间的循环引用不会死循环
+    :return: (本次新标记删除的总数, {模型label: 数量}), 与 Model.delete() 的返回格式一致
+    """
+    using = queryset.db
+    now = datetime.now()
+    summary: dict[str, int] = defaultdict(int)
+    with transaction.atomic(using=using):
+        roots = list(queryset.values_list("pk", flat=True))
+        for model, pks in _walk(queryset.model, roots, using):
+            values = _update_values(model, now, is_deleted=True, delete_datetime=now)
+            manager = model._base_manager.using(using)
+            for chunk in _chunks(pks):
+                summary[model._meta.label] += manager.filter(pk__in=chunk, is_deleted=False).update(**values)
+    summary = {label: count for label, count in summary.items() if count}
+    return sum(summary.values()), summary
+
+
+def cascade_restore(queryset: models.QuerySet) -> tuple[int, dict[str, int]]:
+    """
+    恢复queryset中已删除的记录, 以及和它们在同一次级联软删除中被删除的记录(delete_datetime相同)
+    之前单独删除的下级记录(delete_datetime不同)保持删除状态
+    先找出整棵子树, 再从最深的一层向上逐批更新, 每批单独提交, 根记录最后恢复:
+    中途中断后根记录仍是删除状态, 重新执行会从中断处继续, 已恢复的记录不会重复计数
+    :return: (本次恢复的总数, {模型label: 数量})
+    """
+    using = queryset.db
+    now = datetime.now()
+    summary: dict[str, int] = defaultdict(int)
+    roots = defaultdict(list)
+    for pk, deleted_at in queryset.filter(is_deleted=True).values_list("pk", "delete_datetime"):
+        roots[deleted_at].append(pk)
+    for deleted_at, pks in roots.items():
+        # 已恢复的记录也要经过, 中断后重新执行才能找到它们下面还没恢复的记录
+        related_filter = Q(is_deleted=False) | Q(delete_datetime=deleted_at)
+        levels = list(_walk(queryset.model, pks, using, related_filter))
+        for model, level_pks in reversed(levels):
+            values = _update_values(model, now, is_deleted=False, delete_datetime=None)
+            manager = model._base_manager.using(using)
+            for chunk in _chunks(level_pks):
+                summary[model._meta.label] += manager.filter(
+                    pk__in=chunk, is_deleted=True, delete_datetime=deleted_at
+                ).update(**values)
+    summary = {label: count for label, count in summary.items() if count}
+    return sum(summary.values()), summary
@@ -0,0 +1,334 @@
+"""
+请求链路追踪
+* TracingMiddleware 为每个请求开启一条trace, 支持W3C traceparent请求头继承上游的trace
+* 业务代码用 span()/traced() 记录子步骤, 当前请求没有被追踪时直接返回空操作, 未开启时几乎没有开销
+* trace结束时把所有span交给exporter: jsonl(写本地文件)、otlp(OTLP/HTTP JSON, 后台线程批量发送)
+  或 TRACING_EXPORTER 配置的类路径(接收 export(spans: list[dict]))
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+logger = logging.getLogger("tracing")
+
+
+def parse_traceparent(value: str):
+    """
+    解析 traceparent 请求头
+    :return: (trace_id, parent_id, sampled), 无效时返回None
+    """
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match:
+        return None
+    version, trace_id, parent_id, flags, rest = match.groups()
+    if version == "ff" or (version == "00" and rest):
+        return None
+    if trace_id == _INVALID_TRACE_ID or parent_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class _NoopSpan:
+    """未追踪时的空操作span, 既是上下文管理器也是span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start", "end", "attributes", "error", "kind", "_token")
+
+    def __init__(self, name: str, trace: "Trace", parent_id: str | None, attributes: dict, kind: str = "internal"):
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.kind = kind
+        self.error = None
+        self.start = self.end = 0
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.trace.spans.append(self)
+        if self.kind == "server":
+            # 根span结束, 整条trace导出
+            self.trace.export()
+        return False
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-01"
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start,
+            "end_time_unix_nano": self.end,
+            "duration_ms": round((self.end - self.start) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    __slots__ = ("trace_id", "parent_id", "spans", "exporter")
+
+    def __init__(self, trace_id: str, parent_id: str | None, exporter):
+        self.trace_id = trace_id
+        # 上游服务的span id, 没有上游时为None
+        self.parent_id = parent_id
+        self.spans: list[Span] = []
+        self.exporter = exporter
+
+    def export(self):
+        try:
+            self.exporter.export([span.as_dict() for span in self.spans])
+        except Exception as e:
+            logger.exception(e)
+
+
+class JsonlExporter:
+    """每个span一行JSON, 用于本地排查和测试"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.lock = threading.Lock()
+
+    def export(self, spans: list[dict]):
+        lines = "".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in spans)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+
+class OtlpHttpExporter:
+    """
+    以OTLP/HTTP JSON格式发送到collector(如 http://127.0.0.1:4318/v1/traces)
+    请求线程只把span放入队列, 由后台线程合并发送, 队列满时丢弃
+    """
+
+    _KINDS = {"internal": 1, "server": 2, "client": 3}
+
+    def __init__(self, endpoint: str, service_name: str = "dvadmin", batch_size: int = 512, timeout: float = 5):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[dict]):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+                    self._thread.start()
+        for span in spans:
+            try:
+                self.queue.put_nowait(span)
+            except queue.Full:
+                return
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.send(batch)
+            except Exception as e:
+                logger.warning("发送trace失败: %s", e)
+
+    @staticmethod
+    def _attribute(key, value) -> dict:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def to_otlp(self, spans: list[dict]) -> dict:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "dvadmin.utils.tracing"},
+                            "spans": [
+                                {
+                                    "traceId": span["trace_id"],
+                                    "spanId": span["span_id"],
+                                    "parentSpanId": span["parent_id"] or "",
+                                    "name": span["name"],
+                                    "kind": self._KINDS.get(span["kind"], 1),
+                                    "startTimeUnixNano": str(span["start_time_unix_nano"]),
+                                    "endTimeUnixNano": str(span["end_time_unix_nano"]),
+                                    "attributes": [self._attribute(k, v) for k, v in span["attributes"].items()],
+                                    "status": {"code": 2, "message": span["error"]} if span["error"] else {},
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def send(self, spans: list[dict]):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self.to_otlp(spans)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    def __init__(self, exporter, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_trace(self, name: str, traceparent: str = None, **attributes):
+        """
+        开启一条trace, 返回根span(上下文管理器), 未被采样时返回 NOOP_SPAN
+        :param traceparent: 上游传入的traceparent, 上游已做出采样决定时沿用
+        """
+        parent = parse_traceparent(traceparent)
+        if parent:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return NOOP_SPAN
+        return Span(name, Trace(trace_id, parent_id, self.exporter), parent_id, attributes, kind="server")
+
+
+_tracer = None
+_tracer_loaded = False
+
+
+def get_tracer() -> Tracer | None:
+    """按settings创建, TRACING_ENABLED 为False时返回None"""
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        _tracer = _build_tracer() if getattr(settings, "TRACING_ENABLED", False) else None
+        _tracer_loaded = True
+    return _tracer
+
+
+def _build_tracer() -> Tracer:
+    exporter = getattr(settings, "TRACING_EXPORTER", "jsonl")
+    if exporter == "jsonl":
+        exporter = JsonlExporter(settings.TRACING_JSONL_PATH)
+    elif exporter == "otlp":
+        exporter = OtlpHttpExporter(
+            settings.TRACING_OTLP_ENDPOINT, getattr(settings, "TRACING_SERVICE_NAME", "dvadmin")
+        )
+    else:
+        exporter = import_string(exporter)()
+    return Tracer(exporter, getattr(settings, "TRACING_SAMPLE_RATE", 1.0))
+
+
+def _reset_tracer(setting, **kwargs):
+    global _tracer_loaded
+    if setting.startswith("TRACING_"):
+        _tracer_loaded = False
+
+
+setting_changed.connect(_reset_tracer)
+
+
+def start_trace(name: str, traceparent: str = None, **attributes):
+    tracer = get_tracer()
+    if tracer is None:
+        return NOOP_SPAN
+    return tracer.start_trace(name, traceparent, **attributes)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def span(name: str, **attributes):
+    """
+    记录当前trace下的一个子步骤
+    with span("captcha.render"):
+        ...
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace, parent.span_id, attributes)
+
+
+def traced(name: str = None):
+    """函数级的span, 默认以函数的 __qualname__ 命名"""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
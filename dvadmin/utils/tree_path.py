@@ -0,0 +1,54 @@
+"""
+树形数据的物化路径, 如部门 id=5 的上级为 1 时路径为 "/1/5/"
+* 子树: 以本节点路径开头的路径, 用范围查询 "/1/5/" <= tree_path < "/1/50" 走 tree_path 上的索引
+  (LIKE在SQLite中不区分大小写、在MySQL中为LIKE BINARY, 都用不上普通索引)
+* 祖先: 直接从路径中解析, 不需要查询
+首尾都带分隔符, "/1/" 不会匹配到 "/10/"
+"""
+from collections import defaultdict
+from collections.abc import Iterable
+
+SEPARATOR = "/"
+
+
+def child_path(parent_path: str | None, pk) -> str:
+    return f"{parent_path or SEPARATOR}{pk}{SEPARATOR}"
+
+
+def subtree_range(path: str) -> tuple[str, str]:
+    """
+    以path开头的所有路径都在 [path, 上界) 中, 上界把末尾的分隔符换成下一个字符("/"之后是"0")
+    路径只由数字和分隔符组成, 在按字符编码排序的排序规则(SQLite、MySQL、PostgreSQL的C/ICU)中范围内没有其他路径
+    """
+    return path, path[:-1] + chr(ord(SEPARATOR) + 1)
+
+
+def path_ids(path: str) -> list[int]:
+    """路径中从根到本节点的id"""
+    return [int(pk) for pk in path.strip(SEPARATOR).split(SEPARATOR) if pk]
+
+
+def build_paths(nodes: Iterable[tuple[int, int | None]]) -> tuple[dict[int, str], set[int]]:
+    """
+    根据 (id, 上级id) 计算所有节点的路径, O(n)
+    上级不存在的节点作为根节点
+    :return: ({id: 路径}, 上级链中有循环、无法从根节点到达的id), 这些节点以自己为根
+    """
+    parents = dict(nodes)
+    children = defaultdict(list)
+    roots = []
+    for pk, parent_id in parents.items():
+        if parent_id is None or parent_id not in parents:
+            roots.append(pk)
+        else:
+            children[parent_id].append(pk)
+    paths = {}
+    stack = [(pk, None) for pk in roots]
+    while stack:
+        pk, parent_path = stack.pop()
+        path = paths[pk] = child_path(parent_path, pk)
+        stack.extend((child, path) for child in children[pk])
+    cyclic = set(parents) - set(paths)
+    for pk in cyclic:
+        paths[pk] = child_path(None, pk)
+    return paths, cyclic
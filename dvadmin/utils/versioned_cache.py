@@ -0,0 +1,64 @@
+"""
+带版本号的进程内缓存
+数据保存在当前进程的字典中, 版本号保存在Django缓存(settings.CACHES)中:
+数据变化时 bump() 换一个新版本号, 各进程下次 sync() 发现版本号不同就清空自己的数据
+dept_cache = VersionedCache("dept_tree")
+names = dept_cache.sync()  # 返回当前版本的数据字典
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class VersionedCache:
+    """
+    使用要求:
+    * 多进程部署时CACHES需要配置为共享的缓存(如redis), 默认的LocMemCache中版本号只在当前进程,
+      bump() 通知不到其他进程. 版本号的有效期为 settings.VERSIONED_CACHE_TIMEOUT 秒,
+      到期后各进程重新加载数据, 没有共享缓存时其他进程的数据最多过期这么久
+    * 重新加载数据时从主库读取(.using(DEFAULT_DB_ALIAS)), 不经过读写分离:
+      只读副本有复制延迟, bump() 之后从副本读到的旧数据会以新版本号缓存下来, 直到下一次 bump()
+    """
+
+    def __init__(self, name: str, timeout: int = None):
+        """
+        :param timeout: 版本号有效期(秒), 默认取 settings.VERSIONED_CACHE_TIMEOUT, 都为None时不过期
+        """
+        self.name = name
+        self.key = f"versioned_cache:{name}"
+        self.timeout = timeout
+        self.version = None
+        self.data: dict = {}
+        self._lock = threading.Lock()
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, "VERSIONED_CACHE_TIMEOUT", None)
+
+    def current_version(self) -> str:
+        version = cache.get(self.key)
+        if version is None:
+            # 缓存被清空、版本号过期或第一次使用, 多个进程同时初始化时以先写入的为准
+            cache.add(self.key, uuid.uuid4().hex, self.get_timeout())
+            version = cache.get(self.key)
+        return version
+
+    def sync(self) -> dict:
+        """
+        检查版本号, 变化时清空数据
+        :return: 当前版本的数据字典, 调用方直接读写
+        """
+        version = self.current_version()
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self.data = {}
+                    self.version = version
+        return self.data
+
+    def bump(self):
+        """数据已变化, 所有进程的数据失效"""
+        cache.set(self.key, uuid.uuid4().hex, self.get_timeout())